@@ -0,0 +1,407 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+
+import numpy as np
+from data_loader import load_and_prepare_data, load_local_frame, map_prior
+from finding_center import EXECUTORS, METHODS, TRANSPORTS, compare_methods, frame_quantiles
+from fits_archive import get_archive, to_timestamp
+from tracking import CenterTracker, compare_tracked
+from prefetch import FidoClient, LocalDirectoryClient, Prefetcher
+from results_store import ResultsStore, method_records, pending_frames
+from metrics import CampaignStats
+from memory_usage import peak_rss_mb, reset_peak_rss
+from instrumentation import annotate, configure, get_instrumentation, json_default, stage
+
+FIELDNAMES = [
+    'frame', 'source', 'Method', 'Center_X', 'Center_Y',
+    'Error_pixels', 'Delta_X', 'Delta_Y', 'Std_X', 'Std_Y'
+]
+
+
+def frame_times(start_time, end_time, cadence):
+    if not isinstance(cadence, timedelta):
+        cadence = timedelta(seconds=cadence)
+
+    frames = []
+    current = start_time
+    while current <= end_time:
+        frames.append({'frame': current.isoformat(), 'target_date': current})
+        current += cadence
+
+    return frames
+
+
+def frames_from_files(magnetogram_files, white_light_files=None):
+    if white_light_files is None:
+        white_light_files = [None] * len(magnetogram_files)
+
+    if len(white_light_files) != len(magnetogram_files):
+        raise ValueError("white_light_files must pair one-to-one with magnetogram_files")
+
+    return [
+        {
+            'frame': os.path.basename(magnetogram_file),
+            'magnetogram_file': magnetogram_file,
+            'white_light_file': white_light_file
+        }
+        for magnetogram_file, white_light_file in zip(magnetogram_files, white_light_files)
+    ]
+
+
+def frame_rows(frame, results_df, averaging_results, uncertainties):
+    source = frame.get('magnetogram_file') or frame['frame']
+    rows = []
+
+    for _, result in results_df.iterrows():
+        uncertainty = uncertainties.get(result['Method'])
+        std_x, std_y = uncertainty['std_pixels'] if uncertainty else (np.nan, np.nan)
+        rows.append({
+            'frame': frame['frame'],
+            'source': source,
+            'Method': result['Method'],
+            'Center_X': result['Center_X'],
+            'Center_Y': result['Center_Y'],
+            'Error_pixels': result['Error_pixels'],
+            'Delta_X': result['Delta_X'],
+            'Delta_Y': result['Delta_Y'],
+            'Std_X': std_x,
+            'Std_Y': std_y,
+        })
+
+    if averaging_results:
+        for key, label in (('simple_average', 'Simple Average'),
+                           ('weighted_average', 'Weighted Average')):
+            average = averaging_results[key]
+            rows.append({
+                'frame': frame['frame'],
+                'source': source,
+                'Method': label,
+                'Center_X': average['center'][0],
+                'Center_Y': average['center'][1],
+                'Error_pixels': average['error'],
+                'Delta_X': average['delta_x'],
+                'Delta_Y': average['delta_y'],
+                'Std_X': np.nan,
+                'Std_Y': np.nan,
+            })
+
+    return rows
+
+
+def frame_timestamp(frame, sample_map):
+    if 'target_date' in frame:
+        return to_timestamp(frame['target_date'])
+    try:
+        return float(sample_map.date.unix)
+    except Exception:
+        return None
+
+
+def worker_name():
+    # Process workers run frames on their main thread; with the thread
+    # executor every frame runs in a thread of one process.
+    thread = threading.current_thread()
+    if thread is threading.main_thread():
+        return str(os.getpid())
+    return f"{os.getpid()}/{thread.name}"
+
+
+def process_frame(frame, banded_float32=False, method_executor=None, method_timeout=None,
+                  verbosity=None, metrics=False, trace_memory=False, use_prior=True, tracker=None,
+                  bootstrap_samples=0, bootstrap_seed=0, method_transport='pickle'):
+    configure(verbosity=verbosity, collect=metrics, trace_memory=trace_memory)
+    start = time.perf_counter()
+    reset_peak_rss()
+    quantiles = frame_quantiles()
+    try:
+        with stage('frame', frame=frame['frame']):
+            if frame.get('error'):
+                raise RuntimeError(frame['error'])
+
+            if 'magnetogram_file' in frame:
+                sample_map, data_clean, reference_center, context = load_local_frame(
+                    frame['magnetogram_file'], frame.get('white_light_file'),
+                    banded_float32=banded_float32, quantiles=quantiles, use_prior=use_prior
+                )
+            else:
+                # The parent refreshed the archive index; workers only read it.
+                sample_map, data_clean, reference_center, context = load_and_prepare_data(
+                    frame['target_date'], archive=get_archive(read_only=True), banded_float32=banded_float32,
+                    quantiles=quantiles, use_prior=use_prior
+                )
+
+            prior = map_prior(sample_map) if use_prior else None
+            method_runs = []
+            compare_options = {'quantiles': quantiles, 'executor': method_executor, 'method_runs': method_runs,
+                               'transport': method_transport,
+                               'timeout': method_timeout, 'prior': prior, 'context': context,
+                               # Frames already run in parallel, so each one
+                               # bootstraps in its own process.
+                               'bootstrap_samples': bootstrap_samples, 'bootstrap_seed': bootstrap_seed,
+                               'bootstrap_workers': 1}
+            if frame.get('methods') is not None:
+                # Resumed frames only run the methods the store lacks.
+                methods_by_name = {method.__name__: method for method in METHODS}
+                compare_options['methods'] = [methods_by_name[name] for name in frame['methods']]
+            if tracker is not None:
+                results_df, averaging_results, uncertainties = compare_tracked(
+                    tracker, data_clean, reference_center, frame_timestamp(frame, sample_map), **compare_options
+                )
+            else:
+                results_df, averaging_results, uncertainties = compare_methods(data_clean, reference_center,
+                                                                               **compare_options)
+            if frame.get('methods') is not None and len(frame['methods']) < len(METHODS):
+                # An average over the resumed methods alone would be misleading.
+                averaging_results = None
+            rows = frame_rows(frame, results_df, averaging_results, uncertainties)
+            records = method_records(frame, results_df, uncertainties, method_runs)
+            annotate(peak_rss_mb=peak_rss_mb())
+        error = None
+    except Exception as e:
+        rows = []
+        records = []
+        error = str(e)
+
+    return {
+        'frame': frame['frame'],
+        'rows': rows,
+        'records': records,
+        'error': error,
+        'pid': os.getpid(),
+        'worker': worker_name(),
+        'busy_time': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'metrics': get_instrumentation().drain()
+    }
+
+
+def process_sequence(frames, **frame_options):
+    # Consecutive frames share one tracker; the first is searched in full.
+    tracker = CenterTracker()
+    return [process_frame(frame, tracker=tracker, **frame_options) for frame in frames]
+
+
+def frame_tasks(frames, track_chunk=None):
+    if not track_chunk:
+        for index, frame in enumerate(frames):
+            yield index, process_frame, frame
+        return
+
+    chunk, start = [], 0
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) == track_chunk:
+            yield start, process_sequence, chunk
+            chunk, start = [], start + len(chunk)
+    if chunk:
+        yield start, process_sequence, chunk
+
+
+def run_batch(frames, output_path, max_workers=None, ordered=False, metrics_path=None, track_chunk=None,
+              store_path=None, summary_path=None, frame_executor='process', **frame_options):
+    if metrics_path is not None:
+        frame_options['metrics'] = True
+
+    start = time.perf_counter()
+    busy_by_worker = {}
+    completed = 0
+    failed = 0
+    pending = {}
+    next_index = 0
+    peak_rss = 0.0
+
+    metrics_file = open(metrics_path, 'w') if metrics_path is not None else None
+    store = ResultsStore(store_path) if store_path is not None else None
+    campaign = CampaignStats()
+    in_flight = 2 * (max_workers or os.cpu_count() or 1)
+
+    # Threads share the process's read-only lookup tables and skip pickling
+    # the frames; each frame carries its own context. Their metrics records
+    # and peak RSS are the process's, so they may land with another frame.
+    # The store flushes its last batch on the way out, also after an error.
+    with open(output_path, 'w', newline='') as output_file, \
+            EXECUTORS[frame_executor](max_workers=max_workers) as executor, \
+            store if store is not None else nullcontext():
+        writer = csv.DictWriter(output_file, fieldnames=FIELDNAMES)
+        writer.writeheader()
+
+        tasks = frame_tasks(frames, track_chunk)
+        futures = {}
+        exhausted = False
+
+        while True:
+            # Frames are submitted as they become available (prefetched ones
+            # arrive over time), with a bounded number in flight.
+            while not exhausted and len(futures) < in_flight:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                else:
+                    index, function, argument = task
+                    futures[executor.submit(function, argument, **frame_options)] = index
+
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                first_index = futures.pop(future)
+                results = future.result()
+                if not track_chunk:
+                    results = [results]
+
+                for index, result in enumerate(results, start=first_index):
+                    completed += 1
+                    busy_by_worker[result['worker']] = busy_by_worker.get(result['worker'], 0.0) + result['busy_time']
+                    peak_rss = max(peak_rss, result['peak_rss_mb'] or 0.0)
+
+                    if result['error'] is not None:
+                        failed += 1
+                        print(f"Frame {result['frame']} failed: {result['error']}")
+
+                    if ordered:
+                        # Hold early finishers back until every earlier frame is written.
+                        pending[index] = result
+                        while next_index in pending:
+                            writer.writerows(pending.pop(next_index)['rows'])
+                            next_index += 1
+                    else:
+                        writer.writerows(result['rows'])
+                    output_file.flush()
+
+                    if result['error'] is None:
+                        campaign.update(result['rows'])
+
+                    if store is not None:
+                        store.append(result['records'])
+
+                    if metrics_file is not None:
+                        for record in result['metrics']:
+                            record['pid'] = result['pid']
+                            metrics_file.write(json.dumps(record, default=json_default) + '\n')
+                        metrics_file.flush()
+
+                    elapsed = time.perf_counter() - start
+                    print(f"[{completed}/{len(frames)}] {result['frame']} "
+                          f"({result['busy_time']:.1f} s, peak RSS {result['peak_rss_mb'] or 0.0:.0f} MB, "
+                          f"{completed / elapsed * 60:.1f} frames/min)")
+
+    if metrics_file is not None:
+        metrics_file.close()
+
+    elapsed = time.perf_counter() - start
+    throughput = {
+        'frames': completed,
+        'failed': failed,
+        'wall_time': elapsed,
+        'frames_per_minute': completed / elapsed * 60 if elapsed > 0 else 0.0,
+        'peak_rss_mb': peak_rss,
+        'worker_utilisation': {worker: busy / elapsed for worker, busy in busy_by_worker.items()},
+        'method_summary': campaign.summary()
+    }
+
+    if summary_path is not None:
+        # The raw state, so shards of a campaign can be merged later.
+        with open(summary_path, 'w') as summary_file:
+            json.dump(campaign.to_dict(), summary_file, indent=2)
+
+    print(f"\nProcessed {completed} frames ({failed} failed) in {elapsed:.1f} s "
+          f"({throughput['frames_per_minute']:.1f} frames/min, peak RSS per frame {peak_rss:.0f} MB)")
+    for worker, utilisation in sorted(throughput['worker_utilisation'].items()):
+        print(f"  Worker {worker}: {utilisation:.0%} busy")
+
+    if campaign.frames:
+        print(f"\n{'Method':<32}{'Frames':>7}{'Mean err':>10}{'Std err':>10}{'Bias X':>9}{'Bias Y':>9}{'Wins':>7}")
+        for row in throughput['method_summary']:
+            print(f"{row['Method']:<32}{row['Frames']:>7}{row['Mean_error']:>10.3f}{row['Std_error']:>10.3f}"
+                  f"{row['Bias_X']:>+9.3f}{row['Bias_Y']:>+9.3f}{row['Win_rate']:>7.0%}")
+
+    return throughput
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Center a batch of HMI frames")
+    parser.add_argument('--start', type=datetime.fromisoformat, help="first observation time (ISO format)")
+    parser.add_argument('--end', type=datetime.fromisoformat, help="last observation time (ISO format)")
+    parser.add_argument('--cadence', type=float, default=720, help="seconds between frames")
+    parser.add_argument('--files', nargs='+', help="local magnetogram FITS files")
+    parser.add_argument('--white-light-files', nargs='+', help="white light FITS files paired with --files")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--ordered', action='store_true', help="write frames in input order")
+    parser.add_argument('--banded-float32', action='store_true',
+                        help="read FITS files into float32 arrays band by band")
+    parser.add_argument('--frame-executor', choices=sorted(EXECUTORS), default='process',
+                        help="center frames in worker processes or in threads of one process")
+    parser.add_argument('--method-executor', choices=sorted(EXECUTORS),
+                        help="run the methods of a frame concurrently")
+    parser.add_argument('--method-transport', choices=TRANSPORTS, default='pickle',
+                        help="send frames to --method-executor process workers pickled or in shared memory")
+    parser.add_argument('--method-timeout', type=float, help="seconds before a method counts as failed")
+    parser.add_argument('--verbosity', type=int, choices=(0, 1, 2),
+                        help="0: errors only, 1: progress, 2: per-iteration detail")
+    parser.add_argument('--metrics', help="write per-stage timing/memory records as JSON lines")
+    parser.add_argument('--trace-memory', action='store_true', help="record peak traced memory per stage")
+    parser.add_argument('--no-header-prior', action='store_true',
+                        help="ignore the CRPIX/CDELT/RSUN_OBS disk prior in the FITS headers")
+    parser.add_argument('--track', action='store_true',
+                        help="track the disk across consecutive frames instead of searching each one")
+    parser.add_argument('--track-chunk', type=int, default=32,
+                        help="consecutive frames per tracked run; each run starts with a full search")
+    parser.add_argument('--prefetch', type=int, default=0, metavar='N',
+                        help="download the next N frames in the background (time ranges only)")
+    parser.add_argument('--fetch-workers', type=int, default=4, help="concurrent downloads when prefetching")
+    parser.add_argument('--fetch-retries', type=int, default=3)
+    parser.add_argument('--offline-dir', help="take frames from this FITS directory instead of Fido")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='SAMPLES',
+                        help="bootstrap samples for the limb-fit uncertainty")
+    parser.add_argument('--bootstrap-seed', type=int, default=0)
+    parser.add_argument('--store', help="append per-method results to this SQLite file")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip frames and methods already in --store at their current version")
+    parser.add_argument('--summary', help="write mergeable per-method running statistics as JSON")
+    parser.add_argument('--output', default='centers.csv')
+    args = parser.parse_args(argv)
+
+    if args.files:
+        frames = frames_from_files(args.files, args.white_light_files)
+    elif args.start and args.end:
+        frames = frame_times(args.start, args.end, args.cadence)
+    else:
+        parser.error("either --files or --start/--end is required")
+
+    if args.resume:
+        if not args.store:
+            parser.error("--resume needs --store")
+        # Done frames are dropped before prefetching so they are not fetched.
+        with ResultsStore(args.store) as store:
+            frames = pending_frames(frames, store)
+
+    if not args.files:
+        # One walk of the archive for the whole batch, before any worker starts.
+        get_archive()
+
+    if not args.files and (args.prefetch or args.offline_dir):
+        client = LocalDirectoryClient(args.offline_dir) if args.offline_dir else FidoClient()
+        frames = Prefetcher(frames, client, lookahead=max(args.prefetch, 1), max_workers=args.fetch_workers,
+                            retries=args.fetch_retries, fallback=not args.offline_dir)
+
+    return run_batch(frames, args.output, max_workers=args.workers, ordered=args.ordered,
+                     metrics_path=args.metrics, store_path=args.store, summary_path=args.summary,
+                     track_chunk=args.track_chunk if args.track else None, frame_executor=args.frame_executor,
+                     banded_float32=args.banded_float32,
+                     method_executor=args.method_executor, method_transport=args.method_transport,
+                     method_timeout=args.method_timeout,
+                     verbosity=args.verbosity, trace_memory=args.trace_memory,
+                     use_prior=not args.no_header_prior, bootstrap_samples=args.bootstrap,
+                     bootstrap_seed=args.bootstrap_seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,563 @@
+import argparse
+import json
+import os
+import pickle
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from circle_bubbling_method import (CIRCLE_OPTIMIZERS, PRIOR_DIAMETER_RANGE, PRIOR_STEP, apply_article_filters,
+                                    expected_limb)
+from disk_prior import header_prior
+from finding_center import METHODS, RESULT_COLUMNS, compare_methods, frame_quantiles, method_options, run_methods
+from frame_context import FrameContext
+from hmi_processor import HMI_Processor
+from metrics import calculate_metrics, calculate_average_center
+from synthetic_data import synthetic_frame, synthetic_sequence
+from tracking import CenterTracker, bubbling_fit, compare_tracked
+from uncertainty import calculate_edge_based_uncertainty
+from white_light_finder import estimate_white_light_center
+from instrumentation import QUIET, configure, get_instrumentation
+
+BENCHMARK_SIZES = (1024, 2048, 4096)
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# A median time or peak memory is a regression when it exceeds the baseline
+# by this factor and by the absolute floor; center errors by the offset.
+TIME_RATIO, TIME_FLOOR = 1.5, 0.01
+MEMORY_RATIO, MEMORY_FLOOR = 1.25, 1.0
+ERROR_TOLERANCE = 0.1
+
+# Modules a method worker imports, timed in a fresh interpreter against
+# IMPORT_BUDGET seconds; none of them may load the HEAVY_MODULES.
+WORKER_MODULES = ('image_moments_method', 'mass_center_method', 'gradient_symmetry_method',
+                  'circle_bubbling_method', 'limb_fit_method', 'hough_method', 'finding_center',
+                  'batch_processing')
+HEAVY_MODULES = ('sunpy.map', 'sunpy.net', 'scipy.ndimage', 'astropy.io.fits', 'pandas', 'matplotlib')
+IMPORT_BUDGET = 0.5
+
+_IMPORT_PROBE = ("import json, sys, time\n"
+                 "start = time.perf_counter()\n"
+                 "import {module}\n"
+                 "elapsed = time.perf_counter() - start\n"
+                 "print(json.dumps({{'time': elapsed, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))")
+
+
+def processor_classes():
+    classes = []
+    pending = list(HMI_Processor.__subclasses__())
+    while pending:
+        cls = pending.pop(0)
+        pending.extend(cls.__subclasses__())
+        if not getattr(cls, '__abstractmethods__', None):
+            classes.append(cls)
+    return classes
+
+
+def measure(function, repeats):
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    # Peak memory is taken from a separate traced run, so tracing overhead
+    # does not leak into the timings.
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    memory_start = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - memory_start
+    if not tracing:
+        tracemalloc.stop()
+
+    return result, times, peak / (1024 * 1024)
+
+
+def run_processor(cls, data_clean, prior=None, context=None):
+    processor = cls()
+    processor.quantiles = frame_quantiles()
+    processor.prior = prior
+    return processor.process_method(data_clean, context)
+
+
+def method_counters(records):
+    # Counters the method added to its process_method stage in the last run.
+    counters = {}
+    for record in records:
+        if record['stage'] == 'process_method':
+            counters = {key: record[key] for key in ('bubbling_iterations', 'brightness_evaluations')
+                        if key in record}
+    return counters
+
+
+def benchmark_record(size, target, times, peak_memory_mb, center=None, true_center=None, **fields):
+    record = {
+        'size': size,
+        'target': target,
+        'median_time': float(np.median(times)),
+        'times': [float(t) for t in times],
+        'peak_memory_mb': float(peak_memory_mb),
+        'center': None,
+        'center_error': None
+    }
+
+    if center is not None:
+        error, dx, dy = calculate_metrics(center, true_center)
+        record.update({
+            'center': (float(center[0]), float(center[1])),
+            'center_error': float(error),
+            'delta_x': float(dx),
+            'delta_y': float(dy)
+        })
+
+    record.update(fields)
+    return record
+
+
+def benchmark_size(size, repeats=3, white_light=True, seed=0, **frame_options):
+    frame = synthetic_frame(size, seed=seed, **frame_options)
+    true_center = frame['center']
+    data_clean = np.nan_to_num(frame['magnetogram'], nan=0.0)
+    white_clean = np.nan_to_num(frame['white_light'], nan=0.0)
+    del frame['magnetogram'], frame['white_light']
+    prior = header_prior(frame['header'], data_clean.shape)
+
+    instrumentation = get_instrumentation()
+    instrumentation.collect = True
+    records = []
+    results = []
+
+    try:
+        for cls in processor_classes():
+            for use_prior in (False, True):
+                run_prior = prior if use_prior else None
+                context = FrameContext(data_clean, white_light=white_clean if white_light else None,
+                                       white_light_prior=run_prior)
+                instrumentation.drain()
+
+                result, times, peak = measure(lambda: run_processor(cls, data_clean, run_prior, context), repeats)
+                center, method_name, _ = result
+                target = f"{cls.__name__} (header prior)" if use_prior else cls.__name__
+                records.append(benchmark_record(size, target, times, peak, center, true_center,
+                                                method=method_name, **method_counters(instrumentation.drain())))
+                if center is not None and not use_prior:
+                    results.append((center, method_name))
+
+        records.extend(benchmark_intermediates(size, data_clean, white_clean if white_light else None, true_center,
+                                               repeats))
+        if white_light:
+            records.extend(benchmark_optimizers(size, white_clean, true_center, prior, repeats))
+
+        result, times, peak = measure(
+            lambda: calculate_edge_based_uncertainty(data_clean, true_center, disk_radius=frame['radius'],
+                                                     quantiles=frame_quantiles()),
+            repeats
+        )
+        records.append(benchmark_record(size, 'calculate_edge_based_uncertainty', times, peak,
+                                        std_pixels=[float(s) for s in result['std_pixels']] if result else None))
+
+        # The pipeline references the white light estimate, not the truth.
+        reference_center = estimate_white_light_center(white_clean, clean=True, quantiles=frame_quantiles())
+        results_df = pd.DataFrame(
+            [(name, c[0], c[1]) + calculate_metrics(c, reference_center) for c, name in results],
+            columns=RESULT_COLUMNS
+        )
+        averages, times, peak = measure(lambda: calculate_average_center(results_df, reference_center), repeats)
+        if averages:
+            weighted_error = calculate_metrics(averages['weighted_average']['center'], true_center)[0]
+            records.append(benchmark_record(size, 'calculate_average_center', times, peak,
+                                            averages['simple_average']['center'], true_center,
+                                            weighted_center_error=float(weighted_error),
+                                            methods_used=averages['methods_used']))
+        else:
+            records.append(benchmark_record(size, 'calculate_average_center', times, peak))
+
+        records.append(benchmark_record(size, 'reference (white light)', [0.0], 0.0,
+                                        reference_center, true_center))
+        if prior is not None:
+            records.append(benchmark_record(size, 'reference (header prior)', [0.0], 0.0,
+                                            prior['center'], true_center))
+    finally:
+        instrumentation.collect = False
+        instrumentation.drain()
+
+    return records
+
+
+def benchmark_intermediates(size, data_clean, white_clean, true_center, repeats):
+    # Every method on one frame, with each computing its own planes and with
+    # the frame scheduler sharing them; the private figure is what the
+    # shared run's requests would have allocated one by one.
+    context = FrameContext(data_clean, white_light=white_clean)
+    records = []
+    stats = {}
+    for share in (False, True):
+        _, times, peak = measure(lambda: compare_methods(data_clean, true_center, quantiles=frame_quantiles(),
+                                                         share_intermediates=share, intermediate_stats=stats,
+                                                         context=context),
+                                 repeats)
+        label = 'shared' if share else 'private'
+        records.append(benchmark_record(size, f"compare_methods ({label} intermediates)", times, peak))
+
+    allocated, requested = stats['allocated_bytes'] / 2 ** 20, stats['requested_bytes'] / 2 ** 20
+    records[0]['intermediate_mb'] = requested
+    records[1]['intermediate_mb'] = allocated
+    print(f"  Intermediates per frame: {requested:.1f} MB private, {allocated:.1f} MB shared "
+          f"({stats['computed']} computed for {stats['requests']} requests)")
+    return records
+
+
+def benchmark_optimizers(size, white_clean, true_center, prior, repeats):
+    # Both circle optimizers on the filtered continuum, from the same starts:
+    # the disk-area estimate with the no-prior step, and the header prior.
+    filtered = apply_article_filters(white_clean)
+    limb_center, limb_radius = expected_limb(white_clean)
+    starts = {'disk estimate': (limb_center, 2 * limb_radius, 150.0, {})}
+    if prior is not None:
+        diameter = 2 * prior['radius']
+        starts['header prior'] = (prior['center'], diameter, PRIOR_STEP,
+                                  {'min_diameter': diameter * (1 - PRIOR_DIAMETER_RANGE),
+                                   'max_diameter': diameter * (1 + PRIOR_DIAMETER_RANGE)})
+
+    records = []
+    for start_name, (center, diameter, step, limits) in starts.items():
+        fits = {}
+        for name, fit in CIRCLE_OPTIMIZERS.items():
+            stats = {}
+            result, times, peak = measure(lambda: fit(filtered, center, diameter, initial_step=step, stats=stats,
+                                                      **limits), repeats)
+            fits[name] = stats
+            records.append(benchmark_record(size, f"circle fit {name} ({start_name})", times, peak, result[0],
+                                            true_center, brightness=float(stats['brightness']),
+                                            bubbling_iterations=stats['iterations'],
+                                            brightness_evaluations=stats['evaluations']))
+
+        greedy, quasi_newton = fits['greedy'], fits['quasi-newton']
+        print(f"  Circle fit from {start_name}: {greedy['evaluations']} -> {quasi_newton['evaluations']} evaluations "
+              f"({greedy['evaluations'] / quasi_newton['evaluations']:.1f}x fewer), brightness "
+              f"{quasi_newton['brightness'] / greedy['brightness'] - 1:+.2e} relative to greedy")
+    return records
+
+
+def run_benchmark(sizes=BENCHMARK_SIZES, repeats=3, white_light=True, seed=0, **frame_options):
+    records = []
+    for size in sizes:
+        print(f"\nBenchmarking {size}x{size} ...")
+        size_records = benchmark_size(size, repeats=repeats, white_light=white_light, seed=seed,
+                                      **frame_options)
+        report_records(size_records)
+        records.extend(size_records)
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': sys.version.split()[0], 'numpy': np.__version__,
+                    'platform': platform.platform(), 'processor': platform.processor()},
+        'config': dict(frame_options, sizes=list(sizes), repeats=repeats,
+                       white_light=white_light, seed=seed),
+        'results': records
+    }
+
+
+def benchmark_sequence(n_frames, size, seed=0, **frame_options):
+    # Every mode sees the same frames; generating them is not timed.
+    modes = {'no prior': [], 'header prior': [], 'tracked': []}
+    busy = dict.fromkeys(modes, 0.0)
+    tracker = CenterTracker()
+
+    for frame in synthetic_sequence(n_frames, size, seed=seed, **frame_options):
+        true_center = frame['center']
+        data_clean = np.nan_to_num(frame['magnetogram'], nan=0.0)
+        white_clean = np.nan_to_num(frame['white_light'], nan=0.0)
+        prior = header_prior(frame['header'], data_clean.shape)
+
+        for mode, errors in modes.items():
+            mode_prior = None if mode == 'no prior' else prior
+            context = FrameContext(data_clean, white_light=white_clean, white_light_prior=mode_prior)
+            quantiles = frame_quantiles()
+
+            start = time.perf_counter()
+            reference_center = estimate_white_light_center(white_clean, clean=True, quantiles=quantiles)
+            if mode == 'tracked':
+                results_df, averages, uncertainties = compare_tracked(tracker, data_clean, reference_center,
+                                                                      frame['time'], quantiles=quantiles,
+                                                                      prior=mode_prior, context=context)
+            else:
+                results_df, averages, uncertainties = compare_methods(data_clean, reference_center,
+                                                                      quantiles=quantiles, prior=mode_prior,
+                                                                      context=context)
+            busy[mode] += time.perf_counter() - start
+
+            center, _ = bubbling_fit(results_df, uncertainties)
+            errors.append((calculate_metrics(center, true_center)[0] if center is not None else np.nan,
+                           calculate_metrics(averages['weighted_average']['center'], true_center)[0]
+                           if averages else np.nan))
+
+    records = []
+    print(f"\n  {'Mode':<14} {'Frames/s':>9} {'Bubbling err (mean/max px)':>28} {'Weighted avg err (px)':>22}")
+    for mode, errors in modes.items():
+        errors = np.array(errors)
+        record = {
+            'size': size,
+            'target': f"sequence ({mode})",
+            'frames': n_frames,
+            'frames_per_second': n_frames / busy[mode],
+            'median_time': busy[mode] / n_frames,
+            'times': [busy[mode] / n_frames],
+            'peak_memory_mb': 0.0,
+            'center_error': float(np.nanmean(errors[:, 0])),
+            'max_center_error': float(np.nanmax(errors[:, 0])),
+            'weighted_center_error': float(np.nanmean(errors[:, 1]))
+        }
+        records.append(record)
+        print(f"  {mode:<14} {record['frames_per_second']:9.2f} "
+              f"{record['center_error']:19.3f} / {record['max_center_error']:.3f} "
+              f"{record['weighted_center_error']:22.3f}")
+
+    print(f"  Tracker: {tracker.stats['tracked']} tracked, {tracker.stats['full']} full searches, "
+          f"{tracker.stats['lost']} lost")
+    return records
+
+
+def benchmark_transport(size, worker_counts, repeats=3, seed=0, **frame_options):
+    # Every method of one frame in a process pool, with the frame pickled
+    # to each task and with it copied once into shared memory. Pool start-up
+    # is timed too, as every frame pays it.
+    frame = synthetic_frame(size, seed=seed, **frame_options)
+    data_clean = np.nan_to_num(frame['magnetogram'], nan=0.0)
+    white_clean = np.nan_to_num(frame['white_light'], nan=0.0)
+    prior = header_prior(frame['header'], data_clean.shape)
+    context = FrameContext(data_clean, white_light=white_clean, white_light_prior=prior)
+
+    # What each transport moves per frame: a pickled frame per task, or the
+    # planes copied once. tracemalloc does not see the shared blocks, so
+    # this is the figure to compare, not the peak.
+    task_bytes = len(pickle.dumps((data_clean, method_options(METHODS[0], None, prior, context)),
+                                  protocol=pickle.HIGHEST_PROTOCOL))
+    moved = {'pickle': task_bytes * len(METHODS) / 2 ** 20,
+             'shared': (data_clean.nbytes + white_clean.nbytes) / 2 ** 20}
+
+    records = []
+    print(f"  {'Workers':>7} {'Pickle (s)':>11} {'Shared (s)':>11} {'Speed-up':>9}")
+    for workers in worker_counts:
+        medians = {}
+        for transport in ('pickle', 'shared'):
+            result, times, peak = measure(lambda: run_methods(data_clean, METHODS, frame_quantiles(),
+                                                              executor='process', max_workers=workers, prior=prior,
+                                                              context=context, transport=transport), repeats)
+            medians[transport] = float(np.median(times))
+            centers = [center for center, _, _ in result if center is not None]
+            records.append(benchmark_record(size, f"run_methods process x{workers} ({transport} frames)", times,
+                                            peak, workers=workers, transport=transport,
+                                            transferred_mb=moved[transport], methods_ok=len(centers)))
+        print(f"  {workers:7d} {medians['pickle']:11.3f} {medians['shared']:11.3f} "
+              f"{medians['pickle'] / medians['shared']:8.2f}x")
+    print(f"  Per frame: {moved['pickle']:.1f} MB pickled, {moved['shared']:.1f} MB shared")
+    return records
+
+
+def report_records(records):
+    print(f"  {'Target':<48} {'Median (s)':>10} {'Peak (MB)':>10} {'Error (px)':>10} {'Iterations':>10}")
+    for record in records:
+        error = record['center_error']
+        error_text = f"{error:10.3f}" if error is not None else f"{'-':>10}"
+        iterations = record.get('bubbling_iterations')
+        iterations_text = f"{iterations:10d}" if iterations is not None else f"{'-':>10}"
+        print(f"  {record['target']:<48} {record['median_time']:10.4f} "
+              f"{record['peak_memory_mb']:10.1f} {error_text} {iterations_text}")
+
+
+def measure_import(module, repeats=3):
+    probe = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+    runs = []
+    for _ in range(repeats):
+        completed = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return [run['time'] for run in runs], runs[-1]['heavy']
+
+
+def import_benchmark(modules=WORKER_MODULES, repeats=3):
+    # Import records use size 0, so they sit next to the frame records in a
+    # baseline and take part in the same regression check.
+    records = []
+    for module in modules:
+        times, heavy = measure_import(module, repeats)
+        records.append(benchmark_record(0, f"import {module}", times, 0.0, heavy_modules=heavy))
+    return records
+
+
+def report_imports(records, budget=IMPORT_BUDGET):
+    print(f"  {'Module':<48} {'Median (s)':>10}  Heavy modules loaded")
+    for record in records:
+        flag = '' if record['median_time'] <= budget else '  over budget'
+        print(f"  {record['target']:<48} {record['median_time']:10.3f}  "
+              f"{', '.join(record['heavy_modules']) or '-'}{flag}")
+
+
+def import_violations(records, budget=IMPORT_BUDGET):
+    violations = []
+    for record in records:
+        if record['median_time'] > budget:
+            violations.append(f"{record['target']}: {record['median_time']:.3f} s exceeds the {budget:.2f} s budget")
+        if record['heavy_modules']:
+            violations.append(f"{record['target']}: loads {', '.join(record['heavy_modules'])}")
+    return violations
+
+
+def record_key(record):
+    return record['size'], record['target']
+
+
+def frame_config(results):
+    return {key: value for key, value in results['config'].items() if key not in ('sizes', 'repeats')}
+
+
+def find_regressions(results, baseline):
+    regressions = []
+    reference = {record_key(record): record for record in baseline['results']}
+
+    for record in results['results']:
+        base = reference.get(record_key(record))
+        if base is None:
+            continue
+        name = f"{record['target']} @ {record['size']}"
+
+        if (record['median_time'] > base['median_time'] * TIME_RATIO and
+                record['median_time'] - base['median_time'] > TIME_FLOOR):
+            regressions.append(f"{name}: median time {base['median_time']:.4f} s -> "
+                               f"{record['median_time']:.4f} s")
+
+        if (record['peak_memory_mb'] > base['peak_memory_mb'] * MEMORY_RATIO and
+                record['peak_memory_mb'] - base['peak_memory_mb'] > MEMORY_FLOOR):
+            regressions.append(f"{name}: peak memory {base['peak_memory_mb']:.1f} MB -> "
+                               f"{record['peak_memory_mb']:.1f} MB")
+
+        for key in ('center_error', 'weighted_center_error'):
+            if base.get(key) is None:
+                continue
+            if record.get(key) is None:
+                regressions.append(f"{name}: no longer returns a center")
+            elif record[key] > base[key] + ERROR_TOLERANCE:
+                regressions.append(f"{name}: {key} {base[key]:.3f} px -> {record[key]:.3f} px")
+
+    return regressions
+
+
+def save_results(results, path):
+    with open(path, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"\nSaved {len(results['results'])} results to {path}")
+
+
+def load_results(path):
+    with open(path) as input_file:
+        return json.load(input_file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the centering methods on synthetic solar disks")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(BENCHMARK_SIZES))
+    parser.add_argument('--repeats', type=int, default=3, help="timed runs per method (median reported)")
+    parser.add_argument('--noise', type=float, default=10.0, help="magnetogram noise (G)")
+    parser.add_argument('--white-light-noise', type=float, default=0.005,
+                        help="continuum noise relative to disk-center intensity")
+    parser.add_argument('--regions', type=int, default=6, help="active regions on the magnetogram")
+    parser.add_argument('--no-nan', action='store_true', help="fill off-disk pixels with zeros instead of NaN")
+    parser.add_argument('--no-white-light', action='store_true',
+                        help="run Circle Bubbling on the magnetogram fallback")
+    parser.add_argument('--prior-error', type=float, default=0.3,
+                        help="1-sigma error of the synthetic header center (px)")
+    parser.add_argument('--sequence', type=int, metavar='N',
+                        help="also time N drifting frames per size with and without tracking")
+    parser.add_argument('--transport-workers', type=int, nargs='+', metavar='N',
+                        help="also time process-pool method runs with pickled and shared-memory frames "
+                             "at these worker counts")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET,
+                        help="seconds a worker module may take to import in a fresh interpreter")
+    parser.add_argument('--imports-only', action='store_true', help="only time the worker module imports")
+    parser.add_argument('--output', help="write the results as JSON")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--check', action='store_true', help="compare against the baseline; exit 1 on regressions")
+    args = parser.parse_args(argv)
+
+    # Checked before the (long) run rather than after it.
+    if args.check and not os.path.exists(args.baseline):
+        print(f"benchmark: no baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+        return 2
+
+    configure(verbosity=QUIET)
+
+    sizes = [] if args.imports_only else args.sizes
+    results = run_benchmark(sizes, repeats=args.repeats, white_light=not args.no_white_light,
+                            seed=args.seed, noise=args.noise, white_light_noise=args.white_light_noise,
+                            regions=args.regions, off_disk_nan=not args.no_nan, prior_error=args.prior_error)
+
+    print("\nImport times (fresh interpreter) ...")
+    import_records = import_benchmark(repeats=args.repeats)
+    report_imports(import_records, args.import_budget)
+    results['results'].extend(import_records)
+
+    if args.sequence:
+        for size in sizes:
+            print(f"\nSequence of {args.sequence} frames at {size}x{size} ...")
+            results['results'].extend(benchmark_sequence(args.sequence, size, seed=args.seed, noise=args.noise,
+                                                         white_light_noise=args.white_light_noise,
+                                                         regions=args.regions, off_disk_nan=not args.no_nan,
+                                                         prior_error=args.prior_error))
+        results['config']['sequence'] = args.sequence
+
+    if args.transport_workers:
+        for size in sizes:
+            print(f"\nFrame transport to method workers at {size}x{size} ...")
+            results['results'].extend(benchmark_transport(size, args.transport_workers, repeats=args.repeats,
+                                                          seed=args.seed, noise=args.noise,
+                                                          white_light_noise=args.white_light_noise,
+                                                          regions=args.regions, off_disk_nan=not args.no_nan,
+                                                          prior_error=args.prior_error))
+        results['config']['transport_workers'] = args.transport_workers
+
+    if args.output:
+        save_results(results, args.output)
+
+    status = 0
+    if args.check:
+        violations = import_violations(import_records, args.import_budget)
+        if violations:
+            print(f"\n{len(violations)} import budget violations:")
+            for violation in violations:
+                print(f"  {violation}")
+            status = 1
+
+        baseline = load_results(args.baseline)
+        if frame_config(baseline) != frame_config(results):
+            print(f"\nWarning: baseline frames differ: {frame_config(baseline)}")
+
+        regressions = find_regressions(results, baseline)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            status = 1
+        else:
+            print(f"\nNo regressions against {args.baseline}")
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
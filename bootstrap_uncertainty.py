@@ -0,0 +1,144 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from limb_fit_method import LIMB_RAYS, REFINE_WIDTH, limb_points, robust_circle_fit
+from uncertainty import covariance_uncertainty
+from intermediates import shared_filter, shared_intermediate
+from instrumentation import INFO, log, stage
+
+BOOTSTRAP_SAMPLES = 500
+BOOTSTRAP_BATCH = 100
+
+BOOTSTRAP_MODES = ('pairs', 'residuals')
+
+# A circle that follows the limb keeps most rays through the robust fit;
+# below this fraction it does not, and its bootstrap would mean nothing.
+MIN_LIMB_COVERAGE = 0.5
+
+
+def batched_kasa(x, y, weights):
+    # Weighted Kasa fits of B point sets at once: x, y and weights are
+    # (B, n) and the 3x3 normal equations are solved as one stack.
+    total = weights.sum(axis=1)
+    x_0 = (weights * x).sum(axis=1) / total
+    y_0 = (weights * y).sum(axis=1) / total
+    u, v = x - x_0[:, None], y - y_0[:, None]
+    z = u ** 2 + v ** 2
+
+    columns = (2 * u, 2 * v, np.ones_like(u))
+    normal = np.empty((len(x), 3, 3))
+    rhs = np.empty((len(x), 3))
+    for i, a in enumerate(columns):
+        rhs[:, i] = (weights * a * z).sum(axis=1)
+        for j, b in enumerate(columns[:i + 1]):
+            normal[:, i, j] = normal[:, j, i] = (weights * a * b).sum(axis=1)
+
+    a, b, c = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0].T
+    return np.column_stack([x_0 + a, y_0 + b]), np.sqrt(np.maximum(c + a ** 2 + b ** 2, 0.0))
+
+
+def resample_batch(x, y, weights, center, radius, mode, samples, seed):
+    # Module-level so process workers can run it; each batch has its own
+    # seed, so results do not depend on how batches are spread.
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, len(x), size=(samples, len(x)))
+
+    if mode == 'pairs':
+        return batched_kasa(x[index], y[index], weights[index])[0]
+
+    # Residual bootstrap: every point keeps its angle on the fitted circle
+    # and takes a radial residual drawn from the whole limb.
+    dx, dy = x - center[0], y - center[1]
+    distances = np.hypot(dx, dy)
+    residuals = distances - radius
+    new_radii = radius + residuals[index]
+    return batched_kasa(center[0] + new_radii * (dx / distances), center[1] + new_radii * (dy / distances),
+                        np.broadcast_to(weights, index.shape))[0]
+
+
+def bootstrap_circle(x, y, weights=None, samples=BOOTSTRAP_SAMPLES, seed=0, mode='pairs', max_workers=1,
+                     batch_size=BOOTSTRAP_BATCH):
+    if mode not in BOOTSTRAP_MODES:
+        raise ValueError(f"unknown bootstrap mode {mode!r}")
+
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    weights = np.ones_like(x) if weights is None else np.asarray(weights, dtype=float)
+    center, radius = batched_kasa(x[None], y[None], weights[None])
+    center, radius = center[0], float(radius[0])
+
+    sizes = [min(batch_size, samples - start) for start in range(0, samples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    arguments = [(x, y, weights, center, radius, mode, size, batch_seed) for size, batch_seed in zip(sizes, seeds)]
+
+    # Resampling runs in-process unless more workers are asked for; a pool
+    # is then started per call, so callers already inside a pool keep 1.
+    with stage('bootstrap', samples=samples, batches=len(sizes)):
+        if max_workers == 1 or len(sizes) == 1:
+            centers = [resample_batch(*argument) for argument in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                centers = list(pool.map(resample_batch, *zip(*arguments)))
+
+    centers = np.concatenate(centers)
+    uncertainty = covariance_uncertainty(np.cov(centers.T), len(x), len(x), 'bootstrap')
+    uncertainty['bootstrap_samples'] = samples
+    uncertainty['bootstrap_seed'] = seed
+    uncertainty['bootstrap_mode'] = mode
+    uncertainty['bootstrap_center'] = (float(centers[:, 0].mean()), float(centers[:, 1].mean()))
+    return uncertainty
+
+
+def bootstrap_image(data_clean, context=None):
+    if context is not None and context.white_light is not None:
+        return context.white_light
+    return shared_intermediate(None if context is None else context.intermediates, 'abs', data_clean)
+
+
+def limb_bootstrap(image, center, radius, samples=BOOTSTRAP_SAMPLES, seed=0, mode='pairs', max_workers=1,
+                   n_rays=LIMB_RAYS, intermediates=None):
+    # The limb fit's own points around its circle; only points the robust
+    # fit keeps take part, so active-region edges do not inflate the spread.
+    filtered = shared_filter(intermediates, image, (center, radius, REFINE_WIDTH + 2), key='bootstrap_filters')
+    x, y, total = limb_points(filtered, center, radius, REFINE_WIDTH, n_rays)
+    if len(x) < 3:
+        return None
+
+    _, _, weights = robust_circle_fit(x, y)
+    keep = weights > 0
+    if np.count_nonzero(keep) < max(3, MIN_LIMB_COVERAGE * n_rays):
+        return None
+
+    uncertainty = bootstrap_circle(x[keep], y[keep], weights[keep], samples=samples, seed=seed, mode=mode,
+                                   max_workers=max_workers)
+    uncertainty['total_edge_pixels'] = total
+    return uncertainty
+
+
+def apply_bootstrap(data_clean, method_results, samples=BOOTSTRAP_SAMPLES, seed=0, mode='pairs', max_workers=1,
+                    context=None):
+    # Only the limb fit is bootstrapped: its estimator is the Kasa fit the
+    # resamples re-run. The other circle methods keep their own estimates,
+    # since a limb fit's spread says nothing about theirs.
+    image = None
+    for center, method_name, uncertainty in method_results:
+        if center is None or not uncertainty or uncertainty.get('method') != 'limb_fit':
+            continue
+
+        if image is None:
+            image = bootstrap_image(data_clean, context)
+        bootstrap = limb_bootstrap(image, center, uncertainty['final_diameter'] / 2, samples=samples, seed=seed,
+                                   mode=mode, max_workers=max_workers, n_rays=uncertainty['total_edge_pixels'],
+                                   intermediates=None if context is None else context.intermediates)
+        if bootstrap is None:
+            continue
+
+        bootstrap.pop('method')
+        uncertainty.update(bootstrap)
+        uncertainty['uncertainty_source'] = 'limb_fit_bootstrap'
+        log(INFO, "%s: bootstrap 1 sigma (%.4f, %.4f) px from %d samples", method_name,
+            *bootstrap['std_pixels'], samples)
+
+    return method_results
+
+
+apply_bootstrap.requires = ('abs',)
+apply_bootstrap.white_light_requires = ('limb_filtered_white_light',)
@@ -1,34 +1,134 @@
 import numpy as np
 import math
-from scipy.ndimage import gaussian_filter, sobel, minimum_filter, maximum_filter
+import time
+import traceback
+from functools import lru_cache
+from quantiles import percentile
 from uncertainty import calculate_edge_based_uncertainty
 from hmi_processor import HMI_Processor
-
-
-class CircleBubblingData:
-    white_light_data = None
-
-    @classmethod
-    def set_white_light_data(cls, white_data):
-        cls.white_light_data = white_data
-
-    @classmethod
-    def get_white_light_data(cls):
-        return cls.white_light_data
-
-
-def apply_article_filters(image):
-    filtered = gaussian_filter(image, sigma=1.0)
-    sobel_x = sobel(filtered, axis=0)
-    sobel_y = sobel(filtered, axis=1)
-    filtered = np.sqrt(sobel_x ** 2 + sobel_y ** 2)
-    local_min = minimum_filter(filtered, size=3)
-    local_max = maximum_filter(filtered, size=3)
-    mask_low = filtered < local_min
-    mask_high = filtered > local_max
-    filtered[mask_low] = local_min[mask_low]
-    filtered[mask_high] = local_max[mask_high]
-    return filtered
+from instrumentation import ERROR, INFO, DEBUG, annotate, log, count
+
+PYRAMID_LEVELS = (512, 1024, 2048)
+
+# A header prior is good to a pixel or two, so the search starts with small
+# steps and keeps the diameter within this fraction of 2 * R_SUN.
+PRIOR_STEP = 4.0
+PRIOR_DIAMETER_RANGE = 0.01
+
+# The quasi-Newton fit stops when an iteration gains less than this
+# fraction of the brightness; a step is taken when it gains at least the
+# Armijo fraction of the gradient's prediction.
+QUASI_NEWTON_FTOL = 1e-9
+QUASI_NEWTON_MAX_ITERATIONS = 100
+QUASI_NEWTON_ARMIJO = 1e-4
+POLISH_STEPS = 4
+
+
+# Gaussian (sigma 1, truncated at 4 sigma) plus the 3x3 Sobel stencil reach
+# five pixels, so blocks padded by this much filter exactly like the frame.
+FILTER_PADDING = 5
+ROI_BAND_ROWS = 64
+ROI_WIDTH = 32
+
+
+def _filter_block(image, output, smooth, sobel_y):
+    # scipy.ndimage loads on first use, so workers that never filter skip it.
+    from scipy.ndimage import gaussian_filter, sobel
+
+    gaussian_filter(image, sigma=1.0, output=smooth)
+    sobel(smooth, axis=0, output=output)
+    sobel(smooth, axis=1, output=sobel_y)
+    output *= output
+    sobel_y *= sobel_y
+    output += sobel_y
+    np.sqrt(output, out=output)
+    # The article also clamps each pixel to its 3x3 minimum/maximum, which a
+    # pixel always lies within, so that step is omitted.
+    return output
+
+
+def roi_blocks(shape, center, radius, width, band_rows=ROI_BAND_ROWS):
+    # Row bands of the annulus radius +- width, each split into the column
+    # spans left and right of the part of the hole every row shares.
+    height, frame_width = shape
+    cx, cy = center
+    outer, inner = radius + width, max(radius - width, 0.0)
+
+    for start in range(max(0, int(np.floor(cy - outer))), min(height, int(np.ceil(cy + outer)) + 1), band_rows):
+        stop = min(start + band_rows, height)
+        dy = np.arange(start, stop) - cy
+        outer_half = np.sqrt(np.maximum(outer ** 2 - dy ** 2, 0.0)).max()
+        inner_half = np.sqrt(np.maximum(inner ** 2 - dy ** 2, 0.0)).min()
+
+        left = max(0, int(np.floor(cx - outer_half)))
+        right = min(frame_width, int(np.ceil(cx + outer_half)) + 1)
+        hole_left = int(np.ceil(cx - inner_half)) + 1
+        hole_right = int(np.floor(cx + inner_half))
+
+        if hole_right - hole_left > 2 * FILTER_PADDING:
+            spans = ((left, min(hole_left, right)), (max(hole_right, left), right))
+        else:
+            spans = ((left, right),)
+
+        for col_start, col_stop in spans:
+            if col_stop > col_start:
+                yield start, stop, col_start, col_stop
+
+
+def apply_article_filters(image, roi=None, buffers=None, key='article_filters'):
+    # By default the result is a new array. With `buffers` (FRAME_BUFFERS in
+    # the pipeline) it is a reused float32 buffer: valid only until the next
+    # call with the same key in the same thread, so each caller has its own
+    # key.
+    shape = image.shape
+    if buffers is None:
+        output = np.empty(shape, dtype=np.float32)
+    else:
+        output = buffers.get(key, shape)
+
+    if roi is None:
+        if buffers is None:
+            smooth, sobel_y = np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32)
+        else:
+            smooth, sobel_y = buffers.get(key + '_smooth', shape), buffers.get(key + '_sobel', shape)
+        return _filter_block(image, output, smooth, sobel_y)
+
+    # Only the annulus around the expected limb is filtered; every other
+    # pixel is left at zero.
+    center, radius, width = roi
+    height, frame_width = shape
+    output.fill(0.0)
+
+    for row_start, row_stop, col_start, col_stop in roi_blocks(shape, center, radius, width):
+        top, bottom = max(row_start - FILTER_PADDING, 0), min(row_stop + FILTER_PADDING, height)
+        left, right = max(col_start - FILTER_PADDING, 0), min(col_stop + FILTER_PADDING, frame_width)
+
+        block_shape = (bottom - top, right - left)
+        block = _filter_block(image[top:bottom, left:right], np.empty(block_shape, dtype=np.float32),
+                              np.empty(block_shape, dtype=np.float32), np.empty(block_shape, dtype=np.float32))
+        output[row_start:row_stop, col_start:col_stop] = block[row_start - top:row_stop - top,
+                                                               col_start - left:col_stop - left]
+
+    return output
+
+
+def expected_limb(white_data, quantiles=None):
+    # Disk pixels are those above a fifth of the 90th percentile (shared with
+    # the white light reference); limb darkening keeps the limb well above it.
+    bright = percentile(white_data, 90, quantiles, key='white_light')
+    return disk_circle(white_data > 0.2 * bright)
+
+
+def disk_circle(disk):
+    # The circle with the centroid and area of a disk mask.
+    area = np.count_nonzero(disk)
+    if area == 0:
+        return None, None
+
+    columns = disk.sum(axis=0)
+    rows = disk.sum(axis=1)
+    center = (float(columns @ np.arange(len(columns))) / area, float(rows @ np.arange(len(rows))) / area)
+    return center, float(np.sqrt(area / np.pi))
 
 
 def circle_brightness_sum(image, center, diameter, n_points):
@@ -59,12 +159,58 @@ def circle_brightness_sum(image, center, diameter, n_points):
     return total_brightness
 
 
-def circle_bubbling_algorithm(data_clean, initial_center, initial_diameter):
+@lru_cache(maxsize=8)
+def _circle_angle_table(n_points):
+    angles = np.linspace(0, 2 * np.pi, n_points, endpoint=False)
+    cos_table = np.cos(angles)
+    sin_table = np.sin(angles)
+    cos_table.flags.writeable = False
+    sin_table.flags.writeable = False
+    return cos_table, sin_table
+
+
+def circle_brightness_sums(image, centers, diameters, n_points):
+    # Batched counterpart of circle_brightness_sum: one row of samples per
+    # (center, diameter) candidate, same bilinear weights and 70% rule.
+    cos_table, sin_table = _circle_angle_table(n_points)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    radii = np.asarray(diameters, dtype=float).reshape(-1) / 2
+
+    x = centers[:, 0:1] + radii[:, None] * cos_table
+    y = centers[:, 1:2] + radii[:, None] * sin_table
+    x_0, y_0 = np.floor(x), np.floor(y)
+    x_1, y_1 = np.ceil(x), np.ceil(y)
+
+    height, width = image.shape
+    valid = (x_0 >= 0) & (x_1 < width) & (y_0 >= 0) & (y_1 < height)
+
+    xi_0 = np.where(valid, x_0, 0).astype(np.intp)
+    xi_1 = np.where(valid, x_1, 0).astype(np.intp)
+    yi_0 = np.where(valid, y_0, 0).astype(np.intp)
+    yi_1 = np.where(valid, y_1, 0).astype(np.intp)
+
+    dx, dy = x - x_0, y - y_0
+    values = (image[yi_0, xi_0] * (1 - dx) * (1 - dy) +
+              image[yi_0, xi_1] * dx * (1 - dy) +
+              image[yi_1, xi_0] * (1 - dx) * dy +
+              image[yi_1, xi_1] * dx * dy)
+
+    totals = np.where(valid, np.abs(values), 0.0).sum(axis=1)
+    totals[valid.sum(axis=1) < n_points * 0.7] = 0.0
+
+    return totals
+
+
+def circle_bubbling_algorithm(data_clean, initial_center, initial_diameter,
+                              initial_step=150.0, min_step=0.05, min_diameter=100, max_diameter=None,
+                              stats=None):
     height, width = data_clean.shape
+    if max_diameter is None:
+        max_diameter = min(height, width) * 1.1
     current_center = [float(initial_center[0]), float(initial_center[1])]
     current_diameter = float(initial_diameter)
 
-    dd = 150.0
+    dd = float(initial_step)
 
     directions = []
     for i in range(8):
@@ -78,14 +224,19 @@ def circle_bubbling_algorithm(data_clean, initial_center, initial_diameter):
 
     best_center = current_center[:]
     best_diameter = current_diameter
-    best_brightness = circle_brightness_sum(data_clean, current_center, current_diameter, n_points)
+    best_brightness = circle_brightness_sums(data_clean, [current_center], [current_diameter], n_points)[0]
+    evaluations = 1
 
-    print(f"Start: center=({current_center[0]:.1f}, {current_center[1]:.1f}), D={current_diameter:.1f}, step={dd:.1f}")
+    log(DEBUG, "Start: center=(%.1f, %.1f), D=%.1f, step=%.1f",
+        current_center[0], current_center[1], current_diameter, dd)
 
-    while dd > 0.05 and iteration < max_iterations:
+    while dd > min_step and iteration < max_iterations:
         iteration += 1
         improved = False
 
+        candidate_centers = []
+        candidate_diameters = []
+
         for dx, dy in directions:
             new_center = [
                 current_center[0] + dx * dd,
@@ -95,77 +246,422 @@ def circle_bubbling_algorithm(data_clean, initial_center, initial_diameter):
             for diameter_change in [dd, -dd, dd / 2, -dd / 2, 0]:
                 new_diameter = current_diameter + diameter_change
 
-                if new_diameter < 100 or new_diameter > min(height, width) * 1.1:
+                if new_diameter < min_diameter or new_diameter > max_diameter:
                     continue
 
-                new_brightness = circle_brightness_sum(data_clean, new_center, new_diameter, n_points)
-
-                if new_brightness > best_brightness:
-                    best_center = new_center[:]
-                    best_diameter = new_diameter
-                    best_brightness = new_brightness
-                    current_center = new_center[:]
-                    current_diameter = new_diameter
-                    improved = True
-
-                    if iteration <= 20:
-                        print(
-                            f"  Iter {iteration}: ({current_center[0]:.1f}, {current_center[1]:.1f}), D={current_diameter:.1f}")
-                    break
-
-            if improved:
-                break
+                candidate_centers.append(new_center)
+                candidate_diameters.append(new_diameter)
+
+        if candidate_centers:
+            brightness = circle_brightness_sums(data_clean, candidate_centers, candidate_diameters, n_points)
+            evaluations += len(brightness)
+            better = np.flatnonzero(brightness > best_brightness)
+
+            if len(better) > 0:
+                # The greedy search accepts the first improving candidate in
+                # scan order, exactly as the sequential loop did.
+                first = better[0]
+                best_center = list(candidate_centers[first])
+                best_diameter = candidate_diameters[first]
+                best_brightness = brightness[first]
+                current_center = best_center[:]
+                current_diameter = best_diameter
+                improved = True
+
+                if iteration <= 20:
+                    log(DEBUG, "  Iter %d: (%.1f, %.1f), D=%.1f",
+                        iteration, current_center[0], current_center[1], current_diameter)
 
         if not improved:
             dd = dd * 0.6
 
-    print(f"Iterations: {iteration}")
-    print(f"Final center: ({best_center[0]:.2f}, {best_center[1]:.2f})")
-    print(f"Final diameter: {best_diameter:.2f} px")
-    print(f"Brightness: {best_brightness:.0f}")
+    log(INFO, "Iterations: %d", iteration)
+    log(INFO, "Final center: (%.2f, %.2f)", best_center[0], best_center[1])
+    log(INFO, "Final diameter: %.2f px", best_diameter)
+    log(INFO, "Brightness: %.0f", best_brightness)
+    count(bubbling_iterations=iteration, brightness_evaluations=evaluations)
+
+    if stats is not None:
+        stats['iterations'] = iteration
+        stats['evaluations'] = evaluations
+        stats['final_step'] = dd
+        stats['brightness'] = best_brightness
 
     return tuple(best_center), best_diameter
 
 
+def circle_brightness_gradient(image, center, diameter, n_points):
+    # circle_brightness_sums for one circle, with its gradient in
+    # (cx, cy, D). Between pixel boundaries the bilinear samples are smooth
+    # in the circle parameters, so the derivatives come from the same four
+    # pixels; on a boundary the cell to the right/below is used.
+    cos_table, sin_table = _circle_angle_table(n_points)
+    radius = diameter / 2
+    x = center[0] + radius * cos_table
+    y = center[1] + radius * sin_table
+    x_0, y_0 = np.floor(x), np.floor(y)
+
+    height, width = image.shape
+    valid = (x_0 >= 0) & (np.ceil(x) < width) & (y_0 >= 0) & (np.ceil(y) < height)
+    if np.count_nonzero(valid) < n_points * 0.7:
+        return 0.0, np.zeros(3)
+
+    x, y, x_0, y_0 = x[valid], y[valid], x_0[valid], y_0[valid]
+    xi_0, yi_0 = x_0.astype(np.intp), y_0.astype(np.intp)
+    xi_1, yi_1 = np.minimum(xi_0 + 1, width - 1), np.minimum(yi_0 + 1, height - 1)
+    dx, dy = x - x_0, y - y_0
+
+    top_left, top_right = image[yi_0, xi_0], image[yi_0, xi_1]
+    bottom_left, bottom_right = image[yi_1, xi_0], image[yi_1, xi_1]
+    values = (top_left * (1 - dx) * (1 - dy) + top_right * dx * (1 - dy) +
+              bottom_left * (1 - dx) * dy + bottom_right * dx * dy)
+
+    signs = np.sign(values)
+    grad_x = signs * ((top_right - top_left) * (1 - dy) + (bottom_right - bottom_left) * dy)
+    grad_y = signs * ((bottom_left - top_left) * (1 - dx) + (bottom_right - top_right) * dx)
+    gradient = np.array([grad_x.sum(), grad_y.sum(),
+                         0.5 * (grad_x @ cos_table[valid] + grad_y @ sin_table[valid])])
+
+    return float(np.abs(values).sum()), gradient
+
+
+def circle_quasi_newton(data_clean, initial_center, initial_diameter,
+                        initial_step=150.0, min_step=0.05, min_diameter=100, max_diameter=None,
+                        stats=None):
+    # Drop-in alternative to circle_bubbling_algorithm: BFGS ascent of the
+    # brightness sum on its analytic gradient, with backtracking line
+    # searches. The first step moves about initial_step; the search stops
+    # when no step longer than min_step improves the brightness along the
+    # gradient, or an iteration gains less than QUASI_NEWTON_FTOL of it.
+    # The sum is only piecewise smooth, so a compass search over steps of
+    # POLISH_STEPS * min_step down to min_step finishes the fit.
+    height, width = data_clean.shape
+    if max_diameter is None:
+        max_diameter = min(height, width) * 1.1
+    n_points = 600
+    lower = np.array([0.0, 0.0, min_diameter])
+    upper = np.array([width - 1.0, height - 1.0, max_diameter])
+
+    def brightness(params):
+        return circle_brightness_gradient(data_clean, params[:2], params[2], n_points)
+
+    current = np.clip(np.array([initial_center[0], initial_center[1], initial_diameter], dtype=float), lower, upper)
+    value, gradient = brightness(current)
+    evaluations = 1
+    step = float(initial_step)
+    inverse_hessian = None
+    restarted = True
+    iteration = 0
+    reason = "iteration limit"
+
+    log(DEBUG, "Start: center=(%.1f, %.1f), D=%.1f, step=%.1f", current[0], current[1], current[2], step)
+
+    while iteration < QUASI_NEWTON_MAX_ITERATIONS:
+        iteration += 1
+        norm = np.linalg.norm(gradient)
+        if norm == 0:
+            reason = "zero gradient"
+            break
+        if inverse_hessian is None:
+            inverse_hessian = np.eye(3) * (step / norm)
+        direction = inverse_hessian @ gradient
+
+        accepted = None
+        scale = 1.0
+        while True:
+            trial = np.clip(current + scale * direction, lower, upper)
+            move = trial - current
+            if np.linalg.norm(move) < min_step:
+                break
+            trial_value, trial_gradient = brightness(trial)
+            evaluations += 1
+            if trial_value > value + QUASI_NEWTON_ARMIJO * (gradient @ move):
+                accepted = trial
+                break
+            scale *= 0.5
+
+        if accepted is None:
+            # A kink can make the curvature estimate useless; one more try
+            # along the gradient before calling the fit converged.
+            if restarted:
+                reason = "no improving step above min_step"
+                break
+            inverse_hessian, restarted = None, True
+            continue
+
+        change = gradient - trial_gradient
+        curvature = move @ change
+        if curvature > 0:
+            identity = np.eye(3)
+            if restarted:
+                inverse_hessian = identity * (curvature / (change @ change))
+            rho = 1.0 / curvature
+            inverse_hessian = ((identity - rho * np.outer(move, change)) @ inverse_hessian @
+                               (identity - rho * np.outer(change, move)) + rho * np.outer(move, move))
+
+        gain = trial_value - value
+        current, value, gradient = accepted, trial_value, trial_gradient
+        step, restarted = float(np.linalg.norm(move)), False
+
+        if iteration <= 20:
+            log(DEBUG, "  Iter %d: (%.2f, %.2f), D=%.2f", iteration, current[0], current[1], current[2])
+        if gain <= QUASI_NEWTON_FTOL * abs(value):
+            reason = "relative gain below ftol"
+            break
+
+    polish = POLISH_STEPS * min_step
+    while polish >= min_step:
+        improved = False
+        for axis in range(3):
+            for sign in (1, -1):
+                trial = current.copy()
+                trial[axis] = np.clip(trial[axis] + sign * polish, lower[axis], upper[axis])
+                trial_value, trial_gradient = brightness(trial)
+                evaluations += 1
+                if trial_value > value:
+                    current, value, gradient = trial, trial_value, trial_gradient
+                    improved = True
+        if not improved:
+            polish /= 2
+
+    best_brightness = circle_brightness_sums(data_clean, [current[:2]], [current[2]], n_points)[0]
+    evaluations += 1
+
+    log(INFO, "Iterations: %d (%s)", iteration, reason)
+    log(INFO, "Final center: (%.2f, %.2f)", current[0], current[1])
+    log(INFO, "Final diameter: %.2f px", current[2])
+    log(INFO, "Brightness: %.0f", best_brightness)
+    count(bubbling_iterations=iteration, brightness_evaluations=evaluations)
+
+    if stats is not None:
+        stats['iterations'] = iteration
+        stats['evaluations'] = evaluations
+        stats['converged'] = reason != "iteration limit"
+        stats['stop_reason'] = reason
+        stats['brightness'] = best_brightness
+
+    return (float(current[0]), float(current[1])), float(current[2])
+
+
+CIRCLE_OPTIMIZERS = {
+    'greedy': circle_bubbling_algorithm,
+    'quasi-newton': circle_quasi_newton
+}
+
+# Optimizers that follow the limb ridge only from within a few pixels;
+# without a prior they start from the disk-area estimate.
+LOCAL_OPTIMIZERS = ('quasi-newton',)
+
+
+def downsample_image(image, factor):
+    height = image.shape[0] // factor * factor
+    width = image.shape[1] // factor * factor
+    cropped = image[:height, :width]
+    # Summing strided views is much faster than a reshape-mean over the
+    # interleaved block axes.
+    result = np.zeros((height // factor, width // factor))
+    for row in range(factor):
+        for col in range(factor):
+            result += cropped[row::factor, col::factor]
+    result /= factor * factor
+    return result
+
+
+def build_pyramid(image, levels=PYRAMID_LEVELS):
+    # Each level is averaged down from the next finer one when the factors
+    # divide evenly, so the full frame is only read once.
+    full_size = min(image.shape)
+    pyramid = []
+    source, source_factor = image, 1
+
+    for level in sorted(levels, reverse=True):
+        factor = full_size // level
+        if factor < 2:
+            continue
+
+        if factor % source_factor == 0:
+            source = downsample_image(source, factor // source_factor)
+        else:
+            source = downsample_image(image, factor)
+        source_factor = factor
+        pyramid.append((factor, source))
+
+    return pyramid[::-1]
+
+
+def circle_bubbling_pyramid(data_clean, initial_center, initial_diameter,
+                            levels=PYRAMID_LEVELS, initial_step=150.0, stats=None, fit=circle_bubbling_algorithm):
+    # Block k of a level with factor f covers full-resolution pixels
+    # k*f .. k*f + f - 1, so its center sits at k*f + (f - 1) / 2.
+    center = (float(initial_center[0]), float(initial_center[1]))
+    diameter = float(initial_diameter)
+    step = float(initial_step)
+    level_reports = []
+
+    start = time.perf_counter()
+    pyramid = build_pyramid(data_clean, levels)
+    build_time = time.perf_counter() - start
+
+    for factor, level_data in pyramid:
+        start = time.perf_counter()
+        offset = (factor - 1) / 2
+        level_stats = {}
+
+        log(DEBUG, "Pyramid level %dx%d (factor %d)", level_data.shape[1], level_data.shape[0], factor)
+        level_center, level_diameter = fit(
+            level_data,
+            ((center[0] - offset) / factor, (center[1] - offset) / factor),
+            diameter / factor,
+            initial_step=step / factor,
+            min_diameter=100 / factor,
+            stats=level_stats
+        )
+
+        center = (level_center[0] * factor + offset, level_center[1] * factor + offset)
+        diameter = level_diameter * factor
+        # The fit converged to a fraction of a coarse pixel; two coarse pixels
+        # are enough headroom for the block-averaging bias at the next level.
+        step = 2.0 * factor
+
+        level_reports.append({
+            'size': level_data.shape,
+            'factor': factor,
+            'iterations': level_stats['iterations'],
+            'evaluations': level_stats['evaluations'],
+            'wall_time': time.perf_counter() - start
+        })
+
+    start = time.perf_counter()
+    final_stats = {}
+    log(DEBUG, "Pyramid level %dx%d (full resolution)", data_clean.shape[1], data_clean.shape[0])
+    center, diameter = fit(
+        data_clean, center, diameter, initial_step=step, stats=final_stats
+    )
+    level_reports.append({
+        'size': data_clean.shape,
+        'factor': 1,
+        'iterations': final_stats['iterations'],
+        'evaluations': final_stats['evaluations'],
+        'wall_time': time.perf_counter() - start
+    })
+
+    for report in level_reports:
+        log(INFO, "  %dx%d: %d iterations, %d evaluations, %.3f s", report['size'][1], report['size'][0],
+            report['iterations'], report['evaluations'], report['wall_time'])
+    log(INFO, "  Pyramid build: %.3f s", build_time)
+
+    if stats is not None:
+        stats['levels'] = level_reports
+        stats['build_time'] = build_time
+        stats['iterations'] = sum(report['iterations'] for report in level_reports)
+        stats['evaluations'] = sum(report['evaluations'] for report in level_reports)
+        stats['brightness'] = final_stats['brightness']
+
+    return center, diameter
+
+
 class CircleBubblingMethod(HMI_Processor):
-    def __init__(self):
+    requires = ('abs',)
+    white_light_requires = ('filtered_white_light', 'limb_filtered_white_light')
+
+    def __init__(self, pyramid=False, roi_width=None, optimizer='greedy'):
         super().__init__()
+        if optimizer not in CIRCLE_OPTIMIZERS:
+            raise ValueError(f"Unknown circle optimizer: {optimizer}")
+        self.pyramid = pyramid
+        self.roi_width = roi_width
+        self.optimizer = optimizer
         
-    def solar_center(self):
+    def solar_center(self, context=None):
         if self.data is None:
-            print("No data loaded. Call read_fits() first.")
+            log(ERROR, "No data loaded. Call read_fits() first.")
             return None, None, None
         
-        return self.process_method(self.data)
+        return self.process_method(self.data, context)
+
+    def fit_circle(self, image, initial_center, initial_diameter, initial_step=150.0, diameter_range=None):
+        fit = CIRCLE_OPTIMIZERS[self.optimizer]
+        if diameter_range is not None:
+            # A prior already pins the circle, so the coarse pyramid levels
+            # would have nothing left to do.
+            return fit(image, initial_center, initial_diameter, initial_step=initial_step,
+                       min_diameter=diameter_range[0], max_diameter=diameter_range[1])
+
+        if self.pyramid:
+            return circle_bubbling_pyramid(image, initial_center, initial_diameter, initial_step=initial_step,
+                                           fit=fit)
+
+        return fit(image, initial_center, initial_diameter, initial_step=initial_step)
+
+    def prior_start(self, prior):
+        # Priors may carry their own step and diameter range; a tracker
+        # prediction is tighter than a header prior.
+        diameter = 2 * prior['radius']
+        slack = prior.get('diameter_range', PRIOR_DIAMETER_RANGE)
+        diameter_range = (diameter * (1 - slack), diameter * (1 + slack))
+        log(INFO, "Starting from %s prior", prior.get('source', 'disk'))
+        return prior['center'], diameter, prior.get('step', PRIOR_STEP), diameter_range
+
+    def white_light_start(self, white_data, prior=None, context=None):
+        height, width = white_data.shape
+        initial_center = (width / 2, height / 2)
+
+        if prior is not None:
+            initial_center, initial_diameter, initial_step, diameter_range = self.prior_start(prior)
+            roi = None
+            roi_width = prior.get('roi_width', self.roi_width)
+            if roi_width is not None:
+                roi = (initial_center, prior['radius'], roi_width)
+            filtered_data = self.filtered(white_data, roi, context, key='circle_bubbling_roi')
+            return filtered_data, initial_center, initial_diameter, initial_step, diameter_range
+
+        if self.roi_width is not None:
+            limb_center, limb_radius = expected_limb(white_data, self.quantiles)
+            if limb_center is not None:
+                log(INFO, "Filtering limb ROI: radius %.1f +- %d px", limb_radius, self.roi_width)
+                filtered_data = self.filtered(white_data, (limb_center, limb_radius, self.roi_width), context,
+                                              key='circle_bubbling_roi')
+                # Steps beyond the ROI would only sample zeros.
+                return filtered_data, limb_center, 2 * limb_radius, float(self.roi_width), None
+
+        filtered_data = self.filtered(white_data, context=context)
+
+        if self.optimizer in LOCAL_OPTIMIZERS:
+            limb_center, limb_radius = expected_limb(white_data, self.quantiles)
+            if limb_center is not None:
+                return filtered_data, limb_center, 2 * limb_radius, PRIOR_STEP, None
+
+        threshold = self.percentile(filtered_data, 80, key='filtered_white_light')
+        mask = filtered_data > threshold
+
+        if np.sum(mask) > 1000:
+            y_idx, x_idx = np.where(mask)
+            if len(x_idx) > 0:
+                initial_diameter = (np.max(x_idx) - np.min(x_idx) +
+                                    np.max(y_idx) - np.min(y_idx)) / 2
+            else:
+                initial_diameter = min(height, width) * 0.8
+        else:
+            initial_diameter = min(height, width) * 0.8
+
+        return filtered_data, initial_center, initial_diameter, 150.0, None
     
-    def process_method(self, data_clean):
+    def process_method(self, data_clean, context=None):
         try:
-            white_data = CircleBubblingData.get_white_light_data()
+            white_data = self.white_light(context)
 
             if white_data is not None:
-                print("Circle Bubbling: using WHITE LIGHT data")
-                filtered_data = apply_article_filters(white_data)
-                height, width = filtered_data.shape
-                initial_center = (width / 2, height / 2)
-
-                threshold = np.percentile(filtered_data, 80)
-                mask = filtered_data > threshold
-
-                if np.sum(mask) > 1000:
-                    y_idx, x_idx = np.where(mask)
-                    if len(x_idx) > 0:
-                        initial_diameter = (np.max(x_idx) - np.min(x_idx) +
-                                            np.max(y_idx) - np.min(y_idx)) / 2
-                    else:
-                        initial_diameter = min(height, width) * 0.8
-                else:
-                    initial_diameter = min(height, width) * 0.8
+                log(INFO, "Circle Bubbling: using WHITE LIGHT data")
+                prior = self.frame_prior(context, white_light=True)
+                filtered_data, initial_center, initial_diameter, initial_step, diameter_range = \
+                    self.white_light_start(white_data, prior, context)
 
-                print(f"Start from center: {initial_center}")
-                print(f"Initial diameter: {initial_diameter:.1f} px")
+                log(INFO, "Start from center: %s", initial_center)
+                log(INFO, "Initial diameter: %.1f px", initial_diameter)
 
-                center, final_diameter = circle_bubbling_algorithm(
-                    filtered_data, initial_center, initial_diameter
+                center, final_diameter = self.fit_circle(
+                    filtered_data, initial_center, initial_diameter,
+                    initial_step=initial_step, diameter_range=diameter_range
                 )
 
                 method_name = "Circle Bubbling (white light)"
@@ -173,26 +669,33 @@ class CircleBubblingMethod(HMI_Processor):
                 uncertainty_data = white_data
 
             else:
-                print("Circle Bubbling: using magnetogram data")
-                height, width = data_clean.shape
-                initial_center = (width / 2, height / 2)
-                working_data = np.abs(data_clean)
-                threshold = np.percentile(working_data, 80)
-                mask = working_data > threshold
+                log(INFO, "Circle Bubbling: using magnetogram data")
+                working_data = self.intermediate('abs', data_clean, context)
+                prior = self.frame_prior(context)
 
-                if len(mask) == 0 or np.sum(mask) == 0:
-                    return None, "Circle Bubbling", None
+                if prior is not None:
+                    initial_center, initial_diameter, initial_step, diameter_range = self.prior_start(prior)
+                else:
+                    height, width = data_clean.shape
+                    initial_center = (width / 2, height / 2)
+                    initial_step, diameter_range = 150.0, None
+                    threshold = self.percentile(working_data, 80, key='abs')
+                    mask = working_data > threshold
 
-                y_indices, x_indices = np.where(mask)
+                    if len(mask) == 0 or np.sum(mask) == 0:
+                        return None, "Circle Bubbling", None
 
-                if len(x_indices) > 0:
-                    initial_diameter = (np.max(x_indices) - np.min(x_indices) +
-                                        np.max(y_indices) - np.min(y_indices)) / 2
-                else:
-                    initial_diameter = min(data_clean.shape) * 0.5
+                    y_indices, x_indices = np.where(mask)
+
+                    if len(x_indices) > 0:
+                        initial_diameter = (np.max(x_indices) - np.min(x_indices) +
+                                            np.max(y_indices) - np.min(y_indices)) / 2
+                    else:
+                        initial_diameter = min(data_clean.shape) * 0.5
 
-                center, final_diameter = circle_bubbling_algorithm(
-                    working_data, initial_center, initial_diameter
+                center, final_diameter = self.fit_circle(
+                    working_data, initial_center, initial_diameter,
+                    initial_step=initial_step, diameter_range=diameter_range
                 )
 
                 method_name = "Circle Bubbling (magnetogram)"
@@ -203,7 +706,8 @@ class CircleBubblingMethod(HMI_Processor):
                 uncertainty_data,
                 center,
                 disk_radius=final_diameter / 2,
-                edge_width=10
+                edge_width=10,
+                quantiles=self.quantiles
             )
 
             if uncertainty:
@@ -222,13 +726,23 @@ class CircleBubblingMethod(HMI_Processor):
             return center, method_name, uncertainty
 
         except Exception as e:
-            print(f"Circle bubbling method failed: {e}")
-            import traceback
-            traceback.print_exc()
+            # The traceback goes with the process_method stage record and is
+            # only printed at DEBUG.
+            details = traceback.format_exc()
+            annotate(error=str(e), traceback=details)
+            log(ERROR, "Circle bubbling method failed: %s", e)
+            log(DEBUG, "%s", details)
             return None, "Circle Bubbling", None
 
 
-def circle_bubbling_method(data_clean):
-    processor = CircleBubblingMethod()
+def circle_bubbling_method(data_clean, pyramid=False, roi_width=None, optimizer='greedy', quantiles=None, prior=None,
+                           context=None):
+    processor = CircleBubblingMethod(pyramid=pyramid, roi_width=roi_width, optimizer=optimizer)
     processor.data = data_clean
-    return processor.solar_center()
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+circle_bubbling_method.requires = CircleBubblingMethod.requires
+circle_bubbling_method.white_light_requires = CircleBubblingMethod.white_light_requires
@@ -0,0 +1,41 @@
+import sys
+from importlib import import_module
+
+# Each command's module is imported only when that command runs, so
+# `cli.py benchmark` never loads Fido and `cli.py batch --files` never
+# loads the benchmark.
+COMMANDS = {
+    'compare': ('finding_center', "compare the centering methods on one frame"),
+    'batch': ('batch_processing', "process a time range or a list of FITS files"),
+    'benchmark': ('benchmark', "benchmark the methods on synthetic solar disks")
+}
+
+
+def usage():
+    lines = ["usage: cli.py <command> [options]", "", "commands:"]
+    for name, (_, description) in COMMANDS.items():
+        lines.append(f"  {name:<11}{description}")
+    lines.append("")
+    lines.append("Run 'cli.py <command> --help' for the options of a command.")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return 0 if argv else 2
+
+    if argv[0] not in COMMANDS:
+        print(f"cli.py: unknown command {argv[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+
+    module = import_module(COMMANDS[argv[0]][0])
+    status = module.main(argv[1:])
+    # batch returns its throughput report rather than an exit status.
+    return status if isinstance(status, int) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
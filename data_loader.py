@@ -1,88 +1,150 @@
-import sunpy.map
 import numpy as np
 from datetime import datetime, timedelta
-from sunpy.net import Fido, attrs as a
-import astropy.units as u
-import os
-import glob
-from white_light_finder import get_white_light_center
-from circle_bubbling_method import CircleBubblingData
-
-
-def load_and_prepare_data(target_date=None):
-    print("\nLoading white light data")
-    white_light_center, white_map = get_white_light_center(target_date)
-
-    if white_map is not None:
-        white_data_clean = np.nan_to_num(white_map.data, nan=0.0)
-        CircleBubblingData.set_white_light_data(white_data_clean)
-        print(f"White light data stored for Circle Bubbling")
-
-    if target_date is not None:
-        try:
-            date_str = target_date.strftime('%Y-%m-%d %H:%M:%S')
-            start_time = date_str
-            end_time = (target_date + timedelta(minutes=10)).strftime('%Y-%m-%d %H:%M:%S')
-
-            print(f"Searching for HMI magnetogram data from {start_time} to {end_time}...")
-
-            result = Fido.search(a.Time(start_time, end_time),
-                                 a.Instrument('HMI'),
-                                 a.Physobs('los_magnetic_field'),
-                                 a.Sample(720 * u.s))
-
-            print(f"Found {len(result[0])} files")
-
-            if len(result[0]) > 0:
-                sunpy_data_dir = "C:\\Users\\user\\sunpy\\data"
-                if os.path.exists(sunpy_data_dir):
-                    search_pattern = os.path.join(sunpy_data_dir,
-                                                  f"*{target_date.strftime('%Y.%m.%d')}*magnetogram*.fits")
-                    existing_files = glob.glob(search_pattern)
-
-                    if existing_files:
-                        print(f"Found existing magnetogram file: {existing_files[0]}")
-                        sample_map = sunpy.map.Map(existing_files[0])
-                        print(f"Loaded magnetogram data for: {sample_map.date}")
-                    else:
-                        print("No existing magnetogram files found, downloading...")
-                        downloaded_files = Fido.fetch(result[0][0])
-                        sample_map = sunpy.map.Map(downloaded_files[0])
-                        print(f"Successfully loaded magnetogram data for: {sample_map.date}")
+from fits_archive import get_archive
+from fits_io import read_map
+from white_light_finder import get_white_light_center, estimate_white_light_center
+from frame_context import FrameContext
+from disk_prior import header_prior
+from instrumentation import ERROR, INFO, log, stage, annotate, data_fields
+
+
+def fetch_magnetogram(target_date, archive):
+    # Fido and its network clients are only loaded when a file has to be
+    # downloaded.
+    import astropy.units as u
+    from sunpy.net import Fido, attrs as a
+
+    date_str = target_date.strftime('%Y-%m-%d %H:%M:%S')
+    start_time = date_str
+    end_time = (target_date + timedelta(minutes=10)).strftime('%Y-%m-%d %H:%M:%S')
+
+    log(INFO, "Searching for HMI magnetogram data from %s to %s...", start_time, end_time)
+
+    result = Fido.search(a.Time(start_time, end_time),
+                         a.Instrument('HMI'),
+                         a.Physobs('los_magnetic_field'),
+                         a.Sample(720 * u.s))
+
+    log(INFO, "Found %d files", len(result[0]))
+
+    if len(result[0]) == 0:
+        return None
+
+    log(INFO, "Downloading magnetogram...")
+    downloaded_files = Fido.fetch(result[0][0])
+    archive.add(downloaded_files)
+    return downloaded_files[0]
+
+
+def clean_map_data(sample_map, banded_float32=False):
+    if banded_float32:
+        # read_fits_float32 already replaced NaNs in its float32 array.
+        return sample_map, sample_map.data
+
+    import sunpy.map
+
+    data_clean = np.nan_to_num(sample_map.data, nan=0.0)
+    return sunpy.map.Map(data_clean, sample_map.meta), data_clean
+
+
+def map_prior(sample_map):
+    prior = header_prior(sample_map.meta, sample_map.data.shape)
+    if prior is not None:
+        log(INFO, "Header prior: center (%.2f, %.2f), radius %.2f px",
+            prior['center'][0], prior['center'][1], prior['radius'])
+    return prior
+
+
+def load_and_prepare_data(target_date=None, archive=None, banded_float32=False, quantiles=None, use_prior=True):
+    if archive is None:
+        archive = get_archive()
+
+    white_data_clean, white_prior = None, None
+    log(INFO, "\nLoading white light data")
+    with stage('load_white_light', banded_float32=banded_float32):
+        white_light_center, white_map = get_white_light_center(target_date, archive=archive,
+                                                               banded_float32=banded_float32,
+                                                               quantiles=quantiles)
+
+        if white_map is not None:
+            _, white_data_clean = clean_map_data(white_map, banded_float32)
+            white_prior = map_prior(white_map) if use_prior else None
+            annotate(**data_fields(white_data_clean))
+            log(INFO, "White light data stored in the frame context")
+
+    with stage('load_magnetogram', banded_float32=banded_float32):
+        if target_date is not None:
+            try:
+                magnetogram_file = archive.nearest(target_date, 'los_magnetic_field')
+
+                if magnetogram_file:
+                    log(INFO, "Found archived magnetogram file: %s", magnetogram_file)
                 else:
-                    print("SunPy data directory not found, downloading magnetogram...")
-                    downloaded_files = Fido.fetch(result[0][0])
-                    sample_map = sunpy.map.Map(downloaded_files[0])
-                    print(f"Successfully loaded magnetogram data for: {sample_map.date}")
+                    magnetogram_file = fetch_magnetogram(target_date, archive)
 
-            else:
-                print(f"No magnetogram data found for {target_date}, using sample data")
-                from sunpy.data.sample import HMI_LOS_IMAGE
-                sample_map = sunpy.map.Map(HMI_LOS_IMAGE)
+                if magnetogram_file:
+                    sample_map = read_map(magnetogram_file, banded_float32)
+                    log(INFO, "Loaded magnetogram data for: %s", sample_map.date)
+                else:
+                    log(INFO, "No magnetogram data found for %s, using sample data", target_date)
+                    from sunpy.data.sample import HMI_LOS_IMAGE
+                    sample_map = read_map(HMI_LOS_IMAGE, banded_float32)
 
-        except Exception as e:
-            print(f"Error loading magnetogram data: {e}")
-            print("Using sample magnetogram data instead")
+            except Exception as e:
+                log(ERROR, "Error loading magnetogram data: %s", e)
+                log(ERROR, "Using sample magnetogram data instead")
+                from sunpy.data.sample import HMI_LOS_IMAGE
+                sample_map = read_map(HMI_LOS_IMAGE, banded_float32)
+        else:
             from sunpy.data.sample import HMI_LOS_IMAGE
-            sample_map = sunpy.map.Map(HMI_LOS_IMAGE)
+            sample_map = read_map(HMI_LOS_IMAGE, banded_float32)
+
+        log(INFO, "Magnetogram data shape: %s", sample_map.data.shape)
+        log(INFO, "Magnetogram observation date: %s", sample_map.date)
+
+        sample_map_clean, data_clean = clean_map_data(sample_map, banded_float32)
+        annotate(**data_fields(data_clean))
+
+    if white_light_center:
+        reference_center = white_light_center
+        log(INFO, "Using white light center as reference: (%.2f, %.2f)", reference_center[0], reference_center[1])
     else:
-        from sunpy.data.sample import HMI_LOS_IMAGE
-        sample_map = sunpy.map.Map(HMI_LOS_IMAGE)
+        height, width = data_clean.shape
+        reference_center = (width / 2, height / 2)
+        log(INFO, "Using image center as reference: (%.2f, %.2f)", reference_center[0], reference_center[1])
+
+    context = FrameContext(data_clean, white_light=white_data_clean, white_light_prior=white_prior,
+                           metadata=sample_map_clean.meta)
+    return sample_map_clean, data_clean, reference_center, context
+
+
+def load_local_frame(magnetogram_file, white_light_file=None, banded_float32=False, quantiles=None,
+                     use_prior=True):
+    white_light_center = None
+    white_data_clean, white_prior = None, None
 
-    print(f"Magnetogram data shape: {sample_map.data.shape}")
-    print(f"Magnetogram observation date: {sample_map.date}")
+    if white_light_file is not None:
+        with stage('load_white_light', banded_float32=banded_float32, file=white_light_file):
+            white_map = read_map(white_light_file, banded_float32)
+            log(INFO, "Loaded white light: %s", white_map.date)
+            _, white_data_clean = clean_map_data(white_map, banded_float32)
+            white_light_center = estimate_white_light_center(white_data_clean, clean=True, quantiles=quantiles)
+            white_prior = map_prior(white_map) if use_prior else None
+            annotate(**data_fields(white_data_clean))
 
-    data = sample_map.data
-    data_clean = np.nan_to_num(data, nan=0.0)
+    with stage('load_magnetogram', banded_float32=banded_float32, file=magnetogram_file):
+        sample_map = read_map(magnetogram_file, banded_float32)
+        log(INFO, "Loaded magnetogram data for: %s", sample_map.date)
 
-    sample_map_clean = sunpy.map.Map(data_clean, sample_map.meta)
+        sample_map_clean, data_clean = clean_map_data(sample_map, banded_float32)
+        annotate(**data_fields(data_clean))
 
     if white_light_center:
         reference_center = white_light_center
-        print(f"Using white light center as reference: ({reference_center[0]:.2f}, {reference_center[1]:.2f})")
     else:
         height, width = data_clean.shape
         reference_center = (width / 2, height / 2)
-        print(f"Using image center as reference: ({reference_center[0]:.2f}, {reference_center[1]:.2f})")
 
-    return sample_map_clean, data_clean, reference_center
+    context = FrameContext(data_clean, white_light=white_data_clean, white_light_prior=white_prior,
+                           metadata=sample_map_clean.meta)
+    return sample_map_clean, data_clean, reference_center, context
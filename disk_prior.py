@@ -0,0 +1,69 @@
+import numpy as np
+
+ARCSEC_PER_UNIT = {
+    'arcsec': 1.0,
+    'arcmin': 60.0,
+    'deg': 3600.0,
+    'rad': 180 * 3600 / np.pi
+}
+
+
+def _header_float(header, key, default=None):
+    value = header.get(key, default)
+    if value is None:
+        return default
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return value if np.isfinite(value) else default
+
+
+def _arcsec_per_unit(header, axis):
+    unit = str(header.get(f'CUNIT{axis}', 'arcsec') or 'arcsec').strip().lower()
+    return ARCSEC_PER_UNIT.get(unit)
+
+
+def header_prior(header, shape=None):
+    if header is None:
+        return None
+
+    crpix = _header_float(header, 'CRPIX1'), _header_float(header, 'CRPIX2')
+    cdelt = _header_float(header, 'CDELT1'), _header_float(header, 'CDELT2')
+    units = _arcsec_per_unit(header, 1), _arcsec_per_unit(header, 2)
+    if None in crpix or None in cdelt or None in units or 0.0 in cdelt:
+        return None
+
+    cdelt = cdelt[0] * units[0], cdelt[1] * units[1]
+    crval = _header_float(header, 'CRVAL1', 0.0) * units[0], _header_float(header, 'CRVAL2', 0.0) * units[1]
+    angle = np.radians(_header_float(header, 'CROTA2', 0.0))
+
+    # Pixel offsets map to helioprojective offsets through the CDELT-scaled
+    # rotation; the disk center is at (0, 0), which is CRVAL for HMI.
+    # FITS pixels are 1-based.
+    cd = np.array([[cdelt[0] * np.cos(angle), -cdelt[1] * np.sin(angle)],
+                   [cdelt[0] * np.sin(angle), cdelt[1] * np.cos(angle)]])
+    offset = np.linalg.solve(cd, [-crval[0], -crval[1]])
+    center = (crpix[0] - 1 + offset[0], crpix[1] - 1 + offset[1])
+
+    # HMI records the radius in pixels as R_SUN next to RSUN_OBS in arcsec.
+    radius = _header_float(header, 'R_SUN')
+    if radius is None:
+        rsun_obs = _header_float(header, 'RSUN_OBS')
+        if rsun_obs is None:
+            return None
+        radius = rsun_obs / abs(cdelt[0])
+
+    if radius <= 0:
+        return None
+
+    if shape is not None:
+        height, width = shape
+        if not (0 <= center[0] < width and 0 <= center[1] < height):
+            return None
+
+    return {
+        'center': (float(center[0]), float(center[1])),
+        'radius': float(radius),
+        'source': 'header'
+    }
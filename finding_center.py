@@ -1,30 +1,233 @@
-import pandas as pd
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime
-from data_loader import load_and_prepare_data
 from mass_center_method import center_of_mass
 from image_moments_method import moments_analysis
 from gradient_symmetry_method import gradient_symmetry
 from circle_bubbling_method import circle_bubbling_method
+from limb_fit_method import limb_fit
+from hough_method import hough_transform
+from bootstrap_uncertainty import BOOTSTRAP_SAMPLES, apply_bootstrap
+from intermediates import FrameIntermediates, consumer_needs, limb_annulus
+from frame_context import FrameContext
+from shared_frames import share_frame, submit_shared
 from metrics import calculate_metrics, calculate_average_center
+from quantiles import QuantileEngine
+from instrumentation import ERROR, INFO, enabled, log, stage
 import numpy as np
 
 
-def run_comparison():
-    target_date_ = datetime(2025, 11, 11, 2, 0, 0)
-    sample_map, data_clean, reference_center = load_and_prepare_data(target_date_)
+METHODS = [
+    center_of_mass,
+    moments_analysis,
+    gradient_symmetry,
+    circle_bubbling_method,
+    limb_fit,
+    hough_transform
+]
 
-    methods = [
-        center_of_mass,
-        moments_analysis,
-        gradient_symmetry,
-        circle_bubbling_method
-    ]
+# Bumped when a method's results change, so stored results for the old
+# version are recomputed on resume.
+METHOD_VERSIONS = {
+    'center_of_mass': 1,
+    'moments_analysis': 1,
+    'gradient_symmetry': 1,
+    'circle_bubbling_method': 1,
+    'limb_fit': 2,
+    'hough_transform': 1
+}
+
+
+def frame_quantiles(mode='exact', tolerance=1e-4):
+    quantiles = QuantileEngine(mode=mode, tolerance=tolerance)
+    quantiles.request('abs', 80)
+    quantiles.request('gradient_magnitude', 70)
+    quantiles.request('filtered_white_light', 80)
+    quantiles.request('white_light', 90, 92)
+    return quantiles
+
+
+def run_comparison(target_date=datetime(2025, 11, 11, 2, 0, 0), use_prior=True, bootstrap_samples=0,
+                   bootstrap_workers=1):
+    # The loaders bring in sunpy and Fido; comparisons on arrays never need them.
+    from data_loader import load_and_prepare_data, map_prior
+
+    quantiles = frame_quantiles()
+    sample_map, data_clean, reference_center, context = load_and_prepare_data(target_date, quantiles=quantiles,
+                                                                              use_prior=use_prior)
+    prior = map_prior(sample_map) if use_prior else None
+    return compare_methods(data_clean, reference_center, quantiles=quantiles, prior=prior,
+                           bootstrap_samples=bootstrap_samples, bootstrap_workers=bootstrap_workers, context=context)
+
+
+RESULT_COLUMNS = ['Method', 'Center_X', 'Center_Y', 'Error_pixels', 'Delta_X', 'Delta_Y']
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor
+}
+
+# How a process pool gets the frame: pickled with every method, or copied
+# once into shared memory that the workers attach to.
+TRANSPORTS = ('pickle', 'shared')
+
+
+def method_options(method, quantiles, prior, context):
+    # Only methods that declare their intermediates take the frame context.
+    options = {'quantiles': quantiles, 'prior': prior}
+    if context is not None and hasattr(method, 'requires'):
+        options['context'] = context
+    return options
+
+
+def frame_intermediates(context, methods, bootstrap=False, prior=None):
+    consumers = [method for method in methods if hasattr(method, 'requires')]
+    if bootstrap:
+        consumers.append(apply_bootstrap)
+    # The limb annulus is filtered around the prior the white-light methods
+    # start from.
+    limb = None
+    if context.white_light is not None:
+        limb = limb_annulus(context.method_prior(prior, white_light=True))
+    return FrameIntermediates(context.data, {consumer.__name__: consumer_needs(consumer, context.white_light)
+                                             for consumer in consumers}, white_light=context.white_light, limb=limb)
+
+
+def run_methods(data_clean, methods, quantiles=None, executor=None, max_workers=None, timeout=None, prior=None,
+                runtimes=None, context=None, transport='pickle'):
+    if transport not in TRANSPORTS:
+        raise ValueError(f"Unknown frame transport: {transport}")
+    if runtimes is None:
+        runtimes = {}
+    intermediates = None if context is None else context.intermediates
+
+    if executor is None and timeout is None:
+        by_name = {method.__name__: method for method in methods}
+        order = list(by_name) if intermediates is None else intermediates.run_order(list(by_name))
+        results = {}
+        for name in order:
+            method = by_name[name]
+            start = time.perf_counter()
+            try:
+                results[name] = method(data_clean, **method_options(method, quantiles, prior, context))
+            finally:
+                if intermediates is not None:
+                    intermediates.release(name)
+            runtimes[name] = time.perf_counter() - start
+        return [results[method.__name__] for method in methods]
+
+    executor_class = EXECUTORS[executor or 'thread']
+    # Threads see the frame anyway; only process workers need it shipped.
+    shared = share_frame(data_clean, context) if transport == 'shared' and executor == 'process' else None
+    pool = executor_class(max_workers=max_workers or len(methods))
+    results = []
+
+    try:
+        submitted = time.perf_counter()
+        futures = []
+        for method in methods:
+            options = method_options(method, quantiles, prior, context)
+            if shared is not None:
+                future = submit_shared(pool, shared, method, options)
+            else:
+                future = pool.submit(method, data_clean, **options)
+            if intermediates is not None:
+                # A timed-out method keeps its planes until it returns.
+                future.add_done_callback(lambda _, name=method.__name__: intermediates.release(name))
+            futures.append(future)
+
+        # Results are gathered in submission order. Deadlines count from
+        # submission, so max_workers should cover all methods when timeouts
+        # are used; a timed-out method keeps running in its worker until it
+        # returns, but the frame no longer waits for it.
+        for method, future in zip(methods, futures):
+            remaining = None if timeout is None else max(0.0, submitted + timeout - time.perf_counter())
+            try:
+                results.append(future.result(timeout=remaining))
+                # Parallel runtimes are measured from submission.
+                runtimes[method.__name__] = time.perf_counter() - submitted
+            except FuturesTimeout:
+                log(ERROR, "%s timed out after %.1f s", method.__name__, timeout)
+                results.append((None, method.__name__, None))
+            except Exception as e:
+                log(ERROR, "%s failed: %s", method.__name__, e)
+                results.append((None, method.__name__, None))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        # Every result of the frame is in (or timed out), so its blocks go.
+        if shared is not None:
+            shared.unlink()
+
+    return results
+
+
+def report_method_result(method_name_, center, error, dx, dy, uncertainty):
+    print(f"\n{method_name_}:")
+    print(f"  Center: ({center[0]:.2f}, {center[1]:.2f})")
+    print(f"  Error: {error:.2f} pixels")
+    print(f"  Delta: (Δx={dx:+.2f}, Δy={dy:+.2f})")
+
+    if uncertainty:
+        std_x, std_y = uncertainty['std_pixels']
+        print(f"  Uncertainty (1σ): ±({std_x:.2f}, {std_y:.2f}) pixels")
+
+        if 'correlation' in uncertainty:
+            print(f"  Correlation: {uncertainty['correlation']:.3f}")
+
+        if 'final_diameter' in uncertainty:
+            print(f"  Final diameter: {uncertainty['final_diameter']:.2f} pixels")
+
+        if 'edge_pixels_used' in uncertainty:
+            print(f"  Edge pixels used: {uncertainty['edge_pixels_used']} "
+                  f"(out of {uncertainty['total_edge_pixels']})")
+
+
+def compare_methods(data_clean, reference_center, methods=None, quantiles=None,
+                    executor=None, max_workers=None, timeout=None, prior=None,
+                    bootstrap_samples=0, bootstrap_seed=0, bootstrap_workers=1, method_runs=None,
+                    share_intermediates=True, intermediate_stats=None, context=None, transport='pickle'):
+    if methods is None:
+        methods = METHODS
+
+    if quantiles is None:
+        quantiles = frame_quantiles()
+
+    # Each run gets its own copy of the context, so a frame run twice (as
+    # tracking does after losing the disk) starts from fresh intermediates.
+    if context is None:
+        context = FrameContext(data_clean)
+    context = context.replace(data=data_clean, intermediates=None)
+    if share_intermediates:
+        context.intermediates = frame_intermediates(context, methods, bootstrap_samples > 0, prior)
+    intermediates = context.intermediates
 
     results = []
     uncertainties_ = {}
 
-    for method in methods:
-        result = method(data_clean)
+    runtimes = {}
+    with stage('run_methods', methods=len(methods), executor=executor):
+        method_results = run_methods(data_clean, methods, quantiles, executor=executor,
+                                     max_workers=max_workers, timeout=timeout, prior=prior, runtimes=runtimes,
+                                     context=context, transport=transport)
+
+    if method_runs is not None:
+        for method, result in zip(methods, method_results):
+            method_runs.append({'method': method.__name__, 'label': result[1], 'ok': result[0] is not None,
+                                'runtime': runtimes.get(method.__name__)})
+
+    if bootstrap_samples:
+        apply_bootstrap(data_clean, method_results, samples=bootstrap_samples, seed=bootstrap_seed,
+                        max_workers=bootstrap_workers, context=context)
+
+    if intermediates is not None:
+        intermediates.close()
+        log(INFO, "Intermediates: %.1f MB allocated for %.1f MB requested",
+            intermediates.stats['allocated_bytes'] / 2 ** 20, intermediates.stats['requested_bytes'] / 2 ** 20)
+        if intermediate_stats is not None:
+            intermediate_stats.update(intermediates.stats)
+
+    for result in method_results:
         if result[0] is not None:
             center, method_name_, uncertainty = result
             error, dx, dy = calculate_metrics(center, reference_center)
@@ -40,33 +243,20 @@ def run_comparison():
 
             uncertainties_[method_name_] = uncertainty
 
-            print(f"\n{method_name_}:")
-            print(f"  Center: ({center[0]:.2f}, {center[1]:.2f})")
-            print(f"  Error: {error:.2f} pixels")
-            print(f"  Delta: (Δx={dx:+.2f}, Δy={dy:+.2f})")
-
-            if uncertainty:
-                std_x, std_y = uncertainty['std_pixels']
-                print(f"  Uncertainty (1σ): ±({std_x:.2f}, {std_y:.2f}) pixels")
-
-                if 'correlation' in uncertainty:
-                    print(f"  Correlation: {uncertainty['correlation']:.3f}")
+            if enabled(INFO):
+                report_method_result(method_name_, center, error, dx, dy, uncertainty)
 
-                if 'final_diameter' in uncertainty:
-                    print(f"  Final diameter: {uncertainty['final_diameter']:.2f} pixels")
+    if enabled(INFO):
+        ref_info = f"({reference_center[0]:.2f}, {reference_center[1]:.2f})"
+        print(f"\n{'Reference (given center coordinates)':<25}: {ref_info}")
 
-                if 'edge_pixels_used' in uncertainty:
-                    print(f"  Edge pixels used: {uncertainty['edge_pixels_used']} "
-                          f"(out of {uncertainty['total_edge_pixels']})")
+    import pandas as pd
 
-    ref_info = f"({reference_center[0]:.2f}, {reference_center[1]:.2f})"
-    print(f"\n{'Reference (given center coordinates)':<25}: {ref_info}")
-
-    df_results = pd.DataFrame(results)
+    df_results = pd.DataFrame(results, columns=RESULT_COLUMNS)
 
     averaging_results_ = calculate_average_center(df_results, reference_center)
 
-    if averaging_results_:
+    if averaging_results_ and enabled(INFO):
         simple_avg_ = averaging_results_['simple_average']
         weighted_avg = averaging_results_['weighted_average']
 
@@ -82,9 +272,25 @@ def run_comparison():
     return df_results, averaging_results_, uncertainties_
 
 
-results_df, averaging_results, uncertainties = run_comparison()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the centering methods on one HMI frame")
+    parser.add_argument('--date', type=datetime.fromisoformat, default=datetime(2025, 11, 11, 2, 0, 0),
+                        help="observation time (ISO format)")
+    parser.add_argument('--no-header-prior', action='store_true', help="ignore the FITS-header disk geometry")
+    parser.add_argument('--bootstrap', type=int, default=0, metavar='SAMPLES',
+                        help=f"bootstrap samples for the limb-fit uncertainty, e.g. {BOOTSTRAP_SAMPLES} "
+                             f"(default: off)")
+    parser.add_argument('--bootstrap-workers', type=int, default=1,
+                        help="processes for the bootstrap resampling (default: in-process)")
+    args = parser.parse_args(argv)
+
+    results_df, averaging_results, uncertainties = run_comparison(args.date, use_prior=not args.no_header_prior,
+                                                                  bootstrap_samples=args.bootstrap,
+                                                                  bootstrap_workers=args.bootstrap_workers)
+
+    if results_df.empty:
+        return
 
-if not results_df.empty:
     best_method = results_df.loc[results_df['Error_pixels'].idxmin()]
     print(f"\nMost Accurate: {best_method['Method']} "
           f"(Error: {best_method['Error_pixels']:.2f} px)")
@@ -103,3 +309,7 @@ if not results_df.empty:
             mean_std = np.mean(unc['std_pixels'])
             reliability = row['Error_pixels'] / mean_std if mean_std > 0 else 0
             print(f"  {method_name}: {reliability:.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import calendar
+import os
+import re
+import sqlite3
+import threading
+from datetime import timedelta
+from sqlite_db import ProcessConnection
+from instrumentation import DEBUG, ERROR, INFO, log
+
+FITS_EXTENSIONS = ('.fits', '.fts', '.fit', '.fits.gz')
+
+DEFAULT_ARCHIVE_DIR = os.environ.get(
+    'HMI_ARCHIVE_DIR', os.path.join(os.path.expanduser('~'), 'sunpy', 'data')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    t_obs REAL NOT NULL,
+    physobs TEXT NOT NULL,
+    cadence REAL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_by_time ON files (physobs, t_obs);
+CREATE INDEX IF NOT EXISTS files_by_cadence ON files (physobs, cadence, t_obs);
+"""
+
+
+def to_timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value.tzinfo is not None:
+        return value.timestamp()
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+def _header_time(header):
+    from sunpy.time import parse_time
+
+    for key in ('T_OBS', 'DATE-OBS', 'DATE_OBS'):
+        value = header.get(key)
+        if value:
+            return float(parse_time(value).unix)
+    return None
+
+
+def _classify(header, filename):
+    content = str(header.get('CONTENT', '')).upper()
+    name = filename.lower()
+
+    if 'MAGNETOGRAM' in content or 'magnetogram' in name or '_m_' in name:
+        return 'los_magnetic_field'
+    if 'intensitygram' in name:
+        return 'intensitygram'
+    if ('CONTINUUM' in content or 'INTENSITY' in content or 'continuum' in name or
+            'intensity' in name or '_ic_' in name):
+        return 'intensity'
+    return None
+
+
+def _cadence(header, filename):
+    cadence = header.get('CADENCE')
+    if cadence:
+        return float(cadence)
+
+    match = re.search(r'_(\d+)s[_.]', os.path.basename(filename).lower())
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def read_index_entry(path):
+    from astropy.io import fits
+
+    with fits.open(path, memmap=True) as hdul:
+        for hdu in hdul:
+            t_obs = _header_time(hdu.header)
+            if t_obs is not None:
+                physobs = _classify(hdu.header, os.path.basename(path))
+                if physobs is None:
+                    return None
+                return t_obs, physobs, _cadence(hdu.header, path)
+    return None
+
+
+class FitsArchive:
+    # Batch workers open the index read-only: the parent refreshes it once,
+    # and files they download are indexed by the next refresh.
+    def __init__(self, root=None, index_path=None, read_only=False):
+        self.root = root or DEFAULT_ARCHIVE_DIR
+        self.index_path = index_path or os.path.join(self.root, '.hmi_archive.sqlite')
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._database = ProcessConnection(self.index_path, _SCHEMA, read_only=read_only, check_same_thread=False)
+
+    @property
+    def connection(self):
+        return self._database.get()
+
+    def update(self):
+        if self.read_only or not os.path.isdir(self.root):
+            return 0
+
+        with self._lock:
+            known = {path: (mtime, size) for path, mtime, size in
+                     self.connection.execute("SELECT path, mtime, size FROM files")}
+
+        paths = []
+        seen = set()
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.lower().endswith(FITS_EXTENSIONS):
+                    path = os.path.join(directory, filename)
+                    seen.add(path)
+                    stat = os.stat(path)
+                    if known.get(path) != (stat.st_mtime, stat.st_size):
+                        paths.append(path)
+
+        added = self.add(paths)
+
+        removed = [(path,) for path in known if path not in seen]
+        if removed:
+            with self._lock, self.connection:
+                self.connection.executemany("DELETE FROM files WHERE path = ?", removed)
+
+        return added
+
+    def add(self, paths):
+        if self.read_only:
+            log(DEBUG, "Read-only archive: %d files left for the next refresh", len(paths))
+            return 0
+
+        rows = []
+        for path in paths:
+            path = str(path)
+            try:
+                entry = read_index_entry(path)
+            except Exception as e:
+                log(ERROR, "Skipping unreadable FITS file %s: %s", path, e)
+                continue
+
+            if entry is None:
+                continue
+
+            stat = os.stat(path)
+            rows.append((path, entry[0], entry[1], entry[2], stat.st_mtime, stat.st_size))
+
+        if rows:
+            with self._lock, self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO files (path, t_obs, physobs, cadence, mtime, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+        return len(rows)
+
+    def nearest(self, target_time, physobs, tolerance=timedelta(minutes=10), cadence=None):
+        target = to_timestamp(target_time)
+        if isinstance(tolerance, timedelta):
+            tolerance = tolerance.total_seconds()
+
+        if cadence is None:
+            condition, params = "physobs = ?", (physobs,)
+        else:
+            condition, params = "physobs = ? AND cadence = ?", (physobs, float(cadence))
+
+        # Both probes are single seeks on the (physobs[, cadence], t_obs) index.
+        # An index that cannot be read (missing, locked) is a miss, so the
+        # caller searches instead.
+        try:
+            with self._lock:
+                after = self.connection.execute(
+                    f"SELECT path, t_obs FROM files WHERE {condition} AND t_obs >= ? "
+                    f"ORDER BY t_obs LIMIT 1", params + (target,)).fetchone()
+                before = self.connection.execute(
+                    f"SELECT path, t_obs FROM files WHERE {condition} AND t_obs < ? "
+                    f"ORDER BY t_obs DESC LIMIT 1", params + (target,)).fetchone()
+        except sqlite3.Error as e:
+            log(ERROR, "FITS archive index %s unavailable: %s", self.index_path, e)
+            return None
+
+        candidates = [row for row in (after, before) if row is not None and abs(row[1] - target) <= tolerance]
+        if not candidates:
+            return None
+
+        path, _ = min(candidates, key=lambda row: abs(row[1] - target))
+        if not os.path.exists(path):
+            return None
+        return path
+
+    def __len__(self):
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+_archives = {}
+
+
+def get_archive(root=None, refresh=True, read_only=False):
+    root = root or DEFAULT_ARCHIVE_DIR
+    key = (root, read_only)
+    if key not in _archives:
+        archive = FitsArchive(root, read_only=read_only)
+        if refresh and not read_only:
+            added = archive.update()
+            log(INFO, "FITS archive %s: %d files indexed (%d new)", root, len(archive), added)
+        _archives[key] = archive
+    return _archives[key]
+
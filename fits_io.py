@@ -0,0 +1,88 @@
+import threading
+import numpy as np
+
+BAND_ROWS = 256
+
+
+class FrameBuffers:
+    # Each thread has its own buffers, so frames centered in a thread pool
+    # do not overwrite each other's.
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, key, shape):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(key)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.float32)
+            buffers[key] = buffer
+        return buffer
+
+
+# Arrays handed out for a key alias the same buffer, so the next frame
+# the same thread processes with that key overwrites the previous one.
+FRAME_BUFFERS = FrameBuffers()
+
+
+def _image_hdu(hdul):
+    for hdu in hdul:
+        if hdu.is_image and hdu.shape and len(hdu.shape) == 2:
+            return hdu
+    raise ValueError("No 2-D image HDU found")
+
+
+# astropy cannot memory-map images it has to rescale or blank.
+SCALING_KEYWORDS = ('BZERO', 'BSCALE', 'BLANK')
+
+
+def _memory_mappable(hdu):
+    from astropy.io import fits
+
+    if isinstance(hdu, fits.CompImageHDU):
+        return True
+    return not any(keyword in hdu.header for keyword in SCALING_KEYWORDS)
+
+
+def _read_bands(hdul):
+    hdu = _image_hdu(hdul)
+    header = hdu.header.copy()
+    shape = tuple(hdu.shape)
+
+    # Sections read uncompressed images band by band from the file and
+    # decompress tile-compressed ones band by band (CompImageHDU.section
+    # needs astropy 5.3), so no full-frame temporary is created on the way
+    # into the float32 array.
+    data = np.empty(shape, dtype=np.float32)
+    for start in range(0, shape[0], BAND_ROWS):
+        stop = min(start + BAND_ROWS, shape[0])
+        np.copyto(data[start:stop], hdu.section[start:stop], casting='unsafe')
+    return data, header
+
+
+def read_fits_float32(filepath):
+    from astropy.io import fits
+
+    # Every read gets its own array, so a frame kept across reads (a
+    # tracking re-run, a caller holding the map) is never overwritten.
+    with fits.open(filepath, memmap=True) as hdul:
+        if _memory_mappable(_image_hdu(hdul)):
+            data, header = _read_bands(hdul)
+        else:
+            data = None
+    if data is None:
+        # Scaled integer exports are read through the file instead.
+        with fits.open(filepath, memmap=False) as hdul:
+            data, header = _read_bands(hdul)
+
+    np.nan_to_num(data, copy=False, nan=0.0)
+    return data, header
+
+
+def read_map(filepath, banded_float32=False):
+    import sunpy.map
+
+    if banded_float32:
+        return sunpy.map.Map(read_fits_float32(filepath))
+    return sunpy.map.Map(filepath)
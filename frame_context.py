@@ -0,0 +1,30 @@
+import copy
+
+
+class FrameContext:
+    # Everything the methods read about one frame besides its magnetogram
+    # plane: the white-light frame and its header prior, the tracker's
+    # prediction, the header metadata and, while the methods run, the
+    # frame's intermediates. Methods only read it, so frames centered
+    # concurrently each carry their own and nothing leaks from one frame
+    # into the next.
+    def __init__(self, data, white_light=None, white_light_prior=None, metadata=None, tracked_prior=None):
+        self.data = data
+        self.white_light = white_light
+        self.white_light_prior = white_light_prior
+        self.metadata = metadata
+        self.tracked_prior = tracked_prior
+        self.intermediates = None
+
+    def replace(self, **changes):
+        # A shallow copy; the planes are shared, not copied.
+        context = copy.copy(self)
+        context.__dict__.update(changes)
+        return context
+
+    def method_prior(self, prior, white_light=False):
+        # A tracker prediction beats the white-light header, which beats the
+        # magnetogram header prior the method was given.
+        if white_light:
+            return self.tracked_prior or self.white_light_prior or prior
+        return self.tracked_prior or prior
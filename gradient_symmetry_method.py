@@ -1,48 +1,176 @@
 import numpy as np
 from uncertainty import calculate_edge_based_uncertainty
 from hmi_processor import HMI_Processor
+from instrumentation import ERROR, log
+
+GRADIENT_BAND_ROWS = 128
+
+COARSE_BINS = 4096
+MIN_FINE_BINS = 4096
+MAX_FINE_BINS = 1 << 18
+
+
+def gradient_bands(data, band_rows=GRADIENT_BAND_ROWS):
+    # Each band is read with a one-row halo, so interior rows get the same
+    # central differences as np.gradient on the full frame and the first and
+    # last rows of the frame keep its one-sided differences.
+    height = data.shape[0]
+    for start in range(0, height, band_rows):
+        stop = min(start + band_rows, height)
+        low, high = max(start - 1, 0), min(stop + 1, height)
+        band = data[low:high].astype(np.float32)
+        grad_y, grad_x = np.gradient(band)
+        rows = slice(start - low, stop - low)
+        yield start, grad_x[rows], grad_y[rows]
+
+
+def gradient_magnitude(grad_x, grad_y):
+    magnitude = grad_x * grad_x
+    magnitude += grad_y * grad_y
+    np.sqrt(magnitude, out=magnitude)
+    return magnitude
+
+
+def chunked_gradient_center(data_clean, q=70, band_rows=GRADIENT_BAND_ROWS):
+    height, width = data_clean.shape
+    x_coords = np.arange(width, dtype=np.float64)
+
+    # Central differences are at most half the data range per axis and
+    # one-sided ones the full range, which bounds the magnitude histogram.
+    bound = np.sqrt(2) * (float(np.max(data_clean)) - float(np.min(data_clean)))
+    scale = COARSE_BINS / bound if bound > 0 else 0.0
+
+    # Pass 1: coarse histogram of the magnitude, plus the projections the
+    # fallback needs when no pixel lies above the threshold.
+    coarse_counts = np.zeros(COARSE_BINS, dtype=np.int64)
+    x_weights = np.zeros(width)
+    y_weights = np.zeros(height)
+
+    for start, grad_x, grad_y in gradient_bands(data_clean, band_rows):
+        x_weights += np.abs(grad_x).sum(axis=0, dtype=np.float64)
+        y_weights[start:start + len(grad_y)] = np.abs(grad_y).sum(axis=1, dtype=np.float64)
+        bins = np.minimum((gradient_magnitude(grad_x, grad_y) * scale).astype(np.intp), COARSE_BINS - 1)
+        coarse_counts += np.bincount(bins.ravel(), minlength=COARSE_BINS)
+
+    # np.percentile(..., q) > value keeps exactly the pixels above the k-th
+    # order statistic, so only the bin holding that statistic needs detail.
+    rank = int(np.floor(q / 100 * (data_clean.size - 1)))
+    coarse_cumulative = np.cumsum(coarse_counts)
+    threshold_bin = int(np.searchsorted(coarse_cumulative, rank, side='right'))
+    rank_in_bin = rank - (coarse_cumulative[threshold_bin - 1] if threshold_bin > 0 else 0)
+
+    # Pass 2: weighted sums for pixels in higher bins, and a fine histogram
+    # of counts and weighted sums inside the threshold bin, with about one
+    # pixel per fine bin.
+    fine_bins = int(np.clip(coarse_counts[threshold_bin], MIN_FINE_BINS, MAX_FINE_BINS))
+    sum_w = sum_wx = sum_wy = 0.0
+    fine_counts = np.zeros(fine_bins, dtype=np.int64)
+    fine_w = np.zeros(fine_bins)
+    fine_wx = np.zeros(fine_bins)
+    fine_wy = np.zeros(fine_bins)
+
+    if scale > 0:
+        for start, grad_x, grad_y in gradient_bands(data_clean, band_rows):
+            magnitude = gradient_magnitude(grad_x, grad_y)
+            bins = np.minimum((magnitude * scale).astype(np.intp), COARSE_BINS - 1)
+
+            weights = np.where(bins > threshold_bin, magnitude, 0).astype(np.float64)
+            row_sums = weights.sum(axis=1)
+            sum_w += row_sums.sum()
+            sum_wx += weights.sum(axis=0) @ x_coords
+            sum_wy += row_sums @ np.arange(start, start + len(row_sums), dtype=np.float64)
+
+            in_bin_y, in_bin_x = np.nonzero(bins == threshold_bin)
+            if len(in_bin_x):
+                values = magnitude[in_bin_y, in_bin_x].astype(np.float64)
+                fine = ((values * scale - threshold_bin) * fine_bins).astype(np.intp)
+                np.clip(fine, 0, fine_bins - 1, out=fine)
+                fine_counts += np.bincount(fine, minlength=fine_bins)
+                fine_w += np.bincount(fine, weights=values, minlength=fine_bins)
+                fine_wx += np.bincount(fine, weights=values * in_bin_x, minlength=fine_bins)
+                fine_wy += np.bincount(fine, weights=values * (in_bin_y + start), minlength=fine_bins)
+
+        # Fine bins above the threshold are taken whole. Of the fine bin that
+        # holds the threshold, the share of pixels above it is taken pro rata,
+        # which is the only approximation left.
+        fine_cumulative = np.cumsum(fine_counts)
+        fine_bin = int(np.searchsorted(fine_cumulative, rank_in_bin, side='right'))
+        share = (fine_cumulative[fine_bin] - rank_in_bin - 1) / fine_counts[fine_bin]
+        sum_w += fine_w[fine_bin + 1:].sum() + share * fine_w[fine_bin]
+        sum_wx += fine_wx[fine_bin + 1:].sum() + share * fine_wx[fine_bin]
+        sum_wy += fine_wy[fine_bin + 1:].sum() + share * fine_wy[fine_bin]
+
+    if sum_w > 0:
+        return sum_wx / sum_w, sum_wy / sum_w
+
+    center_x = np.average(x_coords, weights=x_weights)
+    center_y = np.average(np.arange(height), weights=y_weights)
+    return center_x, center_y
 
 
 class GradientSymmetryMethod(HMI_Processor):
-    def __init__(self):
+    # Only the full-frame variant builds gradient planes; the chunked one
+    # streams bands and needs none.
+    requires = ()
+    full_frame_requires = ('gradient', 'gradient_magnitude')
+
+    def __init__(self, chunked=True):
         super().__init__()
+        self.chunked = chunked
+        if not chunked:
+            self.requires = self.full_frame_requires
         
-    def solar_center(self):
+    def solar_center(self, context=None):
         if self.data is None:
-            print("No data loaded. Call read_fits() first.")
+            log(ERROR, "No data loaded. Call read_fits() first.")
             return None, None, None
         
-        return self.process_method(self.data)
+        return self.process_method(self.data, context)
     
-    def process_method(self, data_clean):
+    def full_frame_center(self, data_clean, context=None):
+        grad_y, grad_x = self.intermediate('gradient', data_clean, context)
+        grad_magnitude = self.intermediate('gradient_magnitude', data_clean, context)
+        grad_threshold = self.percentile(grad_magnitude, 70, key='gradient_magnitude')
+        significant_grad = grad_magnitude > grad_threshold
+
+        if np.any(significant_grad):
+            y_coords, x_coords = np.where(significant_grad)
+            weights = grad_magnitude[significant_grad]
+            center_x = np.average(x_coords, weights=weights)
+            center_y = np.average(y_coords, weights=weights)
+        else:
+            x_weights = np.sum(np.abs(grad_x), axis=0)
+            y_weights = np.sum(np.abs(grad_y), axis=1)
+            center_x = np.average(np.arange(data_clean.shape[1]), weights=x_weights)
+            center_y = np.average(np.arange(data_clean.shape[0]), weights=y_weights)
+
+        return center_x, center_y
+
+    def process_method(self, data_clean, context=None):
         try:
-            grad_y, grad_x = np.gradient(data_clean)
-            grad_magnitude = np.sqrt(grad_x ** 2 + grad_y ** 2)
-            grad_threshold = np.percentile(grad_magnitude, 70)
-            significant_grad = grad_magnitude > grad_threshold
-
-            if np.any(significant_grad):
-                y_coords, x_coords = np.where(significant_grad)
-                weights = grad_magnitude[significant_grad]
-                center_x = np.average(x_coords, weights=weights)
-                center_y = np.average(y_coords, weights=weights)
+            if self.chunked:
+                center_x, center_y = chunked_gradient_center(data_clean)
             else:
-                x_weights = np.sum(np.abs(grad_x), axis=0)
-                y_weights = np.sum(np.abs(grad_y), axis=1)
-                center_x = np.average(np.arange(data_clean.shape[1]), weights=x_weights)
-                center_y = np.average(np.arange(data_clean.shape[0]), weights=y_weights)
+                center_x, center_y = self.full_frame_center(data_clean, context)
 
             center = (center_x, center_y)
-            uncertainty = calculate_edge_based_uncertainty(data_clean, center)
+            uncertainty = calculate_edge_based_uncertainty(data_clean, center, disk_radius=self.disk_radius(),
+                                                           quantiles=self.quantiles)
 
             return (center_x, center_y), "Gradient Symmetry", uncertainty
 
         except Exception as e:
-            print(f"Gradient method failed: {e}")
+            log(ERROR, "Gradient method failed: %s", e)
             return None, "Gradient Symmetry", None
 
 
-def gradient_symmetry(data_clean):
-    processor = GradientSymmetryMethod()
+def gradient_symmetry(data_clean, chunked=True, quantiles=None, prior=None, context=None):
+    processor = GradientSymmetryMethod(chunked=chunked)
     processor.data = data_clean
-    return processor.solar_center()
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+# The entry point runs the chunked variant by default.
+gradient_symmetry.requires = GradientSymmetryMethod.requires
@@ -1,28 +1,51 @@
 import numpy as np
-import sunpy.map
+from fits_io import read_fits_float32
+from quantiles import percentile
+from intermediates import shared_filter, shared_intermediate
+from instrumentation import ERROR, INFO, instrumented_method, log
 from abc import ABC, abstractmethod
 
 
 class HMI_Processor(ABC):
+    # Frame intermediates (see intermediates.INTERMEDIATES) the method may
+    # request; the frame scheduler frees each after its last consumer.
+    # None means the same with a white-light frame loaded.
+    requires = ()
+    white_light_requires = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every concrete process_method is timed as a 'process_method' stage.
+        method = cls.__dict__.get('process_method')
+        if method is not None and not getattr(method, '_instrumented', False):
+            cls.process_method = instrumented_method(cls.__name__, method)
+
     def __init__(self):
         self.data = None
         self.metadata = None
-        
-    def read_fits(self, filepath):
+        self.quantiles = None
+        self.prior = None
+        self._computed = {}
+
+    def read_fits(self, filepath, banded_float32=False):
         try:
-            map_data = sunpy.map.Map(filepath)
-            self.data = np.nan_to_num(map_data.data, nan=0.0)
-            self.metadata = map_data.meta
-            print(f"Loaded data from {filepath}")
-            print(f"Data shape: {self.data.shape}")
+            if banded_float32:
+                self.data, self.metadata = read_fits_float32(filepath)
+            else:
+                import sunpy.map
+                map_data = sunpy.map.Map(filepath)
+                self.data = np.nan_to_num(map_data.data, nan=0.0)
+                self.metadata = map_data.meta
+            log(INFO, "Loaded data from %s", filepath)
+            log(INFO, "Data shape: %s", self.data.shape)
             return self.data
         except Exception as e:
-            print(f"Error reading FITS file: {e}")
+            log(ERROR, "Error reading FITS file: %s", e)
             return None
     
-    def solar_center(self):
+    def solar_center(self, context=None):
         if self.data is None:
-            print("No data loaded. Call read_fits() first.")
+            log(ERROR, "No data loaded. Call read_fits() first.")
             return None, None
         
         height, width = self.data.shape
@@ -30,6 +53,30 @@ class HMI_Processor(ABC):
         
         return center, "Base HMI Processor"
     
+    def percentile(self, plane, q, key=None):
+        return percentile(plane, q, self.quantiles, key=key)
+
+    def intermediate(self, name, plane, context=None):
+        intermediates = None if context is None else context.intermediates
+        return shared_intermediate(intermediates, name, plane, self._computed)
+
+    def filtered(self, image, roi=None, context=None, key='article_filters'):
+        intermediates = None if context is None else context.intermediates
+        return shared_filter(intermediates, image, roi, key, self._computed)
+
+    def white_light(self, context):
+        return None if context is None else context.white_light
+
+    def frame_prior(self, context, white_light=False):
+        if context is None:
+            return self.prior
+        return context.method_prior(self.prior, white_light)
+
+    def disk_radius(self, default=400):
+        if self.prior is not None:
+            return self.prior['radius']
+        return default
+
     @abstractmethod
-    def process_method(self, data_clean):
+    def process_method(self, data_clean, context=None):
         pass
@@ -0,0 +1,219 @@
+import numpy as np
+from circle_bubbling_method import apply_article_filters, disk_circle, downsample_image, expected_limb
+from uncertainty import annulus_pixels, calculate_edge_based_uncertainty
+from hmi_processor import HMI_Processor
+from instrumentation import ERROR, INFO, log, count
+
+# Votes are cast on a grid about this size, then refined at full resolution.
+HOUGH_GRID = 512
+# Radii searched around the starting radius, as a fraction of it.
+RADIUS_BAND = 0.05
+PRIOR_RADIUS_BAND = 0.01
+# Coarse pixels above this percentile of the filtered gradient vote.
+EDGE_PERCENTILE = 98
+
+# Full-resolution candidate centers are scored on 9x9 grids, first with
+# half-coarse-pixel spacing, then with these steps around the best cell.
+REFINE_CELLS = 4
+REFINE_STEPS = (1.0, 0.25)
+REFINE_RADIUS_BIN = 0.5
+EDGE_CHUNK = 8192
+
+
+def coarse_votes(coarse, filtered, threshold, radii):
+    # Each edge pixel votes along its gradient direction, both ways, at
+    # every radius of the band, so the work grows with the edge count.
+    from scipy.ndimage import gaussian_filter
+
+    y, x = np.nonzero(filtered > threshold)
+    inner = (y > 0) & (y < coarse.shape[0] - 1) & (x > 0) & (x < coarse.shape[1] - 1)
+    y, x = y[inner], x[inner]
+
+    smooth = gaussian_filter(coarse, sigma=1.0)
+    grad_x = smooth[y, x + 1] - smooth[y, x - 1]
+    grad_y = smooth[y + 1, x] - smooth[y - 1, x]
+    norm = np.hypot(grad_x, grad_y)
+    keep = norm > 0
+    y, x, ux, uy = y[keep], x[keep], grad_x[keep] / norm[keep], grad_y[keep] / norm[keep]
+    weights = filtered[y, x]
+
+    height, width = coarse.shape
+    accumulator = np.zeros(height * width)
+    for sign in (1, -1):
+        vote_x = np.rint(x[:, None] + sign * radii * ux[:, None]).astype(np.intp)
+        vote_y = np.rint(y[:, None] + sign * radii * uy[:, None]).astype(np.intp)
+        inside = (vote_x >= 0) & (vote_x < width) & (vote_y >= 0) & (vote_y < height)
+        votes = np.broadcast_to(weights[:, None], vote_x.shape)[inside]
+        accumulator += np.bincount(vote_y[inside] * width + vote_x[inside], weights=votes,
+                                   minlength=height * width)
+
+    return accumulator.reshape(height, width), (x, y, weights)
+
+
+def accumulator_peak(accumulator):
+    # Weighted centroid of the 3x3 cells around the strongest one.
+    peak_y, peak_x = np.unravel_index(np.argmax(accumulator), accumulator.shape)
+    y_0, x_0 = max(peak_y - 1, 0), max(peak_x - 1, 0)
+    cells = accumulator[y_0:peak_y + 2, x_0:peak_x + 2]
+    total = cells.sum()
+    if total <= 0:
+        return float(peak_x), float(peak_y)
+    rows, columns = np.indices(cells.shape)
+    return x_0 + float((cells * columns).sum() / total), y_0 + float((cells * rows).sum() / total)
+
+
+def candidate_scores(x, y, weights, candidates, radius_range, bin_size=REFINE_RADIUS_BIN):
+    # For every candidate center, a histogram of edge distances; a circle
+    # centered there puts its votes into a single radius bin.
+    bins = int(np.ceil((radius_range[1] - radius_range[0]) / bin_size)) + 1
+    histogram = np.zeros(len(candidates) * bins)
+    offsets = np.arange(len(candidates)) * bins
+
+    for start in range(0, len(x), EDGE_CHUNK):
+        dx = x[start:start + EDGE_CHUNK, None] - candidates[:, 0]
+        dy = y[start:start + EDGE_CHUNK, None] - candidates[:, 1]
+        radius_bin = np.floor((np.hypot(dx, dy) - radius_range[0]) / bin_size).astype(np.intp)
+        inside = (radius_bin >= 0) & (radius_bin < bins)
+        index = (radius_bin + offsets)[inside]
+        votes = np.broadcast_to(weights[start:start + EDGE_CHUNK, None], radius_bin.shape)[inside]
+        histogram += np.bincount(index, weights=votes, minlength=len(histogram))
+
+    histogram = histogram.reshape(len(candidates), bins)
+    # Neighbouring bins are merged so an edge split across a bin boundary
+    # still counts as one ring.
+    smoothed = histogram[:, :-1] + histogram[:, 1:]
+    best = np.argmax(smoothed, axis=1)
+    return smoothed[np.arange(len(candidates)), best], radius_range[0] + (best + 1) * bin_size
+
+
+def refine_center(x, y, weights, center, radius_range, half_width, step):
+    offsets = np.arange(-half_width, half_width + step / 2, step)
+    grid_x, grid_y = np.meshgrid(center[0] + offsets, center[1] + offsets)
+    candidates = np.column_stack([grid_x.ravel(), grid_y.ravel()])
+
+    scores, radii = candidate_scores(x, y, weights, candidates, radius_range)
+    scores = scores.reshape(grid_x.shape)
+    best_y, best_x = np.unravel_index(np.argmax(scores), scores.shape)
+    best = (float(grid_x[best_y, best_x]), float(grid_y[best_y, best_x]))
+
+    # Parabolic interpolation of the score along each axis.
+    shift = []
+    for left, middle, right in (
+        (scores[best_y, best_x - 1] if best_x > 0 else None, scores[best_y, best_x],
+         scores[best_y, best_x + 1] if best_x < len(offsets) - 1 else None),
+        (scores[best_y - 1, best_x] if best_y > 0 else None, scores[best_y, best_x],
+         scores[best_y + 1, best_x] if best_y < len(offsets) - 1 else None)
+    ):
+        curvature = None if left is None or right is None else left - 2 * middle + right
+        shift.append(0.5 * (left - right) / curvature * step if curvature and curvature < 0 else 0.0)
+
+    return (best[0] + shift[0], best[1] + shift[1]), float(radii.reshape(grid_x.shape)[best_y, best_x])
+
+
+class HoughMethod(HMI_Processor):
+    requires = ('disk_mask',)
+    white_light_requires = ('limb_filtered_white_light',)
+
+    def __init__(self, grid=HOUGH_GRID):
+        super().__init__()
+        self.grid = grid
+
+    def solar_center(self, context=None):
+        if self.data is None:
+            log(ERROR, "No data loaded. Call read_fits() first.")
+            return None, None, None
+
+        return self.process_method(self.data, context)
+
+    def radius_band(self, image, white_light, context=None):
+        prior = self.frame_prior(context, white_light)
+        if prior is not None:
+            return prior['radius'], PRIOR_RADIUS_BAND
+
+        # Only the radius of the area estimate is used; the center is left
+        # to the votes.
+        _, radius = expected_limb(image, self.quantiles) if white_light else disk_circle(image != 0)
+        return radius, RADIUS_BAND
+
+    def process_method(self, data_clean, context=None):
+        try:
+            white_data = self.white_light(context)
+            if white_data is not None:
+                image, data_source = white_data, "white light"
+            else:
+                # The magnetogram limb is where the off-disk NaNs (zeroed on
+                # load) begin; the field itself has stronger edges around
+                # active regions than at the limb.
+                image = self.intermediate('disk_mask', data_clean, context).astype(np.float32)
+                data_source = "magnetogram"
+
+            radius, band = self.radius_band(image, white_data is not None, context)
+            if radius is None:
+                return None, "Hough Transform", None
+
+            factor = max(1, int(round(max(image.shape) / self.grid)))
+            coarse = downsample_image(image, factor) if factor > 1 else image.astype(np.float64)
+            filtered = apply_article_filters(coarse)
+            threshold = self.percentile(filtered, EDGE_PERCENTILE, key='hough_edges')
+
+            coarse_radii = np.arange(radius * (1 - band), radius * (1 + band) + factor, factor) / factor
+            accumulator, (edge_x, edge_y, edge_weights) = coarse_votes(coarse, filtered, threshold, coarse_radii)
+            edges = len(edge_x)
+            count(hough_edges=edges)
+
+            # Block k of the coarse grid is centered on full-resolution
+            # pixel k * factor + (factor - 1) / 2.
+            peak = accumulator_peak(accumulator)
+            center = (peak[0] * factor + (factor - 1) / 2, peak[1] * factor + (factor - 1) / 2)
+            log(INFO, "Hough: %d edge pixels vote for (%.1f, %.1f) at factor %d", edges, center[0], center[1],
+                factor)
+
+            # The coarse edges also give the radius, which narrows the
+            # full-resolution annulus to a few coarse pixels.
+            _, coarse_radius = candidate_scores(
+                edge_x * factor + (factor - 1) / 2, edge_y * factor + (factor - 1) / 2, edge_weights,
+                np.array([center]), (radius * (1 - band) - 2 * factor, radius * (1 + band) + 2 * factor),
+                bin_size=factor
+            )
+            radius = float(coarse_radius[0])
+            width = 3.0 * factor
+            radius_range = (radius - width, radius + width)
+            full = self.filtered(image, (center, radius, width + 2), context, key='hough_filters')
+
+            y_idx, x_idx, _, _ = annulus_pixels(full.shape, center, radius, width)
+            values = full[y_idx, x_idx]
+            edge = values > 0.5 * np.percentile(values, 99) if len(values) else values > 0
+            x, y, weights = x_idx[edge].astype(float), y_idx[edge].astype(float), values[edge].astype(float)
+            if len(x) < 3:
+                return None, "Hough Transform", None
+
+            for step in (factor / 2,) + REFINE_STEPS:
+                center, fitted_radius = refine_center(x, y, weights, center, radius_range, REFINE_CELLS * step,
+                                                      step)
+
+            uncertainty = calculate_edge_based_uncertainty(
+                data_clean if white_data is None else white_data, center, disk_radius=fitted_radius,
+                edge_width=10, quantiles=self.quantiles
+            )
+            if uncertainty:
+                uncertainty['final_diameter'] = 2 * fitted_radius
+                uncertainty['data_source'] = data_source
+                uncertainty['method'] = 'hough'
+
+            return (float(center[0]), float(center[1])), "Hough Transform", uncertainty
+
+        except Exception as e:
+            log(ERROR, "Hough method failed: %s", e)
+            return None, "Hough Transform", None
+
+
+def hough_transform(data_clean, grid=HOUGH_GRID, quantiles=None, prior=None, context=None):
+    processor = HoughMethod(grid=grid)
+    processor.data = data_clean
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+hough_transform.requires = HoughMethod.requires
+hough_transform.white_light_requires = HoughMethod.white_light_requires
@@ -1,23 +1,26 @@
 import numpy as np
 from uncertainty import calculate_edge_based_uncertainty
 from hmi_processor import HMI_Processor
+from instrumentation import ERROR, log
 
 
 class ImageMomentsMethod(HMI_Processor):
+    requires = ('squared', 'coordinates')
+
     def __init__(self):
         super().__init__()
         
-    def solar_center(self):
+    def solar_center(self, context=None):
         if self.data is None:
-            print("No data loaded. Call read_fits() first.")
+            log(ERROR, "No data loaded. Call read_fits() first.")
             return None, None, None
         
-        return self.process_method(self.data)
+        return self.process_method(self.data, context)
     
-    def process_method(self, data_clean):
+    def process_method(self, data_clean, context=None):
         try:
-            data_squared = data_clean ** 2
-            y_coords, x_coords = np.indices(data_squared.shape)
+            data_squared = self.intermediate('squared', data_clean, context)
+            y_coords, x_coords = self.intermediate('coordinates', data_clean, context)
 
             m_00 = np.sum(data_squared)
             if m_00 == 0:
@@ -30,16 +33,22 @@ class ImageMomentsMethod(HMI_Processor):
             cy = m_01 / m_00
 
             center = (cx, cy)
-            uncertainty = calculate_edge_based_uncertainty(data_clean, center)
+            uncertainty = calculate_edge_based_uncertainty(data_clean, center, disk_radius=self.disk_radius(),
+                                                           quantiles=self.quantiles)
 
             return (cx, cy), "Image Moments", uncertainty
 
         except Exception as e:
-            print(f"Moments analysis failed: {e}")
+            log(ERROR, "Moments analysis failed: %s", e)
             return None, "Image Moments", None
 
 
-def moments_analysis(data_clean):
+def moments_analysis(data_clean, quantiles=None, prior=None, context=None):
     processor = ImageMomentsMethod()
     processor.data = data_clean
-    return processor.solar_center()
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+moments_analysis.requires = ImageMomentsMethod.requires
@@ -0,0 +1,175 @@
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+ERROR = 0
+INFO = 1
+DEBUG = 2
+
+QUIET = ERROR
+
+
+class Instrumentation:
+    def __init__(self, verbosity=INFO, stream=None, metrics_stream=None,
+                 collect=False, trace_memory=False):
+        self.verbosity = verbosity
+        self.stream = stream
+        self.metrics_stream = metrics_stream
+        self.collect = collect
+        self.trace_memory = trace_memory
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self):
+        return self.collect or self.metrics_stream is not None
+
+    def enabled(self, level=INFO):
+        return self.verbosity >= level
+
+    def log(self, level, message, *args):
+        # Arguments are only formatted when the message is actually printed,
+        # so disabled log calls in hot loops cost a comparison.
+        if self.verbosity >= level:
+            print(message % args if args else message, file=self.stream or sys.stdout)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def stage(self, name, **fields):
+        if not self.recording:
+            yield {}
+            return
+
+        record = {'stage': name}
+        record.update(fields)
+        stack = self._stack()
+        trace = self.trace_memory and tracemalloc.is_tracing()
+
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # Remember the parent's peak before this stage resets it.
+                stack[-1]['_peak_seen'] = max(stack[-1].get('_peak_seen', 0), peak)
+            record['_memory_start'] = current
+            record['_peak_seen'] = current
+            tracemalloc.reset_peak()
+
+        stack.append(record)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_time'] = time.perf_counter() - wall_start
+            record['cpu_time'] = time.thread_time() - cpu_start
+            stack.pop()
+
+            if trace:
+                peak = max(record.pop('_peak_seen'), tracemalloc.get_traced_memory()[1])
+                record['peak_memory_bytes'] = peak - record.pop('_memory_start')
+                if stack:
+                    stack[-1]['_peak_seen'] = max(stack[-1].get('_peak_seen', 0), peak)
+
+            if stack:
+                record['parent'] = stack[-1]['stage']
+            self.emit(record)
+
+    def count(self, **counters):
+        stack = self._stack()
+        if not stack:
+            return
+        for key, value in counters.items():
+            stack[-1][key] = stack[-1].get(key, 0) + value
+
+    def annotate(self, **fields):
+        stack = self._stack()
+        if stack:
+            stack[-1].update(fields)
+
+    def emit(self, record):
+        with self._lock:
+            if self.collect:
+                self.records.append(record)
+            if self.metrics_stream is not None:
+                self.metrics_stream.write(json.dumps(record, default=json_default) + '\n')
+
+    def drain(self):
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+
+def json_default(value):
+    # numpy scalars and arrays become Python numbers and lists.
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return str(value)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation():
+    return _instrumentation
+
+
+def configure(verbosity=None, metrics_stream=None, collect=None, trace_memory=None):
+    if verbosity is not None:
+        _instrumentation.verbosity = verbosity
+    if metrics_stream is not None:
+        _instrumentation.metrics_stream = metrics_stream
+    if collect is not None:
+        _instrumentation.collect = collect
+    if trace_memory is not None:
+        _instrumentation.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+    return _instrumentation
+
+
+def log(level, message, *args):
+    _instrumentation.log(level, message, *args)
+
+
+def enabled(level=INFO):
+    return _instrumentation.verbosity >= level
+
+
+def stage(name, **fields):
+    return _instrumentation.stage(name, **fields)
+
+
+def count(**counters):
+    _instrumentation.count(**counters)
+
+
+def annotate(**fields):
+    _instrumentation.annotate(**fields)
+
+
+def data_fields(data):
+    if data is None:
+        return {}
+    return {'data_shape': list(data.shape), 'data_dtype': data.dtype.str, 'data_bytes': data.nbytes}
+
+
+def instrumented_method(processor_name, method):
+    @functools.wraps(method)
+    def wrapper(self, data_clean, *args, **kwargs):
+        with stage('process_method', processor=processor_name, **data_fields(data_clean)) as record:
+            result = method(self, data_clean, *args, **kwargs)
+            record['success'] = result is not None and result[0] is not None
+            return result
+
+    wrapper._instrumented = True
+    return wrapper
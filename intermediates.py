@@ -0,0 +1,253 @@
+import threading
+import numpy as np
+from fits_io import FRAME_BUFFERS
+from instrumentation import DEBUG, log, count
+
+
+def _filtered_white_light(white_light):
+    # Circle Bubbling's full-frame filter; the result lives in the frame
+    # buffers, so the shared view is read-only but the buffer is reused.
+    from circle_bubbling_method import apply_article_filters
+    return apply_article_filters(white_light, buffers=FRAME_BUFFERS, key='filtered_white_light')
+
+
+def _limb_filtered_white_light(white_light, limb):
+    # The same filter on the frame's limb annulus only.
+    from circle_bubbling_method import apply_article_filters
+    return apply_article_filters(white_light, roi=limb, buffers=FRAME_BUFFERS, key='limb_filtered_white_light')
+
+
+def _gradient_magnitude(data, gradient):
+    grad_y, grad_x = gradient
+    return np.sqrt(grad_x ** 2 + grad_y ** 2)
+
+
+# name: (source plane, intermediates it is computed from, function of the
+# source and those intermediates). Sparse coordinate grids broadcast like
+# np.indices without its two full-frame integer planes.
+INTERMEDIATES = {
+    'abs': ('data', (), np.abs),
+    'squared': ('data', (), lambda data: data ** 2),
+    'disk_mask': ('data', (), lambda data: data != 0),
+    'coordinates': ('data', (), lambda data: tuple(np.indices(data.shape, sparse=True))),
+    'gradient': ('data', (), lambda data: tuple(np.gradient(data))),
+    'gradient_magnitude': ('data', ('gradient',), _gradient_magnitude),
+    'filtered_white_light': ('white_light', (), _filtered_white_light),
+    'limb_filtered_white_light': ('white_light', (), _limb_filtered_white_light)
+}
+
+# Computed around the frame's limb, which the scheduler passes after the
+# source plane.
+LIMB_INTERMEDIATES = ('limb_filtered_white_light',)
+
+# The limb annulus is filtered once around the frame's disk prior: 4% of
+# the radius holds the limb fit's 3% search and circles a few pixels off
+# the prior. Annuli reaching outside it are filtered by their consumer.
+LIMB_WIDTH = 0.04
+LIMB_MIN_WIDTH = 16
+
+
+def limb_annulus(prior):
+    if prior is None:
+        return None
+    return prior['center'], prior['radius'], max(LIMB_WIDTH * prior['radius'], LIMB_MIN_WIDTH)
+
+
+def annulus_inside(roi, limb):
+    (x, y), radius, width = roi
+    (limb_x, limb_y), limb_radius, limb_width = limb
+    return np.hypot(x - limb_x, y - limb_y) + abs(radius - limb_radius) + width <= limb_width
+
+
+def _read_only(value):
+    if isinstance(value, tuple):
+        return tuple(_read_only(item) for item in value)
+    view = value.view()
+    view.flags.writeable = False
+    return view
+
+
+def plane_bytes(value):
+    if isinstance(value, tuple):
+        return sum(plane_bytes(item) for item in value)
+    return value.nbytes
+
+
+def compute_intermediate(name, plane, cache=None):
+    # Without a scheduler every request computes privately, dependencies
+    # included; a cache keeps the last plane per name, so a dependency
+    # requested on its own is not built twice.
+    if cache is not None and name in cache and cache[name][0] is plane:
+        return cache[name][1]
+
+    _, dependencies, function = INTERMEDIATES[name]
+    value = function(plane, *[compute_intermediate(dependency, plane, cache) for dependency in dependencies])
+    if cache is not None:
+        cache[name] = (plane, value)
+    return value
+
+
+def consumer_needs(consumer, white_light=None):
+    # Methods that switch to the white-light frame when one is loaded
+    # declare what they need then separately.
+    if white_light is not None and getattr(consumer, 'white_light_requires', None) is not None:
+        return consumer.white_light_requires
+    return getattr(consumer, 'requires', ())
+
+
+def dependency_order(names):
+    order = []
+
+    def visit(name):
+        if name in order:
+            return
+        for dependency in INTERMEDIATES[name][1]:
+            visit(dependency)
+        order.append(name)
+
+    for name in names:
+        visit(name)
+    return order
+
+
+class FrameIntermediates:
+    # Each intermediate is computed once per frame, on first request and
+    # after its dependencies, then shared read-only. Consumers declare what
+    # they need up front, so a plane is dropped when its last consumer (or
+    # the last intermediate built from it) is released.
+    def __init__(self, data, consumers, white_light=None, limb=None):
+        self.sources = {'data': data, 'white_light': white_light}
+        self.limb = limb
+        self.needs = {consumer: tuple(names) for consumer, names in consumers.items()}
+        self.order = dependency_order(name for names in self.needs.values() for name in names)
+
+        self.users = dict.fromkeys(self.order, 0)
+        for names in self.needs.values():
+            for name in set(names):
+                self.users[name] += 1
+        for name in self.order:
+            for dependency in INTERMEDIATES[name][1]:
+                self.users[dependency] += 1
+
+        # Bytes allocated for intermediates, and what the same requests
+        # would have allocated with every consumer computing its own.
+        self.stats = {'allocated_bytes': 0, 'requested_bytes': 0, 'computed': 0, 'requests': 0, 'freed': 0}
+        self._planes = {}
+        self._sizes = {}
+        # Requests nobody declared are computed privately, once per frame.
+        self._cache = {}
+        self._released = set()
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self.order}
+
+    def __getstate__(self):
+        # A copy sent to a worker process starts empty and computes its own.
+        state = self.__dict__.copy()
+        del state['_lock'], state['_locks']
+        state['_planes'] = {}
+        state['_cache'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self.order}
+
+    def run_order(self, consumers):
+        # Consumers sharing a plane run back to back, so the plane is freed
+        # before unrelated methods allocate theirs; otherwise the given
+        # order is kept.
+        order = []
+        for consumer in consumers:
+            if consumer in order:
+                continue
+            order.append(consumer)
+            shared = set(self.needs.get(consumer, ()))
+            for other in consumers:
+                if other not in order and shared & set(self.needs.get(other, ())):
+                    order.append(other)
+        return order
+
+    def covers(self, name, plane):
+        if name in LIMB_INTERMEDIATES and self.limb is None:
+            return False
+        return name in self.users and plane is self.sources[INTERMEDIATES[name][0]]
+
+    def covers_annulus(self, roi, plane):
+        return self.covers('limb_filtered_white_light', plane) and annulus_inside(roi, self.limb)
+
+    def get(self, name, plane):
+        if not self.covers(name, plane):
+            return compute_intermediate(name, plane, self._cache)
+
+        value = self._get(name)
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['requested_bytes'] += self._private_bytes(name)
+        return value
+
+    def _private_bytes(self, name):
+        # A consumer computing privately would also build the dependencies.
+        return self._sizes[name] + sum(self._private_bytes(dependency) for dependency in INTERMEDIATES[name][1])
+
+    def _get(self, name):
+        with self._locks[name]:
+            value = self._planes.get(name)
+            if value is not None:
+                return value
+
+            source, dependencies, function = INTERMEDIATES[name]
+            values = [self._get(dependency) for dependency in dependencies]
+            if name in LIMB_INTERMEDIATES:
+                values.append(self.limb)
+            value = _read_only(function(self.sources[source], *values))
+            size = plane_bytes(value)
+
+            with self._lock:
+                self._planes[name] = value
+                self._sizes[name] = size
+                self.stats['allocated_bytes'] += size
+                self.stats['computed'] += 1
+            count(intermediate_bytes=size)
+            log(DEBUG, "Intermediate %s: %.1f MB", name, size / 2 ** 20)
+            return value
+
+    def release(self, consumer):
+        # Called once per consumer when it finishes, whether it succeeded.
+        with self._lock:
+            if consumer in self._released or consumer not in self.needs:
+                return
+            self._released.add(consumer)
+            pending = list(set(self.needs[consumer]))
+            while pending:
+                name = pending.pop()
+                self.users[name] -= 1
+                if self.users[name] > 0:
+                    continue
+                if self._planes.pop(name, None) is not None:
+                    self.stats['freed'] += 1
+                pending.extend(INTERMEDIATES[name][1])
+
+    def close(self):
+        for consumer in list(self.needs):
+            self.release(consumer)
+        self._cache = {}
+
+
+def shared_intermediate(intermediates, name, plane, cache=None):
+    if intermediates is None:
+        return compute_intermediate(name, plane, cache)
+    return intermediates.get(name, plane)
+
+
+def shared_filter(intermediates, image, roi=None, key='article_filters', cache=None):
+    # The article filters of a frame, or of the annulus roi of it. The
+    # scheduler filters the white-light frame and its limb annulus once for
+    # every consumer; other annuli are filtered into the caller's buffer.
+    if roi is None:
+        return shared_intermediate(intermediates, 'filtered_white_light', image, cache)
+    if intermediates is not None and intermediates.covers_annulus(roi, image):
+        return intermediates.get('limb_filtered_white_light', image)
+
+    from circle_bubbling_method import apply_article_filters
+    return apply_article_filters(image, roi=roi, buffers=FRAME_BUFFERS, key=key)
@@ -0,0 +1,188 @@
+import numpy as np
+from circle_bubbling_method import disk_circle, expected_limb
+from uncertainty import covariance_uncertainty
+from hmi_processor import HMI_Processor
+from instrumentation import ERROR, INFO, log, count
+
+LIMB_RAYS = 360
+
+# Edge points are searched within this fraction of the starting radius,
+# then again within a few pixels of the first fit.
+SEARCH_WIDTH = 0.03
+REFINE_WIDTH = 4.0
+
+ROBUST_ITERATIONS = 5
+# Tukey biweight cutoff in units of the MAD scale of the residuals.
+BIWEIGHT_CUTOFF = 4.685
+# Caps the residual correlation, and with it the covariance inflation at 39x.
+MAX_CORRELATION = 0.95
+
+
+def limb_points(filtered, center, radius, width, n_rays=LIMB_RAYS):
+    # Along each ray the limb is the maximum of the filtered profile,
+    # refined to a fraction of a pixel by a parabola through its neighbours.
+    from scipy.ndimage import map_coordinates
+
+    angles = np.linspace(0, 2 * np.pi, n_rays, endpoint=False)
+    radii = radius + np.arange(-np.ceil(width), np.ceil(width) + 1)
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+
+    xs = center[0] + radii * cos
+    ys = center[1] + radii * sin
+    profiles = map_coordinates(filtered, [ys.ravel(), xs.ravel()], order=1, mode='constant', cval=0.0)
+    profiles = profiles.reshape(xs.shape)
+
+    peaks = np.argmax(profiles, axis=1)
+    # A peak at the end of the window is the window edge, not the limb.
+    inside = (peaks > 0) & (peaks < len(radii) - 1) & (profiles.max(axis=1) > 0)
+    rows = np.nonzero(inside)[0]
+    peaks = peaks[rows]
+
+    left, middle, right = profiles[rows, peaks - 1], profiles[rows, peaks], profiles[rows, peaks + 1]
+    curvature = left - 2 * middle + right
+    shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1.0), 0.0)
+
+    edge_radii = radii[peaks] + shift
+    return center[0] + edge_radii * cos[rows, 0], center[1] + edge_radii * sin[rows, 0], n_rays
+
+
+def kasa_fit(x, y, weights=None):
+    # x^2 + y^2 = 2 a x + 2 b y + c is linear in (a, b, c); coordinates are
+    # taken relative to their mean to keep the system well conditioned.
+    if weights is None:
+        weights = np.ones_like(x)
+    x_0, y_0 = np.average(x, weights=weights), np.average(y, weights=weights)
+    u, v = x - x_0, y - y_0
+
+    design = np.column_stack([2 * u, 2 * v, np.ones_like(u)])
+    root_weights = np.sqrt(weights)
+    solution = np.linalg.lstsq(design * root_weights[:, None], (u ** 2 + v ** 2) * root_weights, rcond=None)[0]
+
+    a, b, c = solution
+    return (x_0 + a, y_0 + b), float(np.sqrt(max(c + a ** 2 + b ** 2, 0.0)))
+
+
+def robust_circle_fit(x, y, iterations=ROBUST_ITERATIONS, cutoff=BIWEIGHT_CUTOFF):
+    # Iteratively reweighted Kasa fit; Tukey weights on the geometric
+    # residuals drop active-region edges and other off-limb maxima.
+    weights = np.ones_like(x)
+    center, radius = kasa_fit(x, y)
+
+    for _ in range(iterations):
+        residuals = np.hypot(x - center[0], y - center[1]) - radius
+        scale = 1.4826 * np.median(np.abs(residuals - np.median(residuals)))
+        if scale <= 0:
+            break
+        weights = np.clip(1 - (residuals / (cutoff * scale)) ** 2, 0.0, None) ** 2
+        if np.count_nonzero(weights) < 3:
+            break
+        center, radius = kasa_fit(x, y, weights)
+
+    return center, radius, weights
+
+
+def residual_correlation(residuals):
+    # Lag-1 autocorrelation of the residuals around the limb (the points
+    # are in ray order, so the last one neighbours the first).
+    centered = residuals - residuals.mean()
+    power = np.sum(centered ** 2)
+    if len(residuals) < 3 or power <= 0:
+        return 0.0
+    return float(np.clip(np.sum(centered * np.roll(centered, 1)) / power, 0.0, MAX_CORRELATION))
+
+
+def circle_covariance(x, y, weights, center, radius):
+    # Linearised covariance of (x, y, radius) for the geometric residuals
+    # d_i - r, scaled by their weighted variance. Neighbouring rays share
+    # filtered pixels, so their residuals are correlated; the AR(1) factor
+    # (1 + rho) / (1 - rho) accounts for the fewer independent points.
+    # Errors common to the whole limb (filter bias, limb darkening) are not
+    # in the residuals, so this is still a lower bound.
+    dx, dy = x - center[0], y - center[1]
+    distances = np.hypot(dx, dy)
+    jacobian = np.column_stack([-dx / distances, -dy / distances, -np.ones_like(dx)])
+    residuals = distances - radius
+
+    used = np.count_nonzero(weights)
+    sigma2 = np.sum(weights * residuals ** 2) / max(np.sum(weights) * (used - 3) / used, 1e-12)
+    rho = residual_correlation(residuals[weights > 0])
+    normal = jacobian.T @ (jacobian * weights[:, None])
+    return sigma2 * (1 + rho) / (1 - rho) * np.linalg.inv(normal)
+
+
+class LimbFitMethod(HMI_Processor):
+    requires = ('abs',)
+    white_light_requires = ('limb_filtered_white_light',)
+
+    def __init__(self, n_rays=LIMB_RAYS):
+        super().__init__()
+        self.n_rays = n_rays
+
+    def solar_center(self, context=None):
+        if self.data is None:
+            log(ERROR, "No data loaded. Call read_fits() first.")
+            return None, None, None
+
+        return self.process_method(self.data, context)
+
+    def start(self, image, white_light, context=None):
+        prior = self.frame_prior(context, white_light)
+        if prior is not None:
+            return prior['center'], prior['radius']
+
+        if white_light:
+            return expected_limb(image, self.quantiles)
+        # Off-disk magnetogram pixels are NaN, zeroed on load.
+        return disk_circle(image != 0)
+
+    def process_method(self, data_clean, context=None):
+        try:
+            white_data = self.white_light(context)
+            if white_data is not None:
+                image, data_source = white_data, "white light"
+            else:
+                image, data_source = self.intermediate('abs', data_clean, context), "magnetogram"
+
+            center, radius = self.start(image, white_data is not None, context)
+            if center is None:
+                return None, "Limb Fit", None
+
+            # Only the annulus the rays cross is filtered; the frame's limb
+            # annulus is used when it holds it.
+            width = max(SEARCH_WIDTH * radius, 2 * REFINE_WIDTH)
+            filtered = self.filtered(image, (center, radius, width + 2), context, key='limb_fit_filters')
+
+            x, y, total = limb_points(filtered, center, radius, width, self.n_rays)
+            center, radius, weights = robust_circle_fit(x, y)
+            x, y, total = limb_points(filtered, center, radius, REFINE_WIDTH, self.n_rays)
+            if len(x) < 3:
+                return None, "Limb Fit", None
+            center, radius, weights = robust_circle_fit(x, y)
+            count(limb_points=len(x))
+
+            covariance = circle_covariance(x, y, weights, center, radius)
+            log(INFO, "Limb fit: %d of %d rays, radius %.2f px", np.count_nonzero(weights), total, radius)
+
+            uncertainty = covariance_uncertainty(covariance[:2, :2], int(np.count_nonzero(weights)), total,
+                                                 'limb_fit')
+            uncertainty['final_diameter'] = 2 * radius
+            uncertainty['radius_std'] = float(np.sqrt(covariance[2, 2]))
+            uncertainty['data_source'] = data_source
+
+            return (float(center[0]), float(center[1])), "Limb Fit", uncertainty
+
+        except Exception as e:
+            log(ERROR, "Limb fit method failed: %s", e)
+            return None, "Limb Fit", None
+
+
+def limb_fit(data_clean, n_rays=LIMB_RAYS, quantiles=None, prior=None, context=None):
+    processor = LimbFitMethod(n_rays=n_rays)
+    processor.data = data_clean
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+limb_fit.requires = LimbFitMethod.requires
+limb_fit.white_light_requires = LimbFitMethod.white_light_requires
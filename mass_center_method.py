@@ -1,22 +1,25 @@
 import numpy as np
 from uncertainty import calculate_edge_based_uncertainty
 from hmi_processor import HMI_Processor
+from instrumentation import ERROR, log
 
 
 class MassCenterMethod(HMI_Processor):
+    requires = ('abs',)
+
     def __init__(self):
         super().__init__()
         
-    def solar_center(self):
+    def solar_center(self, context=None):
         if self.data is None:
-            print("No data loaded. Call read_fits() first.")
+            log(ERROR, "No data loaded. Call read_fits() first.")
             return None, None, None
         
-        return self.process_method(self.data)
+        return self.process_method(self.data, context)
     
-    def process_method(self, data_clean):
-        abs_data = np.abs(data_clean)
-        threshold = np.percentile(abs_data, 80)
+    def process_method(self, data_clean, context=None):
+        abs_data = self.intermediate('abs', data_clean, context)
+        threshold = self.percentile(abs_data, 80, key='abs')
         mask = abs_data > threshold
 
         y_indices, x_indices = np.where(mask)
@@ -25,14 +28,20 @@ class MassCenterMethod(HMI_Processor):
             center_y = np.mean(y_indices)
 
             center = (center_x, center_y)
-            uncertainty = calculate_edge_based_uncertainty(data_clean, center)
+            uncertainty = calculate_edge_based_uncertainty(data_clean, center, disk_radius=self.disk_radius(),
+                                                           quantiles=self.quantiles)
 
             return (center_x, center_y), "Center of Mass", uncertainty
 
         return None, "Center of Mass", None
 
 
-def center_of_mass(data_clean):
+def center_of_mass(data_clean, quantiles=None, prior=None, context=None):
     processor = MassCenterMethod()
     processor.data = data_clean
-    return processor.solar_center()
+    processor.quantiles = quantiles
+    processor.prior = prior
+    return processor.solar_center(context)
+
+
+center_of_mass.requires = MassCenterMethod.requires
@@ -12,41 +12,205 @@ def calculate_metrics(detected_center, reference_center):
     return distance_error, dx, dy
 
 
+AVERAGE_LABELS = ('Simple Average', 'Weighted Average')
+
+
+class FrameAverage:
+    # Running sums over one frame's methods. Added in row order they equal
+    # np.mean/np.average bit for bit below eight rows, where numpy sums
+    # sequentially, and to rounding above.
+    def __init__(self):
+        self.count = 0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_weights = 0.0
+        self.sum_weighted_x = 0.0
+        self.sum_weighted_y = 0.0
+
+    def add(self, center, error):
+        if error is None or np.isnan(error):
+            return
+        weight = 1 / error
+        self.count += 1
+        self.sum_x += center[0]
+        self.sum_y += center[1]
+        self.sum_weights += weight
+        self.sum_weighted_x += weight * center[0]
+        self.sum_weighted_y += weight * center[1]
+
+    def merge(self, other):
+        self.count += other.count
+        for name in ('sum_x', 'sum_y', 'sum_weights', 'sum_weighted_x', 'sum_weighted_y'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        return self
+
+    def result(self, reference_center):
+        if self.count == 0:
+            return None
+
+        avg_center = (self.sum_x / self.count, self.sum_y / self.count)
+        dx = avg_center[0] - reference_center[0]
+        dy = avg_center[1] - reference_center[1]
+
+        weighted_center = (self.sum_weighted_x / self.sum_weights, self.sum_weighted_y / self.sum_weights)
+        w_dx = weighted_center[0] - reference_center[0]
+        w_dy = weighted_center[1] - reference_center[1]
+
+        return {
+            'simple_average': {
+                'center': avg_center,
+                'error': np.sqrt(dx ** 2 + dy ** 2),
+                'delta_x': dx,
+                'delta_y': dy
+            },
+            'weighted_average': {
+                'center': weighted_center,
+                'error': np.sqrt(w_dx ** 2 + w_dy ** 2),
+                'delta_x': w_dx,
+                'delta_y': w_dy
+            },
+            'methods_used': self.count
+        }
+
+
 def calculate_average_center(results_df_, reference_center):
-    successful_methods = results_df_[results_df_['Error_pixels'].notna()]
-
-    if len(successful_methods) == 0:
-        return None
-
-    avg_center_x = np.mean(successful_methods['Center_X'])
-    avg_center_y = np.mean(successful_methods['Center_Y'])
-    avg_center = (avg_center_x, avg_center_y)
-
-    dx = avg_center_x - reference_center[0]
-    dy = avg_center_y - reference_center[1]
-    avg_error = np.sqrt(dx ** 2 + dy ** 2)
-
-    weights = 1 / successful_methods['Error_pixels']
-    weighted_center_x = np.average(successful_methods['Center_X'], weights=weights)
-    weighted_center_y = np.average(successful_methods['Center_Y'], weights=weights)
-    weighted_center = (weighted_center_x, weighted_center_y)
-
-    w_dx = weighted_center_x - reference_center[0]
-    w_dy = weighted_center_y - reference_center[1]
-    weighted_error = np.sqrt(w_dx ** 2 + w_dy ** 2)
-
-    return {
-        'simple_average': {
-            'center': avg_center,
-            'error': avg_error,
-            'delta_x': dx,
-            'delta_y': dy
-        },
-        'weighted_average': {
-            'center': weighted_center,
-            'error': weighted_error,
-            'delta_x': w_dx,
-            'delta_y': w_dy
-        },
-        'methods_used': len(successful_methods)
-    }
+    average = FrameAverage()
+    for center_x, center_y, error in zip(results_df_['Center_X'], results_df_['Center_Y'],
+                                         results_df_['Error_pixels']):
+        average.add((center_x, center_y), error)
+    return average.result(reference_center)
+
+
+class RunningStats:
+    # Welford's running mean and sum of squared deviations; two states
+    # combine with Chan et al.'s pairwise update.
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['count'], state['mean'], state['m2'])
+
+
+class MethodStats:
+    FIELDS = ('error', 'delta_x', 'delta_y')
+
+    def __init__(self):
+        self.stats = {field: RunningStats() for field in self.FIELDS}
+        self.wins = 0
+
+    def update(self, error, delta_x, delta_y):
+        for field, value in zip(self.FIELDS, (error, delta_x, delta_y)):
+            self.stats[field].update(value)
+
+    def merge(self, other):
+        for field in self.FIELDS:
+            self.stats[field].merge(other.stats[field])
+        self.wins += other.wins
+        return self
+
+    def to_dict(self):
+        return {'wins': self.wins, **{field: self.stats[field].to_dict() for field in self.FIELDS}}
+
+    @classmethod
+    def from_dict(cls, state):
+        method_stats = cls()
+        method_stats.wins = state['wins']
+        method_stats.stats = {field: RunningStats.from_dict(state[field]) for field in cls.FIELDS}
+        return method_stats
+
+
+class CampaignStats:
+    # Constant memory per method. Workers or per-day shards keep their own
+    # state (to_dict/from_dict round-trips through JSON) and merge later.
+    def __init__(self):
+        self.frames = 0
+        self.methods = {}
+
+    def update(self, rows):
+        # rows are the per-method dicts of one frame (Method, Error_pixels,
+        # Delta_X, Delta_Y); averages are tracked but never win.
+        best = None
+        self.frames += 1
+        for row in rows:
+            error = row['Error_pixels']
+            if error is None or np.isnan(error):
+                continue
+            method_stats = self.methods.setdefault(row['Method'], MethodStats())
+            method_stats.update(error, row['Delta_X'], row['Delta_Y'])
+            if row['Method'] not in AVERAGE_LABELS and (best is None or error < best[1]):
+                best = (row['Method'], error)
+
+        if best is not None:
+            self.methods[best[0]].wins += 1
+
+    def update_frame(self, results_df_, averaging_results=None):
+        rows = results_df_.to_dict('records')
+        if averaging_results:
+            for key, label in zip(('simple_average', 'weighted_average'), AVERAGE_LABELS):
+                average = averaging_results[key]
+                rows.append({'Method': label, 'Error_pixels': average['error'],
+                             'Delta_X': average['delta_x'], 'Delta_Y': average['delta_y']})
+        self.update(rows)
+
+    def merge(self, other):
+        self.frames += other.frames
+        for method, method_stats in other.methods.items():
+            self.methods.setdefault(method, MethodStats()).merge(method_stats)
+        return self
+
+    def to_dict(self):
+        return {'frames': self.frames, 'methods': {method: stats.to_dict() for method, stats in self.methods.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        campaign = cls()
+        campaign.frames = state['frames']
+        campaign.methods = {method: MethodStats.from_dict(stats) for method, stats in state['methods'].items()}
+        return campaign
+
+    def summary(self):
+        summary = []
+        for method, method_stats in self.methods.items():
+            error, delta_x, delta_y = (method_stats.stats[field] for field in MethodStats.FIELDS)
+            summary.append({
+                'Method': method,
+                'Frames': error.count,
+                'Mean_error': error.mean,
+                'Std_error': error.std,
+                'Bias_X': delta_x.mean,
+                'Bias_Y': delta_y.mean,
+                'Std_X': delta_x.std,
+                'Std_Y': delta_y.std,
+                'Win_rate': method_stats.wins / self.frames if self.frames else np.nan
+            })
+        return summary
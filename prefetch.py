@@ -0,0 +1,161 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from data_loader import fetch_magnetogram
+from fits_archive import get_archive
+from white_light_finder import fetch_white_light
+from instrumentation import ERROR, INFO, log
+
+KINDS = ('magnetogram', 'white_light')
+
+PHYSOBS = {
+    'magnetogram': ('los_magnetic_field',),
+    'white_light': ('intensity', 'intensitygram')
+}
+
+
+def archived_file(archive, target_date, kind):
+    for physobs in PHYSOBS[kind]:
+        path = archive.nearest(target_date, physobs)
+        if path:
+            return path
+    return None
+
+
+class LocalDirectoryClient:
+    # Offline stand-in for Fido: answers from an indexed directory only.
+    def __init__(self, root):
+        self.archive = get_archive(root)
+
+    def fetch(self, target_date, kind):
+        return archived_file(self.archive, target_date, kind)
+
+
+class FidoClient:
+    def __init__(self, archive=None):
+        self.archive = archive or get_archive()
+
+    def fetch(self, target_date, kind):
+        path = archived_file(self.archive, target_date, kind)
+        if path:
+            return path
+
+        if kind == 'magnetogram':
+            return fetch_magnetogram(target_date, self.archive)
+        return fetch_white_light(target_date, self.archive)
+
+
+def fetch_with_retries(client, target_date, kind, retries=3, backoff=2.0):
+    # Missing data (None) is an answer; only exceptions are retried.
+    for attempt in range(retries + 1):
+        try:
+            return client.fetch(target_date, kind), None
+        except Exception as e:
+            if attempt == retries:
+                return None, f"{kind}: {e}"
+            delay = backoff * 2 ** attempt
+            log(ERROR, "Fetching %s for %s failed (%s); retrying in %.0f s", kind, target_date, e, delay)
+            time.sleep(delay)
+
+
+_DONE = object()
+
+
+class Prefetcher:
+    def __init__(self, frames, client, lookahead=4, max_workers=4, retries=3, backoff=2.0, fallback=True):
+        self.frames = list(frames)
+        self.client = client
+        self.fallback = fallback
+        self.lookahead = max(1, lookahead)
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        # Fetched frames wait here for the compute stage; when it is full the
+        # producer stops issuing new fetches.
+        self.queue = queue.Queue(maxsize=self.lookahead)
+        self._stop = threading.Event()
+        self._thread = None
+        self._error = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='hmi-prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+
+    def __iter__(self):
+        self.start()
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.close()
+
+        if self._error is not None:
+            raise self._error
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                pending = deque()
+                for frame in self.frames:
+                    if self._stop.is_set():
+                        break
+                    futures = {kind: pool.submit(fetch_with_retries, self.client, frame['target_date'], kind,
+                                                 self.retries, self.backoff)
+                               for kind in KINDS}
+                    pending.append((frame, futures))
+
+                    if len(pending) >= self.lookahead and not self._deliver(*pending.popleft()):
+                        break
+
+                while pending and not self._stop.is_set():
+                    self._deliver(*pending.popleft())
+
+                for _, futures in pending:
+                    for future in futures.values():
+                        future.cancel()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def _deliver(self, frame, futures):
+        (magnetogram_file, magnetogram_error), (white_light_file, white_light_error) = (
+            futures[kind].result() for kind in KINDS
+        )
+
+        for error in (magnetogram_error, white_light_error):
+            if error is not None:
+                log(ERROR, "Prefetch for %s gave up on %s", frame['frame'], error)
+
+        if magnetogram_file is None:
+            if self.fallback:
+                # Leave the frame to the regular loader and its fallbacks.
+                return self._put(frame)
+            return self._put(dict(frame, error=magnetogram_error or "no magnetogram file found"))
+
+        log(INFO, "Prefetched %s", frame['frame'])
+        return self._put(dict(frame, magnetogram_file=str(magnetogram_file),
+                              white_light_file=str(white_light_file) if white_light_file else None))
@@ -0,0 +1,90 @@
+import threading
+import numpy as np
+
+
+def plane_key(plane):
+    return (plane.__array_interface__['data'][0], plane.shape, plane.strides, plane.dtype.str)
+
+
+class QuantileEngine:
+    def __init__(self, mode='exact', tolerance=1e-4):
+        if mode not in ('exact', 'histogram'):
+            raise ValueError(f"Unknown quantile mode: {mode}")
+
+        self.mode = mode
+        self.tolerance = tolerance
+        self.passes = 0
+        self._requests = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def request(self, key, *percentiles):
+        self._requests.setdefault(key, set()).update(float(q) for q in percentiles)
+
+    def percentile(self, plane, q, key=None):
+        if key is None:
+            key = plane_key(plane)
+        q = float(q)
+
+        with self._lock:
+            if (key, q) in self._cache:
+                return self._cache[(key, q)]
+            wanted = sorted(({q} | self._requests.get(key, set())) -
+                            {cached_q for cached_key, cached_q in self._cache if cached_key == key})
+
+        # Computed outside the lock so methods running in other threads are
+        # not serialized behind a partition of an unrelated plane.
+        values = self._compute(plane, wanted)
+
+        with self._lock:
+            self.passes += 1
+            for wanted_q, value in zip(wanted, values):
+                self._cache.setdefault((key, wanted_q), value)
+            return self._cache[(key, q)]
+
+    def _compute(self, plane, percentiles):
+        if self.mode == 'exact':
+            # np.percentile partitions once for all kth values and applies the
+            # same interpolation per quantile, so each value is bit-identical
+            # to a separate np.percentile(plane, q) call.
+            return np.percentile(plane, percentiles)
+
+        return self._histogram_percentiles(plane, percentiles)
+
+    def _histogram_percentiles(self, plane, percentiles):
+        # Each estimate lies in the same bin as the exact value, so the error
+        # is at most tolerance * (max - min) of the plane.
+        low, high = float(np.min(plane)), float(np.max(plane))
+        if high == low:
+            return [low] * len(percentiles)
+
+        n_bins = int(np.ceil(1.0 / self.tolerance))
+        counts, edges = np.histogram(plane, bins=n_bins, range=(low, high))
+        cumulative = np.cumsum(counts)
+        bin_width = edges[1] - edges[0]
+
+        values = []
+        for q in percentiles:
+            rank = q / 100 * (plane.size - 1)
+            b = int(np.searchsorted(cumulative, rank, side='right'))
+            b = min(b, n_bins - 1)
+            below = cumulative[b - 1] if b > 0 else 0
+            fraction = (rank - below + 0.5) / counts[b] if counts[b] > 0 else 0.5
+            values.append(edges[b] + min(max(fraction, 0.0), 1.0) * bin_width)
+
+        return values
+
+
+def percentile(plane, q, quantiles=None, key=None):
+    if quantiles is None:
+        return np.percentile(plane, q)
+    return quantiles.percentile(plane, q, key=key)
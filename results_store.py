@@ -0,0 +1,177 @@
+import json
+import time
+import uuid
+import numpy as np
+from finding_center import METHOD_VERSIONS, METHODS
+from sqlite_db import ProcessConnection
+from instrumentation import INFO, json_default, log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    frame TEXT NOT NULL,
+    method TEXT NOT NULL,
+    method_version INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    label TEXT,
+    source TEXT,
+    white_light_source TEXT,
+    center_x REAL,
+    center_y REAL,
+    error_pixels REAL,
+    delta_x REAL,
+    delta_y REAL,
+    std_x REAL,
+    std_y REAL,
+    covariance REAL,
+    final_diameter REAL,
+    uncertainty TEXT,
+    runtime REAL,
+    run_id TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_frame ON results (frame, method, method_version, status);
+"""
+
+COLUMNS = (
+    'frame', 'method', 'method_version', 'status', 'label', 'source', 'white_light_source',
+    'center_x', 'center_y', 'error_pixels', 'delta_x', 'delta_y', 'std_x', 'std_y', 'covariance',
+    'final_diameter', 'uncertainty', 'runtime', 'run_id', 'created'
+)
+
+STORE_BATCH = 200
+
+
+def method_version(method):
+    return METHOD_VERSIONS.get(method, 1)
+
+
+def _optional_float(value):
+    return None if value is None or not np.isfinite(value) else float(value)
+
+
+def method_records(frame, results_df, uncertainties, method_runs):
+    # One record per method the frame ran; when tracking re-ran the methods
+    # after losing the disk, the last run counts.
+    runs = {run['method']: run for run in method_runs}
+    results = {row['Method']: row for _, row in results_df.iterrows()}
+    records = []
+
+    for method, run in runs.items():
+        record = {
+            'frame': frame['frame'],
+            'method': method,
+            'method_version': method_version(method),
+            'status': 'failed',
+            'label': run['label'],
+            'source': frame.get('magnetogram_file'),
+            'white_light_source': frame.get('white_light_file'),
+            'runtime': run['runtime']
+        }
+
+        row = results.get(run['label']) if run['ok'] else None
+        if row is not None:
+            uncertainty = uncertainties.get(run['label']) or {}
+            std_x, std_y = uncertainty.get('std_pixels', (None, None))
+            record.update({
+                'status': 'ok',
+                'center_x': float(row['Center_X']),
+                'center_y': float(row['Center_Y']),
+                'error_pixels': float(row['Error_pixels']),
+                'delta_x': float(row['Delta_X']),
+                'delta_y': float(row['Delta_Y']),
+                'std_x': _optional_float(std_x),
+                'std_y': _optional_float(std_y),
+                'covariance': _optional_float(uncertainty.get('covariance')),
+                'final_diameter': _optional_float(uncertainty.get('final_diameter')),
+                'uncertainty': json.dumps(uncertainty, default=json_default)
+            })
+        records.append(record)
+
+    return records
+
+
+class ResultsStore:
+    # Append-only: rows are never updated, so a rerun adds rows and the
+    # latest successful row per (frame, method, version) is the result.
+    def __init__(self, path, batch_size=STORE_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.run_id = uuid.uuid4().hex[:12]
+        self._pending = []
+        self._database = ProcessConnection(path, _SCHEMA)
+
+    @property
+    def connection(self):
+        return self._database.get()
+
+    def completed(self):
+        # Methods done per frame at their current version.
+        done = {}
+        for frame, method, version in self.connection.execute(
+                "SELECT DISTINCT frame, method, method_version FROM results WHERE status = 'ok'"):
+            if version == method_version(method):
+                done.setdefault(frame, set()).add(method)
+        return done
+
+    def missing_methods(self, frame, done, methods=None):
+        names = [method.__name__ for method in (methods or METHODS)]
+        finished = done.get(frame['frame'], set())
+        return [name for name in names if name not in finished]
+
+    def append(self, records):
+        created = time.time()
+        for record in records:
+            row = dict(record, run_id=self.run_id, created=created)
+            self._pending.append(tuple(row.get(column) for column in COLUMNS))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                self._pending
+            )
+        log(INFO, "Stored %d results in %s", len(self._pending), self.path)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._database.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def results(self, current_only=True):
+        # Latest successful row per (frame, method, version). Only readers of
+        # the store need pandas; batch workers never load it.
+        import pandas as pd
+
+        frame = pd.read_sql_query(
+            "SELECT * FROM results WHERE rowid IN ("
+            "SELECT MAX(rowid) FROM results WHERE status = 'ok' GROUP BY frame, method, method_version"
+            ") ORDER BY frame, rowid",
+            self.connection
+        )
+        if current_only and not frame.empty:
+            frame = frame[frame['method_version'] == frame['method'].map(method_version)]
+        return frame.reset_index(drop=True)
+
+
+def pending_frames(frames, store, methods=None):
+    # Frames with every method done are dropped; the others carry the
+    # methods they still need.
+    done = store.completed()
+    pending = []
+    for frame in frames:
+        missing = store.missing_methods(frame, done, methods)
+        if missing:
+            pending.append(dict(frame, methods=missing))
+
+    log(INFO, "Resuming: %d of %d frames still need work", len(pending), len(frames))
+    return pending
@@ -0,0 +1,110 @@
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+from instrumentation import DEBUG, log, count
+
+
+class SharedFrame:
+    # Each plane of a frame is copied once into its own shared memory
+    # block; workers attach to the blocks by name instead of receiving a
+    # pickled copy with every task. The descriptor (block names, shapes and
+    # dtypes) is all a task carries, whatever the frame size.
+    def __init__(self):
+        self.blocks = {}
+        self.descriptor = {}
+        self.nbytes = 0
+
+    def share(self, key, array):
+        array = np.asarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        self.blocks[key] = block
+        self.descriptor[key] = (block.name, array.shape, array.dtype.str)
+        self.nbytes += array.nbytes
+        count(shared_bytes=array.nbytes)
+        log(DEBUG, "Shared %s: %.1f MB in %s", key, array.nbytes / 2 ** 20, block.name)
+
+    def unlink(self):
+        # Removes the names only; a worker still attached (a timed-out
+        # method) keeps its mapping until it closes it.
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.unlink()
+
+
+def share_frame(data_clean, context=None):
+    frame = SharedFrame()
+    try:
+        frame.share('data', data_clean)
+        if context is not None and context.white_light is not None:
+            frame.share('white_light', context.white_light)
+    except BaseException:
+        frame.unlink()
+        raise
+    return frame
+
+
+class AttachedFrame:
+    # Worker side: read-only views of the shared planes, no copies.
+    def __init__(self, descriptor):
+        self.blocks = {}
+        self.planes = {}
+        try:
+            for key, (name, shape, dtype) in descriptor.items():
+                block = self.blocks[key] = shared_memory.SharedMemory(name=name)
+                plane = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+                plane.flags.writeable = False
+                self.planes[key] = plane
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        # The views go first; a block cannot close while one is alive.
+        self.planes = {}
+        for block in self.blocks.values():
+            block.close()
+        self.blocks = {}
+
+
+def shared_options(options):
+    # The context travels without its planes; the worker puts the shared
+    # views back. Worker processes never shared the scheduler's planes.
+    context = options.get('context')
+    if context is None:
+        return options
+    return dict(options, context=context.replace(data=None, white_light=None, intermediates=None))
+
+
+def _call(method, planes, options):
+    data = planes['data']
+    context = options.get('context')
+    if context is not None:
+        options = dict(options, context=context.replace(data=data, white_light=planes.get('white_light')))
+    return method(data, **options)
+
+
+def call_shared(method, descriptor, options):
+    # Runs in the worker: the entry point gets the shared planes where it
+    # would get pickled arrays, so method(data_clean, ...) is unchanged.
+    frame = AttachedFrame(descriptor)
+    try:
+        return _call(method, frame.planes, options)
+    except BaseException as e:
+        # Locals in the traceback hold views of the planes; clearing them
+        # lets the blocks close while the traceback still formats.
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        frame.close()
+
+
+def submit_shared(pool, frame, method, options):
+    return pool.submit(call_shared, method, frame.descriptor, shared_options(options))
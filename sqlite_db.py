@@ -0,0 +1,33 @@
+import os
+import sqlite3
+from pathlib import Path
+
+
+class ProcessConnection:
+    # sqlite connections must not cross a fork, so each process opens its
+    # own. A read-only one never creates the file or writes the schema.
+    def __init__(self, path, schema, read_only=False, **options):
+        self.path = path
+        self.schema = schema
+        self.read_only = read_only
+        self.options = options
+        self._connection = None
+        self._pid = None
+
+    def get(self):
+        if self._connection is None or self._pid != os.getpid():
+            if self.read_only:
+                uri = Path(self.path).resolve().as_uri() + '?mode=ro'
+                self._connection = sqlite3.connect(uri, uri=True, **self.options)
+            else:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._connection = sqlite3.connect(self.path, **self.options)
+                self._connection.executescript(self.schema)
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        # A connection inherited across a fork is the parent's to close.
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
@@ -0,0 +1,150 @@
+import numpy as np
+
+# Quadratic limb-darkening coefficients near the HMI Fe I 6173 A line.
+LIMB_DARKENING = (0.43, 0.26)
+
+CONTINUUM_INTENSITY = 5.0e4
+
+HMI_PLATE_SCALE = 0.504
+
+
+def disk_geometry(size, center, radius):
+    y, x = np.ogrid[:size, :size]
+    distance = np.hypot(x - center[0], y - center[1])
+
+    # Fraction of each pixel inside the limb, linear over one pixel, so the
+    # disk edge carries sub-pixel information about the true center.
+    coverage = np.clip(radius - distance + 0.5, 0.0, 1.0)
+
+    mu = 1.0 - (distance / radius) ** 2
+    np.clip(mu, 0.0, 1.0, out=mu)
+    np.sqrt(mu, out=mu)
+
+    return distance, coverage, mu
+
+
+def limb_darkened_disk(size, center, radius, noise=0.005, off_disk_nan=True,
+                       limb_darkening=LIMB_DARKENING, intensity=CONTINUUM_INTENSITY,
+                       seed=0, dtype=np.float64):
+    rng = np.random.default_rng(seed)
+    _, coverage, mu = disk_geometry(size, center, radius)
+
+    u, v = limb_darkening
+    one_minus_mu = 1.0 - mu
+    image = 1.0 - u * one_minus_mu - v * one_minus_mu ** 2
+    image *= coverage
+    if noise:
+        image += noise * rng.standard_normal((size, size))
+    image *= intensity
+
+    if off_disk_nan:
+        image[coverage == 0] = np.nan
+
+    return image.astype(dtype, copy=False)
+
+
+def add_bipole(field, center, separation, width, amplitude, tilt):
+    size = field.shape[0]
+    half = 4 * width
+
+    for sign, offset in ((1, 0.5), (-1, -0.5)):
+        px = center[0] + offset * separation * np.cos(tilt)
+        py = center[1] + offset * separation * np.sin(tilt)
+
+        x_0, x_1 = max(0, int(px - half)), min(size, int(px + half) + 1)
+        y_0, y_1 = max(0, int(py - half)), min(size, int(py + half) + 1)
+        if x_0 >= x_1 or y_0 >= y_1:
+            continue
+
+        y, x = np.ogrid[y_0:y_1, x_0:x_1]
+        field[y_0:y_1, x_0:x_1] += sign * amplitude * np.exp(
+            -((x - px) ** 2 + (y - py) ** 2) / (2 * width ** 2))
+
+
+def synthetic_magnetogram(size, center, radius, noise=10.0, regions=6, off_disk_nan=True,
+                          seed=0, dtype=np.float64):
+    rng = np.random.default_rng(seed)
+    _, coverage, mu = disk_geometry(size, center, radius)
+
+    # Active regions are radial bipoles; the line of sight sees mu of them.
+    field = np.zeros((size, size))
+    for _ in range(regions):
+        rho = 0.8 * radius * np.sqrt(rng.uniform())
+        phi = rng.uniform(0, 2 * np.pi)
+        add_bipole(field,
+                   (center[0] + rho * np.cos(phi), center[1] + rho * np.sin(phi)),
+                   separation=rng.uniform(0.02, 0.05) * size,
+                   width=rng.uniform(0.004, 0.01) * size,
+                   amplitude=rng.uniform(500, 2000),
+                   tilt=rng.uniform(-0.5, 0.5))
+    field *= mu
+
+    if noise:
+        field += noise * rng.standard_normal((size, size))
+    field *= coverage
+
+    if off_disk_nan:
+        field[coverage == 0] = np.nan
+
+    return field.astype(dtype, copy=False)
+
+
+def synthetic_header(size, center, radius, prior_error=0.3, seed=0):
+    rng = np.random.default_rng(seed)
+    cdelt = HMI_PLATE_SCALE * 4096 / size
+    # Header geometry is off by prior_error pixels (1 sigma) per coordinate
+    # and a tenth of that in radius.
+    return {
+        'CTYPE1': 'HPLN-TAN', 'CTYPE2': 'HPLT-TAN',
+        'CUNIT1': 'arcsec', 'CUNIT2': 'arcsec',
+        'CDELT1': cdelt, 'CDELT2': cdelt,
+        'CRPIX1': center[0] + 1 + rng.normal(0, prior_error),
+        'CRPIX2': center[1] + 1 + rng.normal(0, prior_error),
+        'CRVAL1': 0.0, 'CRVAL2': 0.0, 'CROTA2': 0.0,
+        'RSUN_OBS': (radius + rng.normal(0, prior_error / 10)) * cdelt
+    }
+
+
+def random_geometry(size, radius_fraction=0.47, max_offset=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+
+    # HMI frames keep the disk within a few pixels of the middle, with a
+    # radius of ~1900 px at 4096x4096.
+    center = (
+        (size - 1) / 2 + rng.uniform(-max_offset, max_offset) * size,
+        (size - 1) / 2 + rng.uniform(-max_offset, max_offset) * size
+    )
+    radius = radius_fraction * size * rng.uniform(0.98, 1.02)
+    return center, radius
+
+
+def synthetic_frame(size, noise=10.0, white_light_noise=0.005, regions=6, off_disk_nan=True,
+                    radius_fraction=0.47, max_offset=0.01, prior_error=0.3, seed=0, dtype=np.float64,
+                    center=None, radius=None):
+    random_center, random_radius = random_geometry(size, radius_fraction, max_offset, seed)
+    center = random_center if center is None else center
+    radius = random_radius if radius is None else radius
+
+    return {
+        'size': size,
+        'center': center,
+        'radius': radius,
+        'header': synthetic_header(size, center, radius, prior_error=prior_error, seed=seed + 3),
+        'white_light': limb_darkened_disk(size, center, radius, noise=white_light_noise,
+                                          off_disk_nan=off_disk_nan, seed=seed + 1, dtype=dtype),
+        'magnetogram': synthetic_magnetogram(size, center, radius, noise=noise, regions=regions,
+                                             off_disk_nan=off_disk_nan, seed=seed + 2, dtype=dtype)
+    }
+
+
+def synthetic_sequence(n_frames, size, drift=(0.05, -0.03), radius_drift=0.01, cadence=720.0, seed=0,
+                       radius_fraction=0.47, max_offset=0.01, **frame_options):
+    # A disk that drifts by a fraction of a pixel per frame, as between
+    # consecutive 720 s HMI frames.
+    start_center, start_radius = random_geometry(size, radius_fraction, max_offset, seed)
+    for index in range(n_frames):
+        center = (start_center[0] + drift[0] * index, start_center[1] + drift[1] * index)
+        frame = synthetic_frame(size, seed=seed + 10 * index, center=center,
+                                radius=start_radius + radius_drift * index, **frame_options)
+        frame['time'] = index * cadence
+        yield frame
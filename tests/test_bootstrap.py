@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+from bootstrap_uncertainty import apply_bootstrap, batched_kasa, bootstrap_circle
+from frame_context import FrameContext
+from instrumentation import ERROR, configure
+from limb_fit_method import kasa_fit, limb_fit
+from synthetic_data import synthetic_frame
+
+
+def noisy_circle(n, center=(50.0, 60.0), radius=40.0, noise=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(0, 2 * np.pi, n)
+    radii = radius + rng.normal(0, noise, n)
+    return center[0] + radii * np.cos(angles), center[1] + radii * np.sin(angles)
+
+
+def test_batched_kasa_matches_single_fits():
+    sets = [noisy_circle(50, seed=seed) for seed in range(4)]
+    x, y = np.array([s[0] for s in sets]), np.array([s[1] for s in sets])
+    weights = np.random.default_rng(0).uniform(0.5, 1.0, x.shape)
+
+    centers, radii = batched_kasa(x, y, weights)
+
+    for index in range(len(sets)):
+        center, radius = kasa_fit(x[index], y[index], weights[index])
+        np.testing.assert_allclose(centers[index], center, rtol=1e-10)
+        assert radii[index] == pytest.approx(radius, rel=1e-10)
+
+
+@pytest.mark.parametrize('mode', ['pairs', 'residuals'])
+def test_spread_matches_the_analytic_sigma(mode):
+    # Radial noise sigma on n points spread around the circle gives a center
+    # sigma of about sigma * sqrt(2 / n) per axis.
+    n, noise = 400, 0.2
+    x, y = noisy_circle(n, noise=noise)
+
+    uncertainty = bootstrap_circle(x, y, samples=1000, mode=mode)
+
+    expected = noise * np.sqrt(2 / n)
+    assert uncertainty['std_pixels'] == pytest.approx((expected, expected), rel=0.2)
+
+
+def test_same_seed_same_result_in_a_pool():
+    x, y = noisy_circle(100)
+    serial = bootstrap_circle(x, y, samples=300, batch_size=100, seed=3)
+    pooled = bootstrap_circle(x, y, samples=300, batch_size=100, seed=3, max_workers=2)
+
+    assert serial['std_pixels'] == pooled['std_pixels']
+    assert bootstrap_circle(x, y, samples=300, seed=4)['std_pixels'] != serial['std_pixels']
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        bootstrap_circle(*noisy_circle(20), mode='wild')
+
+
+def test_only_the_limb_fit_is_bootstrapped():
+    configure(verbosity=ERROR)
+    frame = synthetic_frame(256, seed=2)
+    data, white = np.nan_to_num(frame['magnetogram']), np.nan_to_num(frame['white_light'])
+    context = FrameContext(data, white_light=white)
+
+    limb = limb_fit(data, context=context)
+    circle = ((limb[0][0] + 0.5, limb[0][1]), 'Circle Bubbling (white light)',
+              {'std_pixels': (1.0, 1.0), 'final_diameter': limb[2]['final_diameter'], 'method': 'circle_bubbling'})
+    circle_uncertainty = dict(circle[2])
+
+    apply_bootstrap(data, [limb, circle], samples=200, context=context)
+
+    assert limb[2]['uncertainty_source'] == 'limb_fit_bootstrap'
+    assert limb[2]['method'] == 'limb_fit'
+    assert limb[2]['bootstrap_samples'] == 200
+    assert 0 < limb[2]['std_pixels'][0] < 0.1
+    assert circle[2] == circle_uncertainty
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+from fits_io import BAND_ROWS, read_fits_float32
+
+
+@pytest.fixture
+def frame():
+    rows = BAND_ROWS + 44
+    return np.arange(rows * 40, dtype=np.int32).reshape(rows, 40)
+
+
+def test_scaled_integer_image(tmp_path, frame):
+    hdu = fits.PrimaryHDU(frame)
+    hdu.header['BSCALE'] = 0.1
+    hdu.header['BZERO'] = 5.0
+    path = tmp_path / 'scaled.fits'
+    hdu.writeto(path)
+
+    data, header = read_fits_float32(path)
+
+    assert data.dtype == np.float32
+    np.testing.assert_allclose(data, frame * 0.1 + 5.0, rtol=1e-6)
+    assert header['BSCALE'] == 0.1
+
+
+def test_blank_pixels_become_zero(tmp_path, frame):
+    frame[3, 4] = -1
+    hdu = fits.PrimaryHDU(frame)
+    hdu.header['BLANK'] = -1
+    path = tmp_path / 'blank.fits'
+    hdu.writeto(path)
+
+    data, _ = read_fits_float32(path)
+
+    assert data[3, 4] == 0
+    assert data[3, 5] == frame[3, 5]
+
+
+def test_compressed_image(tmp_path, frame):
+    path = tmp_path / 'compressed.fits'
+    fits.HDUList([fits.PrimaryHDU(), fits.CompImageHDU(frame, compression_type='RICE_1')]).writeto(path)
+
+    data, _ = read_fits_float32(path)
+
+    np.testing.assert_array_equal(data, frame.astype(np.float32))
+
+
+def test_nan_pixels_become_zero(tmp_path, frame):
+    image = frame.astype(np.float32)
+    image[:10] = np.nan
+    path = tmp_path / 'nan.fits'
+    fits.PrimaryHDU(image).writeto(path)
+
+    data, _ = read_fits_float32(path)
+
+    assert not np.isnan(data).any()
+    assert np.all(data[:10] == 0)
+    np.testing.assert_array_equal(data[10:], image[10:])
+
+
+def test_reads_do_not_share_arrays(tmp_path, frame):
+    first, second = tmp_path / 'first.fits', tmp_path / 'second.fits'
+    fits.PrimaryHDU(frame.astype(np.float32)).writeto(first)
+    fits.PrimaryHDU(-frame.astype(np.float32)).writeto(second)
+
+    first_data, _ = read_fits_float32(first)
+    read_fits_float32(second)
+
+    np.testing.assert_array_equal(first_data, frame)
@@ -0,0 +1,70 @@
+import json
+import numpy as np
+import pytest
+from metrics import CampaignStats, RunningStats
+
+
+def running(values):
+    stats = RunningStats()
+    for value in values:
+        stats.update(value)
+    return stats
+
+
+def test_welford_matches_numpy():
+    values = np.random.default_rng(0).normal(1e6, 3.0, 1000)
+    stats = running(values)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert stats.variance == pytest.approx(values.var(ddof=1), rel=1e-9)
+
+
+def test_chan_merge_matches_one_pass():
+    values = np.random.default_rng(1).exponential(2.0, 777)
+    merged = running(values[:100]).merge(running(values[100:500])).merge(running(values[500:]))
+    whole = running(values)
+
+    assert merged.count == whole.count
+    assert merged.mean == pytest.approx(whole.mean, rel=1e-12)
+    assert merged.m2 == pytest.approx(whole.m2, rel=1e-10)
+
+
+def test_merge_with_empty_state():
+    stats = running([1.0, 2.0, 4.0])
+    assert RunningStats().merge(stats).to_dict() == stats.to_dict()
+    assert running([1.0, 2.0, 4.0]).merge(RunningStats()).to_dict() == stats.to_dict()
+
+
+def test_variance_of_one_value_is_nan():
+    assert np.isnan(running([5.0]).variance)
+
+
+def frame_rows(errors):
+    return [{'Method': method, 'Error_pixels': error, 'Delta_X': error, 'Delta_Y': -error}
+            for method, error in errors.items()]
+
+
+def test_campaign_shards_merge_through_json():
+    frames = [{'Limb Fit': 0.1 * i, 'Hough Transform': 0.2, 'Simple Average': 0.01} for i in range(1, 7)]
+    whole, first, second = CampaignStats(), CampaignStats(), CampaignStats()
+    for index, errors in enumerate(frames):
+        whole.update(frame_rows(errors))
+        (first if index < 2 else second).update(frame_rows(errors))
+
+    merged = CampaignStats.from_dict(json.loads(json.dumps(first.to_dict())))
+    merged.merge(CampaignStats.from_dict(json.loads(json.dumps(second.to_dict()))))
+
+    expected = {row['Method']: row for row in whole.summary()}
+    for row in merged.summary():
+        for field, value in row.items():
+            if field != 'Method':
+                assert value == pytest.approx(expected[row['Method']][field])
+
+
+def test_averages_never_win():
+    campaign = CampaignStats()
+    campaign.update(frame_rows({'Limb Fit': 0.3, 'Simple Average': 0.01, 'Weighted Average': 0.02}))
+
+    wins = {row['Method']: row['Win_rate'] for row in campaign.summary()}
+    assert wins == {'Limb Fit': 1.0, 'Simple Average': 0.0, 'Weighted Average': 0.0}
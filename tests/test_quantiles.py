@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from quantiles import QuantileEngine, percentile
+
+
+@pytest.fixture
+def plane():
+    rng = np.random.default_rng(0)
+    return np.abs(rng.standard_normal((300, 200)) * 50)
+
+
+def test_exact_matches_numpy(plane):
+    quantiles = QuantileEngine(mode='exact')
+    quantiles.request('abs', 70, 80, 90)
+
+    for q in (70, 80, 90, 99):
+        assert quantiles.percentile(plane, q, key='abs') == np.percentile(plane, q)
+
+
+@pytest.mark.parametrize('tolerance', [1e-3, 1e-4])
+def test_histogram_within_tolerance_of_exact(plane, tolerance):
+    exact = QuantileEngine(mode='exact')
+    histogram = QuantileEngine(mode='histogram', tolerance=tolerance)
+    bound = tolerance * (plane.max() - plane.min())
+
+    for q in (1, 25, 50, 70, 80, 90, 99):
+        assert abs(histogram.percentile(plane, q) - exact.percentile(plane, q)) <= bound
+
+
+def test_histogram_of_constant_plane():
+    assert QuantileEngine(mode='histogram').percentile(np.full((10, 10), 3.0), 80) == 3.0
+
+
+def test_requested_percentiles_share_one_pass(plane):
+    quantiles = QuantileEngine()
+    quantiles.request('abs', 70, 80)
+
+    quantiles.percentile(plane, 70, key='abs')
+    quantiles.percentile(plane, 80, key='abs')
+
+    assert quantiles.passes == 1
+
+
+def test_without_engine_falls_back_to_numpy(plane):
+    assert percentile(plane, 80) == np.percentile(plane, 80)
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        QuantileEngine(mode='sampled')
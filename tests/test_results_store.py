@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+import results_store
+from finding_center import METHODS
+from results_store import ResultsStore, method_records, pending_frames
+
+NAMES = [method.__name__ for method in METHODS]
+
+
+def record(frame, method, status='ok', center_x=10.0):
+    return {'frame': frame, 'method': method, 'method_version': results_store.method_version(method),
+            'status': status, 'label': method, 'center_x': center_x, 'center_y': 20.0}
+
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(str(tmp_path / 'results.sqlite')) as store:
+        yield store
+
+
+def test_resume_skips_finished_frames_and_methods(store):
+    store.append([record('a', name) for name in NAMES])
+    store.append([record('b', NAMES[0]), record('b', NAMES[1], status='failed')])
+    store.flush()
+
+    pending = pending_frames([{'frame': 'a'}, {'frame': 'b'}, {'frame': 'c'}], store)
+
+    assert [frame['frame'] for frame in pending] == ['b', 'c']
+    assert pending[0]['methods'] == NAMES[1:]
+    assert pending[1]['methods'] == NAMES
+
+
+def test_unflushed_rows_are_kept_on_close(tmp_path):
+    path = str(tmp_path / 'results.sqlite')
+    with ResultsStore(path, batch_size=100) as store:
+        store.append([record('a', NAMES[0])])
+
+    with ResultsStore(path) as store:
+        assert store.completed() == {'a': {NAMES[0]}}
+
+
+def test_version_bump_reruns_method(store, monkeypatch):
+    store.append([record('a', name) for name in NAMES])
+    store.flush()
+
+    monkeypatch.setitem(results_store.METHOD_VERSIONS, NAMES[0], 99)
+
+    assert pending_frames([{'frame': 'a'}], store)[0]['methods'] == [NAMES[0]]
+
+
+def test_latest_successful_row_wins(store):
+    store.append([record('a', NAMES[0], center_x=1.0), record('a', NAMES[0], center_x=2.0),
+                  record('a', NAMES[0], status='failed', center_x=3.0)])
+    store.flush()
+
+    results = store.results()
+
+    assert results['center_x'].tolist() == [2.0]
+
+
+def test_method_records_keep_failed_methods():
+    results_df = pd.DataFrame([{'Method': 'Limb Fit', 'Center_X': 1.0, 'Center_Y': 2.0, 'Error_pixels': 0.5,
+                                'Delta_X': 0.3, 'Delta_Y': 0.4}])
+    runs = [{'method': 'limb_fit', 'label': 'Limb Fit', 'ok': True, 'runtime': 0.1},
+            {'method': 'hough_transform', 'label': 'Hough Transform', 'ok': False, 'runtime': 0.2}]
+
+    records = method_records({'frame': 'a'}, results_df, {'Limb Fit': {'std_pixels': (0.1, 0.2)}}, runs)
+
+    assert [(r['method'], r['status']) for r in records] == [('limb_fit', 'ok'), ('hough_transform', 'failed')]
+    assert records[0]['std_x'] == 0.1
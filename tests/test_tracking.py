@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from frame_context import FrameContext
+from instrumentation import ERROR, configure
+from synthetic_data import synthetic_frame
+from tracking import CenterTracker, compare_tracked
+
+
+def tracker_at(center, diameter, **options):
+    tracker = CenterTracker(**options)
+    tracker.update(0.0, center, diameter, full_search=True)
+    return tracker
+
+
+def test_no_prediction_before_first_fit():
+    assert CenterTracker().predict(1.0) is None
+
+
+def test_prediction_follows_the_last_fit():
+    prediction = tracker_at((100.0, 120.0), 200.0).predict(1.0)
+
+    assert prediction['center'] == (100.0, 120.0)
+    assert prediction['radius'] == 100.0
+    assert prediction['source'] == 'tracker'
+
+
+def test_refresh_forces_a_full_search():
+    tracker = tracker_at((100.0, 120.0), 200.0, refresh_every=2)
+    tracker.update(1.0, (100.0, 120.0), 200.0)
+    tracker.update(2.0, (100.0, 120.0), 200.0)
+
+    assert tracker.predict(3.0) is None
+
+
+@pytest.mark.parametrize('center, diameter, circle_centers, reason', [
+    ((103.0, 120.0), 200.0, (), 'refinement moved'),
+    ((100.0, 120.0), 200.4, (), 'edge of the tracked range'),
+    ((100.0, 120.0), 200.0, [(100.0, 120.0), (100.1, 120.0), (102.0, 121.0)], 'circle methods disagree'),
+])
+def test_check_reports_lost_tracking(center, diameter, circle_centers, reason):
+    tracker = tracker_at((100.0, 120.0), 200.0)
+    assert reason in tracker.check(tracker.predict(1.0), center, diameter, circle_centers)
+
+
+def test_check_accepts_agreeing_methods():
+    tracker = tracker_at((100.0, 120.0), 200.0)
+    circle_centers = [(100.0, 120.0), (100.2, 119.9), (99.9, 120.1)]
+
+    assert tracker.check(tracker.predict(1.0), (100.1, 120.0), 200.1, circle_centers) is None
+
+
+def test_lost_tracking_falls_back_to_a_full_search():
+    configure(verbosity=ERROR)
+    frame = synthetic_frame(256, seed=4)
+    data, white = np.nan_to_num(frame['magnetogram']), np.nan_to_num(frame['white_light'])
+    context = FrameContext(data, white_light=white)
+
+    # A tracker whose disk is 10 px off cannot refine onto this frame.
+    true_x, true_y = frame['center']
+    tracker = tracker_at((true_x + 10, true_y), 2 * frame['radius'])
+    results_df, _, _ = compare_tracked(tracker, data, frame['center'], 1.0, context=context)
+
+    assert tracker.stats == {'tracked': 0, 'full': 2, 'lost': 1}
+    fit = results_df.set_index('Method').loc['Circle Bubbling (white light)']
+    assert fit['Error_pixels'] < 0.5
+    assert tracker.predict(2.0) is not None
@@ -0,0 +1,145 @@
+import numpy as np
+from frame_context import FrameContext
+from finding_center import compare_methods
+from instrumentation import INFO, log, count
+
+# A tracked frame refines the predicted circle with 1 px steps, a diameter
+# held within 0.2% of the prediction and limb filtering restricted to a
+# 16 px annulus.
+TRACK_STEP = 1.0
+TRACK_DIAMETER_RANGE = 0.002
+TRACK_ROI_WIDTH = 16
+
+
+class CenterTracker:
+    def __init__(self, alpha=0.5, beta=0.1, max_residual=2.0, max_disagreement=1.0, refresh_every=100,
+                 step=TRACK_STEP, diameter_range=TRACK_DIAMETER_RANGE, roi_width=TRACK_ROI_WIDTH):
+        # alpha/beta are the position and rate gains of a constant-velocity
+        # (alpha-beta) filter over (x, y, diameter).
+        self.alpha = alpha
+        self.beta = beta
+        self.max_residual = max_residual
+        self.max_disagreement = max_disagreement
+        self.refresh_every = refresh_every
+        self.step = step
+        self.diameter_range = diameter_range
+        self.roi_width = roi_width
+        self.stats = {'tracked': 0, 'full': 0, 'lost': 0}
+        self.reset()
+
+    def reset(self):
+        self.state = None
+        self.rate = None
+        self.last_time = None
+        self.tracked_frames = 0
+        self._frame_index = 0
+
+    def _time(self, frame_time):
+        # Without timestamps frames are assumed to be evenly spaced.
+        self._frame_index += 1
+        return float(self._frame_index if frame_time is None else frame_time)
+
+    def predict(self, frame_time=None):
+        if self.state is None:
+            return None
+        if self.refresh_every and self.tracked_frames >= self.refresh_every:
+            return None
+
+        dt = (self._frame_index + 1 if frame_time is None else frame_time) - self.last_time
+        x, y, diameter = self.state + self.rate * dt
+        return {
+            'center': (float(x), float(y)),
+            'radius': float(diameter) / 2,
+            'source': 'tracker',
+            'step': self.step,
+            'diameter_range': self.diameter_range,
+            'roi_width': self.roi_width
+        }
+
+    def check(self, prediction, center, diameter, circle_centers=()):
+        residual = np.hypot(center[0] - prediction['center'][0], center[1] - prediction['center'][1])
+        if residual > self.max_residual:
+            return f"refinement moved {residual:.2f} px from the prediction"
+
+        limit = 2 * prediction['radius'] * self.diameter_range
+        if abs(diameter - 2 * prediction['radius']) >= limit * 0.99:
+            return "diameter reached the edge of the tracked range"
+
+        # The circle methods fit the same limb, so on a frame they track
+        # correctly their centers agree to a fraction of a pixel.
+        if len(circle_centers) > 1:
+            consensus = np.median(circle_centers, axis=0)
+            disagreement = np.hypot(*(np.asarray(circle_centers) - consensus).T).max()
+            if disagreement > self.max_disagreement:
+                return f"circle methods disagree by {disagreement:.2f} px"
+
+        return None
+
+    def update(self, frame_time, center, diameter, full_search=False):
+        t = self._time(frame_time)
+        measurement = np.array([center[0], center[1], diameter], dtype=float)
+
+        if self.state is None:
+            self.state = measurement
+            self.rate = np.zeros(3)
+        else:
+            dt = t - self.last_time
+            predicted = self.state + self.rate * dt
+            residual = measurement - predicted
+            self.state = predicted + self.alpha * residual
+            if dt > 0:
+                self.rate = self.rate + self.beta * residual / dt
+
+        self.last_time = t
+
+        if full_search:
+            self.tracked_frames = 0
+            self.stats['full'] += 1
+        else:
+            self.tracked_frames += 1
+            self.stats['tracked'] += 1
+
+
+def bubbling_fit(results_df, uncertainties):
+    for _, row in results_df.iterrows():
+        if row['Method'].startswith('Circle Bubbling'):
+            uncertainty = uncertainties.get(row['Method']) or {}
+            if 'final_diameter' in uncertainty:
+                return (row['Center_X'], row['Center_Y']), uncertainty['final_diameter']
+    return None, None
+
+
+def circle_centers(results_df, uncertainties):
+    # Centers of the methods that fit a limb circle (they report its
+    # diameter), as opposed to the moment-based ones.
+    return [(row['Center_X'], row['Center_Y']) for _, row in results_df.iterrows()
+            if 'final_diameter' in (uncertainties.get(row['Method']) or {})]
+
+
+def compare_tracked(tracker, data_clean, reference_center, frame_time=None, context=None, **compare_options):
+    prediction = tracker.predict(frame_time)
+    if context is None:
+        context = FrameContext(data_clean)
+
+    outcome = compare_methods(data_clean, reference_center, context=context.replace(tracked_prior=prediction),
+                              **compare_options)
+    center, diameter = bubbling_fit(outcome[0], outcome[2])
+
+    if prediction is not None:
+        reason = "no circle fit" if center is None else tracker.check(prediction, center, diameter,
+                                                                      circle_centers(outcome[0], outcome[2]))
+        if reason is not None:
+            log(INFO, "Tracking lost (%s); running a full search", reason)
+            tracker.stats['lost'] += 1
+            count(tracking_lost=1)
+            tracker.reset()
+            prediction = None
+            outcome = compare_methods(data_clean, reference_center, context=context.replace(tracked_prior=None),
+                                      **compare_options)
+            center, diameter = bubbling_fit(outcome[0], outcome[2])
+
+    if center is not None:
+        tracker.update(frame_time, center, diameter, full_search=prediction is None)
+    count(tracked_frames=int(prediction is not None))
+
+    return outcome
@@ -1,27 +1,72 @@
 import numpy as np
+from quantiles import percentile, plane_key
 
 
-def calculate_edge_based_uncertainty(data_clean, center, disk_radius=400, edge_width=3):
-    y_coords, x_coords = np.indices(data_clean.shape)
-    distances = np.sqrt((x_coords - center[0]) ** 2 + (y_coords - center[1]) ** 2)
+def annulus_pixels(shape, center, disk_radius, edge_width):
+    height, width = shape
+    cx, cy = center
+    inner_radius, outer_radius = disk_radius - edge_width, disk_radius + edge_width
 
-    edge_mask = (distances > disk_radius - edge_width) & (distances < disk_radius + edge_width)
+    rows = np.arange(max(0, int(np.floor(cy - outer_radius))),
+                     min(height, int(np.ceil(cy + outer_radius)) + 1))
+    row_dy = rows - cy
 
-    abs_data = np.abs(data_clean)
+    outer_half = np.sqrt(np.maximum(outer_radius ** 2 - row_dy ** 2, 0.0))
+    inner_half = np.sqrt(np.maximum(inner_radius ** 2 - row_dy ** 2, 0.0))
 
-    if np.sum(edge_mask) == 0:
+    # Candidate spans are padded by a pixel on each side; the exact distance
+    # test below decides membership, so rounding here cannot drop pixels.
+    outer_start = np.clip(np.ceil(cx - outer_half).astype(np.intp) - 1, 0, width)
+    outer_stop = np.clip(np.floor(cx + outer_half).astype(np.intp) + 2, 0, width)
+    inner_start = np.clip(np.ceil(cx - inner_half).astype(np.intp) + 1, outer_start, outer_stop)
+    inner_stop = np.clip(np.floor(cx + inner_half).astype(np.intp), inner_start, outer_stop)
+
+    has_hole = (inner_radius > 0) & (inner_half > 1)
+    inner_start = np.where(has_hole, inner_start, outer_stop)
+    inner_stop = np.where(has_hole, inner_stop, outer_stop)
+
+    span_rows = np.concatenate([rows, rows])
+    span_start = np.concatenate([outer_start, inner_stop])
+    span_length = np.concatenate([inner_start - outer_start, outer_stop - inner_stop])
+
+    keep = span_length > 0
+    span_rows, span_start, span_length = span_rows[keep], span_start[keep], span_length[keep]
+
+    total = int(np.sum(span_length))
+    offsets = np.arange(total) - np.repeat(np.cumsum(span_length) - span_length, span_length)
+    x_idx = np.repeat(span_start, span_length) + offsets
+    y_idx = np.repeat(span_rows, span_length)
+
+    distances = np.sqrt((x_idx - cx) ** 2 + (y_idx - cy) ** 2)
+    in_ring = (distances > inner_radius) & (distances < outer_radius)
+
+    y_idx, x_idx = y_idx[in_ring], x_idx[in_ring]
+    dx = x_idx - cx
+    dy = y_idx - cy
+
+    return y_idx, x_idx, dx, dy
+
+
+def calculate_edge_based_uncertainty(data_clean, center, disk_radius=400, edge_width=3, quantiles=None):
+    y_idx, x_idx, ring_dx, ring_dy = annulus_pixels(data_clean.shape, center, disk_radius, edge_width)
+
+    if len(y_idx) == 0:
         return None
 
-    threshold = np.percentile(abs_data[edge_mask], 70)
-    bright_edge_mask = edge_mask & (abs_data > threshold)
+    abs_values = np.abs(data_clean[y_idx, x_idx])
+
+    ring_key = ('edge_ring', plane_key(data_clean), float(center[0]), float(center[1]),
+                float(disk_radius), float(edge_width))
+    threshold = percentile(abs_values, 70, quantiles, key=ring_key)
+    bright_edge_mask = abs_values > threshold
 
-    weights = abs_data * bright_edge_mask
+    weights = abs_values[bright_edge_mask]
 
     if np.sum(weights) == 0:
         return None
 
-    dx = x_coords - center[0]
-    dy = y_coords - center[1]
+    dx = ring_dx[bright_edge_mask]
+    dy = ring_dy[bright_edge_mask]
 
     m_00 = np.sum(weights)
 
@@ -57,6 +102,36 @@ def calculate_edge_based_uncertainty(data_clean, center, disk_radius=400, edge_w
         'confidence_68': (std_x, std_y),
         'confidence_95': (2 * std_x, 2 * std_y),
         'edge_pixels_used': np.sum(bright_edge_mask),
-        'total_edge_pixels': np.sum(edge_mask),
+        'total_edge_pixels': len(y_idx),
         'method': 'improved_edge_based'
     }
+
+
+def covariance_uncertainty(covariance, points_used, total_points, method):
+    # Same keys as the edge-based estimate, from a 2x2 (x, y) covariance.
+    variance_x, variance_y = float(covariance[0][0]), float(covariance[1][1])
+    covariance_xy = float(covariance[0][1])
+
+    std_x = np.sqrt(max(variance_x, 0.0))
+    std_y = np.sqrt(max(variance_y, 0.0))
+    correlation = covariance_xy / (std_x * std_y) if std_x * std_y > 0 else 0
+
+    spread = np.sqrt((variance_x - variance_y) ** 2 + 4 * covariance_xy ** 2)
+    lambda1 = 0.5 * (variance_x + variance_y + spread)
+    lambda2 = 0.5 * (variance_x + variance_y - spread)
+
+    return {
+        'std_pixels': (std_x, std_y),
+        'variance_x': variance_x,
+        'variance_y': variance_y,
+        'covariance': covariance_xy,
+        'correlation': correlation,
+        'error_ellipse_major': np.sqrt(max(lambda1, 0.0)),
+        'error_ellipse_minor': np.sqrt(max(lambda2, 0.0)),
+        'error_ellipse_angle': 0.5 * np.arctan2(2 * covariance_xy, variance_x - variance_y),
+        'confidence_68': (std_x, std_y),
+        'confidence_95': (2 * std_x, 2 * std_y),
+        'edge_pixels_used': points_used,
+        'total_edge_pixels': total_points,
+        'method': method
+    }